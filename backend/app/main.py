@@ -1,11 +1,26 @@
-from fastapi import FastAPI, APIRouter, UploadFile, File, Form, Header, HTTPException
+import os
+import io
+import json
+import re
+import shutil
+import time
+import uuid
+import zipfile
+from fastapi import FastAPI, APIRouter, UploadFile, File, Form, Header, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import Response, StreamingResponse
 from typing import List
-from app.services.file_ingestion import process_uploaded_file
 from app.services.vector_db import VectorDB
 from app.services.kb_builder import KnowledgeBaseBuilder
 from app.services.rag_service import RAGService
 from app.services.script_generator import ScriptGeneratorService
+from app.services.registry import get_embedder, get_vector_db, get_llm_router
+from app.services.job_queue import JobStore, KBJobRunner, JobWorker
+from app.services.session_manager import SessionManager
+from app.utils.concurrency import run_in_pool, shutdown_pools
+from app.utils.http_client import all_connection_stats
+from app.utils.loop_monitor import LoopLagMonitor
+from app.utils.metrics import METRICS, HTTP_SECONDS
 
 app = FastAPI(title="Autonomous QA Agent Backend")
 
@@ -24,93 +39,388 @@ app.add_middleware(
 
 # Initialize Services
 # Note: In production, vector_db might be a cloud instance (Pinecone/Weaviate)
-kb_builder = KnowledgeBaseBuilder(persist_dir="./chroma_db")
-rag_service = RAGService(persist_dir="./chroma_db")
-script_gen_service = ScriptGeneratorService()
+# One embedder + one Chroma client per worker, shared by every service.
+embedder = get_embedder()
+vector_db = get_vector_db(persist_dir="./chroma_db")
+kb_builder = KnowledgeBaseBuilder(embedder=embedder, vector_db=vector_db)
+# Completions fail over across LLM_BACKENDS (Groq by default; Ollama and rate caps are opt-in)
+llm = get_llm_router()
+rag_service = RAGService(embedder=embedder, vector_db=vector_db, llm=llm)
+script_gen_service = ScriptGeneratorService(vector_db=vector_db, llm=llm)
+
+# Background KB builds: uploads are staged here until their job has run
+JOB_STAGING_DIR = os.path.join("uploaded_docs", "jobs")
+job_store = JobStore()
+job_worker = JobWorker(job_store, KBJobRunner(job_store, kb_builder), staging_dir=JOB_STAGING_DIR)
+
+# Session lifecycle: last-access tracking + TTL/LRU eviction of vectors and HTML files
+session_manager = SessionManager(
+    vector_db=vector_db,
+    manifest=kb_builder.manifest,
+    upload_dir="uploaded_docs",
+    page_index=script_gen_service.page_index,
+    lexical_index=kb_builder.lexical,
+    is_busy=job_store.has_active_jobs,
+)
+
+# Reports (and logs) anything that blocks the event loop
+loop_monitor = LoopLagMonitor()
+
+@app.middleware("http")
+async def record_request_latency(request: Request, call_next):
+    start = time.perf_counter()
+    response = await call_next(request)
+    # Label by route template, not raw path, so /jobs/{job_id} stays one series
+    route = request.scope.get("route")
+    HTTP_SECONDS.observe(
+        time.perf_counter() - start,
+        method=request.method,
+        route=route.path if route is not None else "unmatched",
+        status=response.status_code,
+    )
+    return response
+
+@app.middleware("http")
+async def track_session_access(request: Request, call_next):
+    session_id = request.headers.get("X-Session-ID")
+    if session_id:
+        session_manager.touch(session_id)
+    return await call_next(request)
+
+@app.on_event("startup")
+async def start_background_tasks():
+    job_worker.start()
+    session_manager.start_reaper()
+    loop_monitor.start()
+
+@app.on_event("shutdown")
+async def shutdown_executors():
+    await loop_monitor.stop()
+    await session_manager.stop_reaper()
+    await job_worker.stop()
+    if rag_service.query_embedder is not None:
+        await rag_service.query_embedder.close()
+    await llm.aclose()
+    shutdown_pools(wait=False)
 
 @app.get("/")
 def home():
     return {"message": "QA Agent Backend Running"}
 
-@app.post("/upload-documents")
+@app.post("/upload-documents", status_code=202)
 async def upload_documents(
     files: List[UploadFile] = File(...),
     x_session_id: str = Header(..., alias="X-Session-ID") # Enforce Header
 ):
     """
-    Production Endpoint: Accepts multiple files, extracts text,
-    saves html with session id suffix, and builds the Knowledge Base immediately.
+    Production Endpoint: Accepts multiple files, stages them on disk,
+    saves html with session id suffix, and queues a background KB build job.
+    Poll /jobs/{job_id} for progress.
     """
-    processed_docs = []
+    staged_files = []
     saved_html_filenames = []
-    headers = {"X-Session-ID": x_session_id}
+    file_errors = []
+    job_id = str(uuid.uuid4())
+    job_dir = os.path.join(JOB_STAGING_DIR, job_id)
+    os.makedirs(job_dir, exist_ok=True)
 
     for file in files:
         try:
-            filename = file.filename
+            filename = os.path.basename(file.filename)
             lower = filename.lower()
             # Save HTML files explicitly with session id to avoid conflicts
             if lower.endswith(".html") or lower.endswith(".htm"):
                 safe_name = f"{os.path.splitext(filename)[0]}__{x_session_id}.html"
                 save_path = os.path.join("uploaded_docs", safe_name)
-                with open(save_path, "wb") as fh:
-                    content = await file.read()
-                    fh.write(content)
-                # also add to processed_docs as HTML text to be ingested
-                html_text = content.decode("utf-8", errors="ignore")
-                processed_docs.append({
-                    "source": safe_name,
-                    "text": html_text,
-                    "type": "html"
-                })
+                size = await _save_upload(file, save_path)
+                # Parse once now so script generation never re-reads or re-parses the page
+                try:
+                    await run_in_pool("parse", script_gen_service.page_index.index_page, x_session_id, save_path)
+                except Exception:
+                    # Don't leave an unindexable page behind for the upload-dir scan to find
+                    os.remove(save_path)
+                    raise
+                # HTML is ingested raw so the KB also knows the page selectors
+                staged_files.append({"path": save_path, "source": safe_name, "size": size, "raw": True})
                 saved_html_filenames.append(safe_name)
             else:
-                # Non-HTML files: existing processing path
-                text, meta = await process_uploaded_file(file)
-                processed_docs.append({
-                    "source": meta["source"],
-                    "text": text,
-                    "type": meta["type"]
-                })
+                save_path = os.path.join(job_dir, lower)
+                size = await _save_upload(file, save_path)
+                staged_files.append({"path": save_path, "source": lower, "size": size, "raw": False})
         except Exception as e:
             print(f"Error processing {file.filename}: {e}")
+            file_errors.append({"file": file.filename, "error": str(e)})
             continue
 
-    if not processed_docs:
-        raise HTTPException(status_code=400, detail="No valid documents processed")
+    if not staged_files:
+        shutil.rmtree(job_dir, ignore_errors=True)
+        raise HTTPException(status_code=400, detail={"message": "No valid documents processed", "file_errors": file_errors})
 
-    # Build KB immediately with all processed docs (including html)
-    result = kb_builder.build_from_texts(processed_docs, session_id=x_session_id)
+    job_id = await run_in_pool("vector", job_store.create_job, x_session_id, staged_files, job_id=job_id)
+    job_worker.notify()
 
     return {
-        "status": "success",
-        "processed_files": [d["source"] for d in processed_docs],
+        "status": "queued",
+        "job_id": job_id,
+        "staged_files": [f["source"] for f in staged_files],
         "saved_html_files": saved_html_filenames,
-        "kb_build_result": result
+        "file_errors": file_errors
+    }
+
+
+async def _save_upload(file: UploadFile, path: str, chunk_size: int = 1024 * 1024) -> int:
+    """
+    Streams an upload to disk in fixed-size chunks; returns the number of bytes written.
+    """
+    size = 0
+    with open(path, "wb") as fh:
+        while True:
+            chunk = await file.read(chunk_size)
+            if not chunk:
+                break
+            fh.write(chunk)
+            size += len(chunk)
+    return size
+
+
+@app.get("/metrics")
+def metrics():
+    """
+    Prometheus scrape endpoint: per-stage latency histograms, HTTP latency,
+    LLM token counts, cache hit/miss counts, chunk counts and embedding
+    micro-batch sizes and queue waits.
+    """
+    return Response(METRICS.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@app.get("/admin/cache-stats")
+def cache_stats():
+    cache = embedder.cache
+    return {
+        "embedding_cache": cache.stats() if cache else None,
+        "llm_cache": llm.cache.stats() if llm.cache else None,
+        "rerank_cache": rag_service.reranker.stats() if rag_service.reranker else None,
     }
 
 
+@app.get("/admin/embedding-batching")
+def embedding_batching():
+    batcher = rag_service.query_embedder
+    return batcher.stats() if batcher else {"enabled": False}
+
+
+@app.get("/admin/http-stats")
+def http_stats():
+    return all_connection_stats()
+
+
+@app.get("/admin/llm-backends")
+def llm_backends():
+    return llm.stats()
+
+
+@app.get("/admin/loop-lag")
+def loop_lag():
+    return loop_monitor.stats()
+
+
+@app.get("/admin/sessions")
+async def session_storage():
+    sessions = await run_in_pool("vector", session_manager.storage_report)
+    return {
+        "sessions": sessions,
+        "total_chunks": sum(s["chunks"] for s in sessions),
+        "total_html_bytes": sum(s["html_bytes"] for s in sessions),
+        "ttl_seconds": session_manager.ttl_seconds,
+        "max_sessions": session_manager.max_sessions,
+    }
+
+
+@app.post("/admin/sessions/reap")
+async def reap_sessions():
+    evicted = await run_in_pool("vector", session_manager.reap)
+    return {"evicted": evicted}
+
+
+@app.get("/jobs")
+def list_jobs(x_session_id: str = Header(..., alias="X-Session-ID")):
+    return {"jobs": [_public_job(j) for j in job_store.list_for_session(x_session_id)]}
+
+
+@app.get("/jobs/{job_id}")
+def get_job(job_id: str, x_session_id: str = Header(..., alias="X-Session-ID")):
+    job = job_store.get(job_id)
+    # Jobs are only visible to the session that created them
+    if job is None or job["session_id"] != x_session_id:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return _public_job(job)
+
+
+def _public_job(job):
+    # Staged file paths are an implementation detail; expose names only
+    job = dict(job)
+    job["files"] = [f["source"] for f in job["files"]]
+    return job
+
+
+def _bypass_cache(header_value) -> bool:
+    # "X-Cache-Bypass: 1" forces a fresh LLM completion (the new answer replaces the cached one)
+    return (header_value or "").strip().lower() in ("1", "true", "yes")
+
+
 @app.post("/generate-testcases")
 async def generate_testcases(
     query: str = Form(...),
-    x_session_id: str = Header(..., alias="X-Session-ID") # Enforce Header
+    x_session_id: str = Header(..., alias="X-Session-ID"), # Enforce Header
+    x_cache_bypass: str = Header(None, alias="X-Cache-Bypass"),
 ):
-    results = rag_service.generate_test_cases(query, session_id=x_session_id)
-    return {"results": results}
+    results, prompt_stats = await rag_service.agenerate_test_cases_with_stats(
+        query, session_id=x_session_id, use_cache=not _bypass_cache(x_cache_bypass)
+    )
+    return {"results": results, "prompt_stats": prompt_stats}
 
 @app.post("/generate-selenium-script")
 async def generate_script(
     testcase_json: str = Form(...),
-    x_session_id: str = Header(..., alias="X-Session-ID")
+    x_session_id: str = Header(..., alias="X-Session-ID"),
+    x_cache_bypass: str = Header(None, alias="X-Cache-Bypass"),
 ):
-    import json
     try:
         test_case_dict = json.loads(testcase_json)
-        script = script_gen_service.generate_script(test_case_dict, session_id=x_session_id)
-        return {"script": script}
+        script, prompt_stats = await script_gen_service.agenerate_script_with_stats(
+            test_case_dict, session_id=x_session_id, use_cache=not _bypass_cache(x_cache_bypass)
+        )
+        return {"script": script, "prompt_stats": prompt_stats}
     except Exception as e:
         return {"error": str(e)}
 
+
+def _sse(events) -> StreamingResponse:
+    """
+    Wraps an async iterator of {"event": name, ...} dicts as a Server-Sent Events response.
+    """
+    async def body():
+        async for event in events:
+            event = dict(event)
+            name = event.pop("event")
+            yield f"event: {name}\ndata: {json.dumps(event)}\n\n"
+
+    # X-Accel-Buffering stops nginx-style proxies from holding tokens back until the end
+    return StreamingResponse(
+        body(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.post("/generate-testcases/stream")
+async def generate_testcases_stream(
+    query: str = Form(...),
+    x_session_id: str = Header(..., alias="X-Session-ID"),
+    x_cache_bypass: str = Header(None, alias="X-Cache-Bypass"),
+):
+    """
+    Same as /generate-testcases, streamed as SSE: "token" events carry LLM text
+    as it arrives and a final "done" event carries the parsed results.
+    """
+    return _sse(rag_service.astream_test_cases(
+        query, session_id=x_session_id, use_cache=not _bypass_cache(x_cache_bypass)
+    ))
+
+@app.post("/generate-selenium-script/stream")
+async def generate_script_stream(
+    testcase_json: str = Form(...),
+    x_session_id: str = Header(..., alias="X-Session-ID"),
+    x_cache_bypass: str = Header(None, alias="X-Cache-Bypass"),
+):
+    """
+    Same as /generate-selenium-script, streamed as SSE: "token" events, then a
+    "done" event with the cleaned script.
+    """
+    try:
+        test_case_dict = json.loads(testcase_json)
+    except Exception as e:
+        return {"error": str(e)}
+    return _sse(script_gen_service.astream_script(
+        test_case_dict, session_id=x_session_id, use_cache=not _bypass_cache(x_cache_bypass)
+    ))
+
+# Upper bound on test cases per batch request
+MAX_BATCH_TEST_CASES = int(os.getenv("MAX_BATCH_TEST_CASES", "100"))
+
+
+def _parse_test_cases(testcases_json: str) -> List[dict]:
+    try:
+        test_cases = json.loads(testcases_json)
+    except json.JSONDecodeError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid testcases_json: {e}")
+    if not isinstance(test_cases, list) or not all(isinstance(tc, dict) for tc in test_cases):
+        raise HTTPException(status_code=400, detail="testcases_json must be a JSON array of test case objects")
+    if not test_cases or len(test_cases) > MAX_BATCH_TEST_CASES:
+        raise HTTPException(status_code=400, detail=f"Send between 1 and {MAX_BATCH_TEST_CASES} test cases")
+    return test_cases
+
+
+def _script_filename(test_case: dict, index: int) -> str:
+    # Same naming as the single-script download in the UI; index keeps duplicate IDs apart
+    test_id = re.sub(r"[^A-Za-z0-9_.-]", "_", str(test_case.get("Test_ID") or "unknown"))
+    return f"{index + 1:03d}_test_script_{test_id}.py"
+
+
+@app.post("/generate-selenium-scripts")
+async def generate_scripts(
+    testcases_json: str = Form(...),
+    x_session_id: str = Header(..., alias="X-Session-ID"),
+    x_cache_bypass: str = Header(None, alias="X-Cache-Bypass"),
+):
+    """
+    Batch endpoint: one script per test case, generated concurrently from a single
+    parse of the session HTML, returned as a zip archive.
+    """
+    test_cases = _parse_test_cases(testcases_json)
+    scripts = {}
+    async for index, script, _ in script_gen_service.agenerate_scripts(
+        test_cases, session_id=x_session_id, use_cache=not _bypass_cache(x_cache_bypass)
+    ):
+        scripts[index] = script
+
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w", zipfile.ZIP_DEFLATED) as zf:
+        for index, test_case in enumerate(test_cases):
+            zf.writestr(_script_filename(test_case, index), scripts[index])
+    return Response(
+        archive.getvalue(),
+        media_type="application/zip",
+        headers={"Content-Disposition": 'attachment; filename="selenium_scripts.zip"'},
+    )
+
+@app.post("/generate-selenium-scripts/stream")
+async def generate_scripts_stream(
+    testcases_json: str = Form(...),
+    x_session_id: str = Header(..., alias="X-Session-ID"),
+    x_cache_bypass: str = Header(None, alias="X-Cache-Bypass"),
+):
+    """
+    Batch endpoint streamed as SSE: one "script" event per test case as soon as it
+    is ready (completion order), then a "done" event.
+    """
+    test_cases = _parse_test_cases(testcases_json)
+
+    async def events():
+        async for index, script, prompt_stats in script_gen_service.agenerate_scripts(
+            test_cases, session_id=x_session_id, use_cache=not _bypass_cache(x_cache_bypass)
+        ):
+            yield {
+                "event": "script",
+                "index": index,
+                "filename": _script_filename(test_cases[index], index),
+                "script": script,
+                "prompt_stats": prompt_stats,
+            }
+        yield {"event": "done", "count": len(test_cases)}
+
+    return _sse(events())
+
 # Ensure uploaded_docs exists for the HTML file save
-import os
-os.makedirs("uploaded_docs", exist_ok=True)
\ No newline at end of file
+os.makedirs("uploaded_docs", exist_ok=True)
+os.makedirs(JOB_STAGING_DIR, exist_ok=True)
\ No newline at end of file
@@ -0,0 +1,148 @@
+# app/services/batching_embedder.py
+import asyncio
+import os
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+import numpy as np
+from app.services.embeddings import EmbeddingService
+from app.utils.concurrency import POOL_SIZES, run_in_pool
+from app.utils.metrics import EMBED_BATCH_SIZE, EMBED_QUEUE_WAIT, Histogram
+
+EMBED_BATCHING_ENABLED = os.getenv("EMBED_BATCHING_ENABLED", "1") == "1"
+EMBED_BATCH_MAX_SIZE = int(os.getenv("EMBED_BATCH_MAX_SIZE", "32"))
+# How long the first queued text may wait for others to join its batch
+EMBED_BATCH_MAX_WAIT_MS = float(os.getenv("EMBED_BATCH_MAX_WAIT_MS", "5"))
+
+BATCH_SIZE_BUCKETS = EMBED_BATCH_SIZE.buckets
+QUEUE_WAIT_BUCKETS_MS = (0.5, 1, 2, 5, 10, 25, 50, 100, 250, 1000)
+
+# (texts, caller's future, enqueue time)
+_Request = Tuple[List[str], asyncio.Future, float]
+
+
+class BatchingEmbedder:
+    """
+    Micro-batches concurrent embedding requests. Callers enqueue their texts and
+    await a future; a worker task flushes a batch once it holds max_batch_size
+    texts or its oldest request has waited max_wait_ms, encodes it in one
+    embed_texts call on the embed pool and hands each caller its rows. At most
+    max_in_flight batches run at once; while they do, new requests keep
+    accumulating, so batches grow with load instead of queueing one by one.
+    """
+
+    def __init__(
+        self,
+        embedder: EmbeddingService,
+        max_batch_size: int = EMBED_BATCH_MAX_SIZE,
+        max_wait_ms: float = EMBED_BATCH_MAX_WAIT_MS,
+        max_in_flight: int = POOL_SIZES["embed"],
+    ):
+        self.embedder = embedder
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait_ms / 1000
+        self.max_in_flight = max(1, max_in_flight)
+        self.batch_sizes = Histogram(BATCH_SIZE_BUCKETS)
+        self.queue_wait_ms = Histogram(QUEUE_WAIT_BUCKETS_MS)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Deque[_Request] = deque()
+        self._queued_texts = 0
+        self._wakeup: Optional[asyncio.Event] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._worker: Optional[asyncio.Task] = None
+
+    def _ensure_worker(self):
+        # The worker and its primitives belong to the loop that first used them
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._worker is None or self._worker.done():
+            self._loop = loop
+            self._queue.clear()
+            self._queued_texts = 0
+            self._wakeup = asyncio.Event()
+            self._slots = asyncio.Semaphore(self.max_in_flight)
+            self._worker = loop.create_task(self._run())
+
+    async def aembed(self, texts: List[str]) -> np.ndarray:
+        """
+        texts -> float32 (n_texts, dim), encoded together with other concurrent callers' texts.
+        """
+        if not texts:
+            return self.embedder.embed_texts(texts)
+        self._ensure_worker()
+        future = self._loop.create_future()
+        self._queue.append((list(texts), future, time.perf_counter()))
+        self._queued_texts += len(texts)
+        self._wakeup.set()
+        return await future
+
+    async def _run(self):
+        while True:
+            await self._wakeup.wait()
+            if not self._queue:
+                self._wakeup.clear()
+                continue
+            # Wait for a full batch or the oldest request's deadline, whichever is first
+            deadline = self._queue[0][2] + self.max_wait
+            while self._queued_texts < self.max_batch_size:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), remaining)
+                except asyncio.TimeoutError:
+                    break
+
+            await self._slots.acquire()
+            batch = self._take_batch()
+            if not self._queue:
+                self._wakeup.clear()
+            task = asyncio.ensure_future(self._flush(batch))
+            task.add_done_callback(lambda _: self._slots.release())
+
+    def _take_batch(self) -> List[_Request]:
+        # Whole requests only; a request larger than max_batch_size goes alone
+        batch, size = [], 0
+        while self._queue and (not batch or size + len(self._queue[0][0]) <= self.max_batch_size):
+            request = self._queue.popleft()
+            batch.append(request)
+            size += len(request[0])
+        self._queued_texts -= size
+        return batch
+
+    async def _flush(self, batch: List[_Request]):
+        now = time.perf_counter()
+        texts = []
+        for request_texts, _, enqueued in batch:
+            texts.extend(request_texts)
+            self.queue_wait_ms.observe((now - enqueued) * 1000)
+            EMBED_QUEUE_WAIT.observe(now - enqueued)
+        self.batch_sizes.observe(len(texts))
+        EMBED_BATCH_SIZE.observe(len(texts))
+        try:
+            vectors = await run_in_pool("embed", self.embedder.embed_texts, texts)
+        except Exception as e:
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        start = 0
+        for request_texts, future, _ in batch:
+            if not future.done():
+                future.set_result(vectors[start:start + len(request_texts)])
+            start += len(request_texts)
+
+    async def close(self):
+        if self._worker is not None:
+            self._worker.cancel()
+            await asyncio.gather(self._worker, return_exceptions=True)
+            self._worker = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000,
+            "queued_texts": self._queued_texts,
+            "batch_size": self.batch_sizes.snapshot(),
+            "queue_wait_ms": self.queue_wait_ms.snapshot(),
+        }
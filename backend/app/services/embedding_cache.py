@@ -0,0 +1,135 @@
+# app/services/embedding_cache.py
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List
+import numpy as np
+
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "./embedding_cache.db")
+EMBEDDING_CACHE_MAX_MB = float(os.getenv("EMBEDDING_CACHE_MAX_MB", "512"))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS embeddings (
+    key TEXT PRIMARY KEY,
+    vector BLOB NOT NULL,
+    last_access REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_embeddings_access ON embeddings(last_access);
+"""
+
+
+class EmbeddingCache:
+    """
+    On-disk cache of float32 embeddings keyed by sha256(model namespace + text).
+    Entries are evicted least-recently-used first once the cache exceeds max_bytes.
+    Keeps hit/miss counters so the hit rate can be reported.
+    """
+
+    def __init__(self, db_path: str = EMBEDDING_CACHE_PATH, max_bytes: int = int(EMBEDDING_CACHE_MAX_MB * 1024 * 1024)):
+        self.db_path = db_path
+        self.max_bytes = max_bytes
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+            row = conn.execute("SELECT COUNT(*), COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings").fetchone()
+        self._entries, self._bytes = row[0], row[1]
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def make_key(namespace: str, text: str) -> str:
+        h = hashlib.sha256(namespace.encode("utf-8"))
+        h.update(b"\0")
+        h.update(text.encode("utf-8"))
+        return h.hexdigest()
+
+    def get_many(self, keys: List[str]) -> Dict[str, np.ndarray]:
+        """
+        Returns {key: vector} for the keys present in the cache and bumps their recency.
+        """
+        found: Dict[str, np.ndarray] = {}
+        unique = list(dict.fromkeys(keys))
+        with self._lock, self._connect() as conn:
+            # Stay well below SQLite's bound-parameter limit
+            for i in range(0, len(unique), 500):
+                batch = unique[i:i + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32)
+            if found:
+                now = time.time()
+                conn.executemany(
+                    "UPDATE embeddings SET last_access = ? WHERE key = ?", [(now, k) for k in found]
+                )
+            self.hits += sum(1 for k in keys if k in found)
+            self.misses += sum(1 for k in keys if k not in found)
+        return found
+
+    def put_many(self, keys: List[str], vectors: np.ndarray):
+        now = time.time()
+        rows = [(k, np.ascontiguousarray(v, dtype=np.float32).tobytes(), now) for k, v in zip(keys, vectors)]
+        with self._lock, self._connect() as conn:
+            before = conn.total_changes
+            conn.executemany(
+                "INSERT OR IGNORE INTO embeddings (key, vector, last_access) VALUES (?, ?, ?)", rows
+            )
+            inserted = conn.total_changes - before
+            if inserted:
+                # Vectors in one call come from one model, so they share a size
+                self._entries += inserted
+                self._bytes += inserted * (len(rows[0][1]) if rows else 0)
+            if self._bytes > self.max_bytes:
+                self._evict(conn)
+
+    def _evict(self, conn: sqlite3.Connection):
+        """
+        Drops least-recently-used entries until the cache is back under 90% of max_bytes.
+        """
+        target = int(self.max_bytes * 0.9)
+        while self._bytes > target and self._entries > 0:
+            avg = max(1, self._bytes // self._entries)
+            n = max(1, (self._bytes - target) // avg)
+            cur = conn.execute(
+                "DELETE FROM embeddings WHERE key IN (SELECT key FROM embeddings ORDER BY last_access LIMIT ?)", (n,)
+            )
+            if cur.rowcount <= 0:
+                break
+            self.evictions += cur.rowcount
+            row = conn.execute("SELECT COUNT(*), COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings").fetchone()
+            self._entries, self._bytes = row[0], row[1]
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits / lookups) if lookups else 0.0,
+            "entries": self._entries,
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "evictions": self.evictions,
+        }
+
+    def clear(self):
+        with self._lock, self._connect() as conn:
+            conn.execute("DELETE FROM embeddings")
+            self._entries, self._bytes = 0, 0
@@ -1,22 +1,90 @@
 # app/services/embeddings.py
-from sentence_transformers import SentenceTransformer
 import numpy as np
-from typing import List
+import os
+import threading
+from typing import TYPE_CHECKING, List, Optional
+from app.services.embedding_cache import EmbeddingCache
+from app.utils.metrics import CACHE_LOOKUPS, stage
+
+if TYPE_CHECKING:
+    from sentence_transformers import SentenceTransformer
+
+# "torch" = sentence-transformers on PyTorch, "onnx" = ONNX Runtime (see onnx_embeddings.py)
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch")
 
 class EmbeddingService:
     """
     Wrapper around a SentenceTransformer model.
     Produces fixed-size float32 numpy embeddings for a list of texts.
+    The model (and torch itself) is loaded lazily on first use so importing the app stays cheap.
+    With a cache attached, texts seen before are served from disk and only
+    misses reach the model.
     """
-    def __init__(self, model_name: str = "all-MiniLM-L6-v2"):
+    def __init__(self, model_name: str = "all-MiniLM-L6-v2", cache: Optional[EmbeddingCache] = None):
         self.model_name = model_name
-        self.model = SentenceTransformer(self.model_name)
+        self.cache = cache
+        self._model = None
+        self._load_lock = threading.Lock()
+
+    @property
+    def model(self) -> "SentenceTransformer":
+        if self._model is None:
+            with self._load_lock:
+                if self._model is None:
+                    from sentence_transformers import SentenceTransformer
+                    self._model = SentenceTransformer(self.model_name)
+        return self._model
+
+    @property
+    def cache_namespace(self) -> str:
+        # Cache keys must change whenever the produced vectors could change
+        return self.model_name
+
+    @property
+    def dimension(self) -> int:
+        return self.model.get_sentence_embedding_dimension()
+
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        # SentenceTransformer returns np.ndarray of dtype float32
+        embeddings = self.model.encode(texts, show_progress_bar=False, convert_to_numpy=True)
+        # Ensure dtype float32 (no copy when it already is)
+        return embeddings.astype("float32", copy=False)
 
-    def embed_texts(self, texts: List[str]) -> np.ndarray:
+    def embed_texts(self, texts: List[str], out: Optional[np.ndarray] = None) -> np.ndarray:
         """
         texts -> numpy array shape (n_texts, dim)
+        If `out` is given (a float32 (n_texts, dim) array or view) the vectors are
+        written into it in place and `out` is returned, so callers can fill one
+        preallocated matrix batch by batch.
         """
-        # SentenceTransformer returns np.ndarray of dtype float32
-        embeddings = self.model.encode(texts, show_progress_bar=False, convert_to_numpy=True)
-        # Ensure dtype float32
-        return embeddings.astype("float32")
+        if self.cache is None or not texts:
+            with stage("embed.encode"):
+                embeddings = self._encode(texts)
+            if out is None:
+                return embeddings
+            out[...] = embeddings
+            return out
+
+        keys = [EmbeddingCache.make_key(self.cache_namespace, t) for t in texts]
+        cached = self.cache.get_many(keys)
+
+        hits = sum(1 for key in keys if key in cached)
+        CACHE_LOOKUPS.inc(hits, cache="embedding", result="hit")
+        CACHE_LOOKUPS.inc(len(keys) - hits, cache="embedding", result="miss")
+
+        # Encode each distinct missing text once
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in cached and key not in missing:
+                missing[key] = text
+        if missing:
+            with stage("embed.encode"):
+                fresh = self._encode(list(missing.values()))
+            self.cache.put_many(list(missing.keys()), fresh)
+            cached.update(zip(missing.keys(), fresh))
+
+        if out is None:
+            out = np.empty((len(texts), len(cached[keys[0]])), dtype=np.float32)
+        for row, key in enumerate(keys):
+            out[row] = cached[key]
+        return out
@@ -1,83 +1,90 @@
 import json
 import fitz  # PyMuPDF
 import os
-from fastapi import UploadFile
+import time
 from app.utils.parser_utils import parse_html
-from typing import Tuple, Dict, Any
+from app.utils.metrics import stage
+from typing import Dict, Any, Iterator
 
-async def process_uploaded_file(file: UploadFile) -> Tuple[str, Dict[str, Any]]:
-    """
-    Reads an uploaded file directly from memory/stream and extracts text.
-    Returns: (extracted_text, metadata)
-    """
-    filename = file.filename.lower()
-    content = await file.read() # Read file bytes
-    
-    text = ""
-    metadata = {"source": filename, "type": "unknown"}
+# Text files are streamed in blocks of this many characters
+READ_BLOCK_SIZE = 256 * 1024
 
+def detect_file_type(filename: str) -> str:
+    filename = filename.lower()
     if filename.endswith(".pdf"):
-        # Open PDF from bytes
-        with fitz.open(stream=content, filetype="pdf") as doc:
-            for page in doc:
-                text += page.get_text()
-        metadata["type"] = "pdf"
-
-    elif filename.endswith(".json"):
-        data = json.loads(content.decode("utf-8"))
-        text = json.dumps(data, indent=2)
-        metadata["type"] = "json"
-
-    elif filename.endswith(".html"):
-        raw_html = content.decode("utf-8")
-        text = parse_html(raw_html)
-        metadata["type"] = "html"
-        
-        # PRODUCTION CHANGE: Save HTML locally briefly so ScriptGenerator can read it later
-        # In a real cloud app, you'd save this to S3. 
-        # overwriting a 'current_checkout.html' as a trade-off.
-        with open("uploaded_docs/checkout.html", "w", encoding="utf-8") as f:
-            f.write(raw_html)
-
-    else: # txt, md, etc.
-        text = content.decode("utf-8")
-        metadata["type"] = "text"
+        return "pdf"
+    if filename.endswith(".json"):
+        return "json"
+    if filename.endswith(".html"):
+        return "html"
+    return "text"
 
-    # Reset file cursor just in case
-    await file.seek(0)
-    
-    return text, metadata
-
-def process_local_file(path: str) -> Dict[str, Any]:
+def iter_local_file_text(path: str, raw: bool = False) -> Iterator[str]:
     """
-    Helper for local/dev usage when you have a filepath
-    Returns dict: { "text": <extracted>, "metadata": {source, type} }
+    Yields the extracted text of a local file piece by piece:
+    one page at a time for PDFs, fixed-size blocks for text files.
+    raw=True streams the file contents as-is (used for HTML pages whose markup is indexed).
     """
     if not os.path.exists(path):
         raise FileNotFoundError(path)
 
-    filename = os.path.basename(path).lower()
+    file_type = detect_file_type(os.path.basename(path))
 
-    if filename.endswith(".pdf"):
-        import fitz
-        doc = fitz.open(path)
-        text = ""
-        for page in doc:
-            text += page.get_text()
-        metadata = {"source": filename, "type": "pdf"}
-    elif filename.endswith(".json"):
+    if raw:
+        with open(path, "r", encoding="utf-8", errors="ignore") as fh:
+            while True:
+                block = fh.read(READ_BLOCK_SIZE)
+                if not block:
+                    break
+                yield block
+    elif file_type == "pdf":
+        with fitz.open(path) as doc:
+            for page in doc:
+                yield page.get_text()
+    elif file_type == "json":
         with open(path, "r", encoding="utf-8") as fh:
             content = json.load(fh)
-        text = json.dumps(content, indent=2)
-        metadata = {"source": filename, "type": "json"}
-    elif filename.endswith(".html"):
+        # iterencode yields the pretty-printed document in small pieces
+        yield from json.JSONEncoder(indent=2).iterencode(content)
+    elif file_type == "html":
+        # BeautifulSoup needs the whole document; pages are small compared to PDFs
         with open(path, "r", encoding="utf-8") as fh:
-            raw = fh.read()
-        text = parse_html(raw)
-        metadata = {"source": filename, "type": "html"}
+            yield parse_html(fh.read())
     else:
         with open(path, "r", encoding="utf-8") as fh:
-            text = fh.read()
-        metadata = {"source": filename, "type": "text"}
+            while True:
+                block = fh.read(READ_BLOCK_SIZE)
+                if not block:
+                    break
+                yield block
+
+def extract_to_file(path: str, out_path: str) -> Dict[str, Any]:
+    """
+    Extracts a local file's text into `out_path` (UTF-8), piece by piece.
+    Runs inside extraction worker processes, so it only takes and returns plain data;
+    the caller records `seconds` (metrics don't cross the process boundary).
+    Returns: { "text_path": out_path, "chars": <extracted length>, "type": <file type>, "seconds": <time taken> }
+    """
+    start = time.perf_counter()
+    chars = 0
+    with open(out_path, "w", encoding="utf-8") as out:
+        for piece in iter_local_file_text(path):
+            out.write(piece)
+            chars += len(piece)
+    return {
+        "text_path": out_path,
+        "chars": chars,
+        "type": detect_file_type(os.path.basename(path)),
+        "seconds": time.perf_counter() - start,
+    }
 
+def process_local_file(path: str) -> Dict[str, Any]:
+    """
+    Helper for local/dev usage when you have a filepath
+    Returns dict: { "text": <extracted>, "metadata": {source, type} }
+    """
+    filename = os.path.basename(path).lower()
+    with stage(f"extract.{detect_file_type(filename)}"):
+        text = "".join(iter_local_file_text(path))
+    metadata = {"source": filename, "type": detect_file_type(filename)}
     return {"text": text, "metadata": metadata}
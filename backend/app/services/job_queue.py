@@ -0,0 +1,355 @@
+# app/services/job_queue.py
+import asyncio
+import json
+import os
+import shutil
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import Future
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+from app.services.file_ingestion import iter_local_file_text, detect_file_type, extract_to_file
+from app.services.kb_builder import KnowledgeBaseBuilder
+from app.utils.concurrency import run_in_pool, get_process_pool
+from app.utils.metrics import observe_stage
+
+# Job lifecycle states
+PENDING = "pending"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+
+JOBS_DB_PATH = os.getenv("JOBS_DB_PATH", "./jobs.db")
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "1"))
+# A running job belongs to the worker holding its lease; the worker renews it while
+# the job runs, so only jobs of a dead worker expire and are re-queued
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "60"))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    session_id TEXT NOT NULL,
+    status TEXT NOT NULL,
+    files TEXT NOT NULL,
+    progress TEXT NOT NULL,
+    result TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    owner TEXT,
+    lease_until REAL
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status, created_at);
+CREATE INDEX IF NOT EXISTS idx_jobs_session ON jobs(session_id);
+"""
+
+
+class JobStore:
+    """
+    SQLite-backed persistent queue of KB build jobs.
+    Each job records the staged files to ingest plus live progress counters,
+    so pending/interrupted jobs can be picked up again after a restart.
+    Several worker processes may share one database: claims are atomic and
+    running jobs are leased to the store (one per process) that claimed them.
+    """
+
+    def __init__(self, db_path: str = JOBS_DB_PATH, lease_seconds: float = JOB_LEASE_SECONDS):
+        self.db_path = db_path
+        self.lease_seconds = lease_seconds
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        parent = os.path.dirname(os.path.abspath(db_path))
+        os.makedirs(parent, exist_ok=True)
+        self._lock = threading.Lock()
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+            self._migrate(conn)
+
+    def _migrate(self, conn: sqlite3.Connection):
+        # Databases created before job leases lack their columns
+        columns = {row["name"] for row in conn.execute("PRAGMA table_info(jobs)")}
+        for column, kind in (("owner", "TEXT"), ("lease_until", "REAL")):
+            if column not in columns:
+                try:
+                    conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} {kind}")
+                except sqlite3.OperationalError as e:
+                    # A sibling worker added it first
+                    if "duplicate column" not in str(e):
+                        raise
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        try:
+            # Commit on success, roll back on error, always close
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _row_to_job(self, row: sqlite3.Row) -> Dict[str, Any]:
+        return {
+            "job_id": row["id"],
+            "session_id": row["session_id"],
+            "status": row["status"],
+            "files": json.loads(row["files"]),
+            "progress": json.loads(row["progress"]),
+            "result": json.loads(row["result"]) if row["result"] else None,
+            "error": row["error"],
+            "created_at": row["created_at"],
+            "updated_at": row["updated_at"],
+        }
+
+    def create_job(self, session_id: str, files: List[Dict[str, Any]], job_id: Optional[str] = None) -> str:
+        """
+        files: list of dicts { "path": staged file, "source": name, "size": bytes, "raw": bool }
+        """
+        job_id = job_id or str(uuid.uuid4())
+        now = time.time()
+        progress = {
+            "files_total": len(files),
+            "files_processed": 0,
+            "bytes_total": sum(f.get("size", 0) for f in files),
+            "bytes_processed": 0,
+            "chunks_total": 0,
+            "chunks_embedded": 0,
+        }
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, session_id, status, files, progress, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (job_id, session_id, PENDING, json.dumps(files), json.dumps(progress), now, now),
+            )
+        return job_id
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._row_to_job(row) if row else None
+
+    def list_for_session(self, session_id: str) -> List[Dict[str, Any]]:
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT * FROM jobs WHERE session_id = ? ORDER BY created_at DESC", (session_id,)
+            ).fetchall()
+        return [self._row_to_job(r) for r in rows]
+
+    def has_active_jobs(self, session_id: str) -> bool:
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT 1 FROM jobs WHERE session_id = ? AND status IN (?, ?) LIMIT 1", (session_id, PENDING, RUNNING)
+            ).fetchone()
+        return row is not None
+
+    def claim_next(self) -> Optional[Dict[str, Any]]:
+        """
+        Atomically moves the oldest pending job to running under this store's
+        lease and returns it. The UPDATE only succeeds while the job is still
+        pending, so two processes can never claim the same job.
+        """
+        while True:
+            with self._lock, self._connect() as conn:
+                row = conn.execute(
+                    "SELECT * FROM jobs WHERE status = ? ORDER BY created_at LIMIT 1", (PENDING,)
+                ).fetchone()
+                if row is None:
+                    return None
+                now = time.time()
+                cur = conn.execute(
+                    "UPDATE jobs SET status = ?, owner = ?, lease_until = ?, updated_at = ? WHERE id = ? AND status = ?",
+                    (RUNNING, self.owner, now + self.lease_seconds, now, row["id"], PENDING),
+                )
+            if cur.rowcount == 1:
+                job = self._row_to_job(row)
+                job["status"] = RUNNING
+                return job
+            # Another worker claimed it between our SELECT and UPDATE; try the next one
+
+    def renew_lease(self, job_id: str) -> bool:
+        """
+        Extends this store's lease on a running job; False if it no longer holds it.
+        """
+        with self._lock, self._connect() as conn:
+            cur = conn.execute(
+                "UPDATE jobs SET lease_until = ? WHERE id = ? AND owner = ? AND status = ?",
+                (time.time() + self.lease_seconds, job_id, self.owner, RUNNING),
+            )
+            return cur.rowcount == 1
+
+    def update_progress(self, job_id: str, **fields):
+        with self._lock, self._connect() as conn:
+            row = conn.execute("SELECT progress FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None:
+                return
+            progress = json.loads(row["progress"])
+            progress.update(fields)
+            conn.execute(
+                "UPDATE jobs SET progress = ?, updated_at = ? WHERE id = ?",
+                (json.dumps(progress), time.time(), job_id),
+            )
+
+    def finish(self, job_id: str, result: Dict[str, Any]):
+        self._set_status(job_id, COMPLETED, result=json.dumps(result))
+
+    def fail(self, job_id: str, error: str):
+        self._set_status(job_id, FAILED, error=error)
+
+    def _set_status(self, job_id: str, status: str, result: Optional[str] = None, error: Optional[str] = None):
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, updated_at = ? WHERE id = ?",
+                (status, result, error, time.time(), job_id),
+            )
+
+    def requeue_interrupted(self) -> int:
+        """
+        Jobs left 'running' by a crashed/restarted worker (their lease has run
+        out) go back to the queue. Jobs a live worker is renewing are left alone.
+        """
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            cur = conn.execute(
+                "UPDATE jobs SET status = ?, owner = NULL, lease_until = NULL, updated_at = ? "
+                "WHERE status = ? AND (lease_until IS NULL OR lease_until < ?)",
+                (PENDING, now, RUNNING, now),
+            )
+            return cur.rowcount
+
+
+class KBJobRunner:
+    """
+    Executes one KB build job: extracts the staged files in parallel on the process
+    pool, then streams their text through KnowledgeBaseBuilder.build_from_stream
+    in upload order while reporting progress to the store.
+    """
+
+    def __init__(self, store: JobStore, kb_builder: KnowledgeBaseBuilder):
+        self.store = store
+        self.kb_builder = kb_builder
+
+    def run(self, job: Dict[str, Any]) -> Dict[str, Any]:
+        job_id = job["job_id"]
+        progress = {"files_processed": 0, "bytes_processed": 0}
+
+        # Extract every non-raw file in parallel on the process pool up front; the
+        # builder then consumes results in upload order, so embedding file N
+        # overlaps extraction of the files after it.
+        pool = get_process_pool()
+        extractions = [
+            None if f.get("raw") else pool.submit(extract_to_file, f["path"], f["path"] + ".extracted.txt")
+            for f in job["files"]
+        ]
+
+        def tracked(f: Dict[str, Any], extraction: Optional[Future]) -> Iterator[str]:
+            # The file counts as processed once its text has been fully consumed
+            try:
+                if extraction is None:
+                    yield from iter_local_file_text(f["path"], raw=True)
+                else:
+                    # Re-raises the worker's exception so it is reported per file
+                    extracted = extraction.result()
+                    observe_stage(f"extract.{extracted['type']}", extracted["seconds"])
+                    yield from iter_local_file_text(extracted["text_path"], raw=True)
+            finally:
+                progress["files_processed"] += 1
+                progress["bytes_processed"] += f.get("size", 0)
+                self.store.update_progress(job_id, **progress)
+
+        docs = (
+            {
+                "source": f["source"],
+                "type": "html" if f.get("raw") else detect_file_type(f["source"]),
+                "pieces": tracked(f, extraction),
+            }
+            for f, extraction in zip(job["files"], extractions)
+        )
+
+        def on_progress(embedded: int, seen: int):
+            self.store.update_progress(job_id, chunks_embedded=embedded, chunks_total=seen)
+
+        kb_result = self.kb_builder.build_from_stream(
+            docs, session_id=job["session_id"], progress_callback=on_progress
+        )
+        file_errors = kb_result.pop("errors", [])
+        processed = [f["source"] for f in job["files"] if f["source"] not in {e["file"] for e in file_errors}]
+        if not processed:
+            raise ValueError(f"No valid documents processed: {file_errors}")
+
+        return {
+            "processed_files": processed,
+            "file_errors": file_errors,
+            "kb_build_result": kb_result,
+        }
+
+
+class JobWorker:
+    """
+    Async worker loop that drains the JobStore. Builds run on the embed pool
+    and JobStore writes on the vector pool, so the event loop stays free to
+    answer /jobs polling even while SQLite is contended.
+    """
+
+    def __init__(self, store: JobStore, runner: KBJobRunner, staging_dir: str, concurrency: int = JOB_WORKERS):
+        self.store = store
+        self.runner = runner
+        self.staging_dir = staging_dir
+        self.concurrency = max(1, concurrency)
+        self._wakeup: Optional[asyncio.Event] = None
+        self._tasks: List[asyncio.Task] = []
+
+    def start(self):
+        self._wakeup = asyncio.Event()
+        requeued = self.store.requeue_interrupted()
+        if requeued:
+            print(f"Re-queued {requeued} interrupted KB job(s)")
+        self._tasks = [asyncio.create_task(self._loop()) for _ in range(self.concurrency)]
+        # Pick up anything left pending from a previous run
+        self._wakeup.set()
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def notify(self):
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _loop(self):
+        while True:
+            # Clear before claiming so a notify() racing with claim_next() is not lost
+            self._wakeup.clear()
+            job = await run_in_pool("vector", self.store.claim_next)
+            if job is None:
+                try:
+                    # Wake up once per lease period to pick up jobs of a worker that died
+                    await asyncio.wait_for(self._wakeup.wait(), self.store.lease_seconds)
+                except asyncio.TimeoutError:
+                    await run_in_pool("vector", self.store.requeue_interrupted)
+                continue
+            await self._process(job)
+
+    async def _heartbeat(self, job_id: str):
+        while True:
+            await asyncio.sleep(self.store.lease_seconds / 3)
+            if not await run_in_pool("vector", self.store.renew_lease, job_id):
+                print(f"⚠️ Lost the lease on KB job {job_id}")
+                return
+
+    async def _process(self, job: Dict[str, Any]):
+        job_id = job["job_id"]
+        heartbeat = asyncio.create_task(self._heartbeat(job_id))
+        try:
+            result = await run_in_pool("embed", self.runner.run, job)
+            await run_in_pool("vector", self.store.finish, job_id, result)
+        except Exception as e:
+            print(f"KB job {job_id} failed: {e}")
+            await run_in_pool("vector", self.store.fail, job_id, str(e))
+        finally:
+            heartbeat.cancel()
+            # Staged uploads are only needed until the job has run
+            shutil.rmtree(os.path.join(self.staging_dir, job_id), ignore_errors=True)
@@ -1,51 +1,208 @@
 # app/services/kb_builder.py
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Callable, Iterable, Iterator
 from app.services.embeddings import EmbeddingService
 from app.services.vector_db import VectorDB
-from app.utils.chunk_utils import chunk_text
+from app.services.kb_manifest import KBManifest
+from app.services.lexical_index import LexicalIndex
+from app.services.registry import get_embedder, get_vector_db, get_lexical_index
+from app.utils.chunk_utils import iter_chunks, make_chunk_id
+from app.utils.metrics import CHUNKS, stage
+import hashlib
+import itertools
 import os
-from tqdm import tqdm
+import numpy as np
 
 class KnowledgeBaseBuilder:
-    def __init__(self, persist_dir: str = "./chroma_db"):
-        self.embedder = EmbeddingService()
-        self.vdb = VectorDB(persist_dir=persist_dir)
+    def __init__(
+        self,
+        persist_dir: str = "./chroma_db",
+        embedder: Optional[EmbeddingService] = None,
+        vector_db: Optional[VectorDB] = None,
+        manifest: Optional[KBManifest] = None,
+        lexical_index: Optional[LexicalIndex] = None,
+        batch_size: int = 64,
+    ):
+        # Default to the process-wide shared instances
+        self.embedder = embedder or get_embedder()
+        self.vdb = vector_db or get_vector_db(persist_dir)
+        # The manifest lives next to the Chroma data it describes
+        self.manifest = manifest or KBManifest(os.path.join(self.vdb.persist_dir, "kb_manifest.db"))
+        # BM25 postings over the same chunks, for hybrid retrieval
+        self.lexical = lexical_index or get_lexical_index(self.vdb.persist_dir)
+        self.batch_size = batch_size
 
-    def build_from_texts(self, texts: List[Dict[str, Any]], session_id: str, chunk_size: int = 800, chunk_overlap: int = 150):
+    def build_from_texts(
+        self,
+        texts: List[Dict[str, Any]],
+        session_id: str,
+        chunk_size: int = 800,
+        chunk_overlap: int = 150,
+        progress_callback: Optional[Callable[[int, int], None]] = None,
+    ):
         """
         texts: list of dicts { "source": filename, "text": "...", "type": "pdf|html|json|text" }
         This will chunk each text, create embeddings, and add chunks to the vector DB with metadata.
+        Convenience wrapper around build_from_stream for already-extracted texts.
         """
-        all_chunks = []
-        all_metas = []
-        for doc in texts:
+        docs = (
+            {"source": d.get("source", "unknown"), "type": d.get("type", "text"), "pieces": [d.get("text", "")]}
+            for d in texts
+        )
+        return self.build_from_stream(docs, session_id, chunk_size, chunk_overlap, progress_callback)
+
+    def build_from_stream(
+        self,
+        docs: Iterable[Dict[str, Any]],
+        session_id: str,
+        chunk_size: int = 800,
+        chunk_overlap: int = 150,
+        progress_callback: Optional[Callable[[int, int], None]] = None,
+    ):
+        """
+        docs: iterable of dicts { "source": filename, "type": "...", "pieces": iterable of text pieces }
+        Streaming pipeline: pieces (e.g. PDF pages) are chunked incrementally, embedded in
+        fixed-size batches into a reused buffer and upserted batch by batch, so memory stays
+        flat regardless of document size.
+        Indexing is incremental: only chunks not already indexed for this (session, source)
+        are embedded, chunks that disappeared from a document are deleted, and documents
+        whose content hash is unchanged are left untouched.
+        progress_callback(chunks_embedded, chunks_seen) is called after every batch.
+        """
+        stats = {"added": 0, "reused": 0, "deleted": 0, "total_chunks": 0, "seen": 0}
+        skipped_docs = []
+        errors = []
+        buffer = None
+
+        for doc in docs:
             source = doc.get("source", "unknown")
-            text = doc.get("text", "")
-            doc_type = doc.get("type", "text")
-            chunks = chunk_text(text, chunk_size=chunk_size, chunk_overlap=chunk_overlap)
-            for i, chunk in enumerate(chunks):
-                meta = {
-                    "source": source,
-                    "type": doc_type,
-                    "chunk_index": i,
-                    "chunk_size_est": len(chunk),
-                    "session_id": session_id
-                }
-                all_chunks.append(chunk)
-                all_metas.append(meta)
-
-        if not all_chunks:
-            return {"status": "no_chunks", "added": 0}
-
-        # Create embeddings in batches to avoid memory spikes
-        batch_size = 64
-        embeddings = []
-        for i in tqdm(range(0, len(all_chunks), batch_size), desc="Embedding batches"):
-            batch = all_chunks[i:i + batch_size]
-            emb = self.embedder.embed_texts(batch)
-            embeddings.extend(emb.tolist())
-
-        # Add to vector DB
-        self.vdb.add_documents(texts=all_chunks, embeddings=embeddings, metadatas=all_metas)
+            try:
+                unchanged, buffer = self._index_document(
+                    doc, session_id, chunk_size, chunk_overlap, buffer, stats, progress_callback
+                )
+                if unchanged:
+                    skipped_docs.append(source)
+            except Exception as e:
+                print(f"Error indexing {source}: {e}")
+                errors.append({"file": source, "error": str(e)})
+
         self.vdb.persist()
-        return {"status": "ok", "added": len(all_chunks)}
+        if stats["added"] or stats["deleted"] or not self.lexical.has_index(session_id):
+            with stage("lexical.compile"):
+                self.lexical.compile(session_id)
+        for event in ("added", "reused", "deleted"):
+            CHUNKS.inc(stats[event], event=event)
+        if progress_callback:
+            progress_callback(stats["added"], stats["seen"])
+
+        if stats["total_chunks"] == 0:
+            return {"status": "no_chunks", "added": 0, "errors": errors}
+
+        return {
+            "status": "ok",
+            "added": stats["added"],
+            "reused": stats["reused"],
+            "deleted": stats["deleted"],
+            "skipped_documents": skipped_docs,
+            "total_chunks": stats["total_chunks"],
+            "errors": errors
+        }
+
+    def _index_document(self, doc, session_id, chunk_size, chunk_overlap, buffer, stats, progress_callback):
+        """
+        Streams one document into the vector DB. Returns (unchanged, embedding buffer).
+        """
+        source = doc.get("source", "unknown")
+        doc_type = doc.get("type", "text")
+        collection = self.vdb.shard_name(session_id)
+        previous = self.manifest.get(session_id, source)
+        if previous is not None and previous["collection"] != collection:
+            # Indexed under another VECTOR_SHARD_MODE: none of its chunks are in this collection
+            previous = None
+        previous_ids = set(previous["chunk_ids"]) if previous else set()
+
+        hasher = hashlib.sha256()
+
+        def hashed(pieces: Iterable[str]) -> Iterator[str]:
+            for piece in pieces:
+                hasher.update(piece.encode("utf-8"))
+                yield piece
+
+        doc_ids: List[str] = []
+        seen = set()
+        added_ids: List[str] = []
+        # Metadata refreshes for kept chunks; dropped if the document turns out unchanged
+        kept_ids, kept_metas = [], []
+
+        try:
+            chunks = enumerate(iter_chunks(hashed(doc.get("pieces", [])), chunk_size=chunk_size, chunk_overlap=chunk_overlap))
+            while True:
+                # Pulling a batch also reads the pieces feeding it (extraction of raw/streamed files)
+                with stage("chunk"):
+                    batch = list(itertools.islice(chunks, self.batch_size))
+                if not batch:
+                    break
+                new_texts, new_ids, new_metas = [], [], []
+                for i, chunk in batch:
+                    chunk_id = make_chunk_id(session_id, source, chunk)
+                    if chunk_id in seen:
+                        # Repeated boilerplate inside one document is indexed once
+                        continue
+                    seen.add(chunk_id)
+                    doc_ids.append(chunk_id)
+                    meta = {
+                        "source": source,
+                        "type": doc_type,
+                        "chunk_index": i,
+                        "chunk_size_est": len(chunk),
+                        "session_id": session_id
+                    }
+                    if chunk_id in previous_ids:
+                        kept_ids.append(chunk_id)
+                        kept_metas.append(meta)
+                    else:
+                        new_texts.append(chunk)
+                        new_ids.append(chunk_id)
+                        new_metas.append(meta)
+
+                stats["seen"] += len(batch)
+                if new_texts:
+                    buffer = self._embed_batch(new_texts, buffer)
+                    self.vdb.upsert_documents(
+                        ids=new_ids, texts=new_texts, embeddings=buffer[:len(new_texts)], metadatas=new_metas,
+                        session_id=session_id,
+                    )
+                    self.lexical.add_chunks(session_id, new_ids, new_texts)
+                    added_ids.extend(new_ids)
+                    stats["added"] += len(new_texts)
+                if progress_callback:
+                    progress_callback(stats["added"], stats["seen"])
+        except Exception:
+            # Don't leave chunks of a half-read document behind untracked by the manifest
+            self.vdb.delete_ids(added_ids, session_id=session_id)
+            self.lexical.delete_chunks(session_id, added_ids)
+            stats["added"] -= len(added_ids)
+            raise
+
+        doc_hash = hasher.hexdigest()
+        stats["total_chunks"] += len(doc_ids)
+        if previous and previous["content_hash"] == doc_hash:
+            # Identical re-upload: nothing embedded, nothing to update or delete
+            return True, buffer
+
+        self.vdb.update_metadatas(kept_ids, kept_metas, session_id=session_id)
+        stale_ids = list(previous_ids - seen)
+        self.vdb.delete_ids(stale_ids, session_id=session_id)
+        self.lexical.delete_chunks(session_id, stale_ids)
+        self.manifest.put(session_id, source, doc_hash, doc_ids, collection=collection)
+        stats["reused"] += len(kept_ids)
+        stats["deleted"] += len(stale_ids)
+        return False, buffer
+
+    def _embed_batch(self, texts: List[str], buffer: Optional[np.ndarray]) -> np.ndarray:
+        """
+        Embeds one batch in place into a reused (batch_size, dim) float32 buffer.
+        """
+        if buffer is None:
+            buffer = np.empty((self.batch_size, self.embedder.dimension), dtype=np.float32)
+        self.embedder.embed_texts(texts, out=buffer[:len(texts)])
+        return buffer
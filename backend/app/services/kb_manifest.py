@@ -0,0 +1,92 @@
+# app/services/kb_manifest.py
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    session_id TEXT NOT NULL,
+    source TEXT NOT NULL,
+    content_hash TEXT NOT NULL,
+    chunk_ids TEXT NOT NULL,
+    updated_at REAL NOT NULL,
+    collection TEXT,
+    PRIMARY KEY (session_id, source)
+);
+"""
+
+
+class KBManifest:
+    """
+    Per-document manifest of what is already indexed in the vector DB.
+    For every (session, source) it records the content hash of the last build
+    and the content-addressed chunk ids that build produced, so a rebuild can
+    skip unchanged documents, embed only new chunks and delete stale ones. It
+    also records the vector collection the chunks went to, so an entry made
+    under another shard layout is not mistaken for indexed data.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._lock = threading.Lock()
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(documents)")}
+            if "collection" not in columns:
+                # Manifests written before shard-aware entries; NULL matches no collection
+                try:
+                    conn.execute("ALTER TABLE documents ADD COLUMN collection TEXT")
+                except sqlite3.OperationalError as e:
+                    if "duplicate column" not in str(e):
+                        raise
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def get(self, session_id: str, source: str) -> Optional[Dict]:
+        """
+        Returns { "content_hash": str, "chunk_ids": [...], "collection": str or None }
+        or None if never indexed.
+        """
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT content_hash, chunk_ids, collection FROM documents WHERE session_id = ? AND source = ?",
+                (session_id, source),
+            ).fetchone()
+        if row is None:
+            return None
+        return {
+            "content_hash": row["content_hash"],
+            "chunk_ids": json.loads(row["chunk_ids"]),
+            "collection": row["collection"],
+        }
+
+    def put(self, session_id: str, source: str, content_hash: str, chunk_ids: List[str], collection: Optional[str] = None):
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO documents (session_id, source, content_hash, chunk_ids, updated_at, collection) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (session_id, source, content_hash, json.dumps(chunk_ids), time.time(), collection),
+            )
+
+    def sources(self, session_id: str) -> List[str]:
+        with self._connect() as conn:
+            rows = conn.execute("SELECT source FROM documents WHERE session_id = ?", (session_id,)).fetchall()
+        return [r["source"] for r in rows]
+
+    def delete_session(self, session_id: str):
+        with self._lock, self._connect() as conn:
+            conn.execute("DELETE FROM documents WHERE session_id = ?", (session_id,))
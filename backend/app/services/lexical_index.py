@@ -0,0 +1,251 @@
+# app/services/lexical_index.py
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import tempfile
+import threading
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Set, Tuple
+import numpy as np
+from app.utils.metrics import stage
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+# Reciprocal-rank fusion constant (60 is the usual choice from the RRF paper)
+RRF_K = 60
+# Compiled session indexes kept in memory per worker
+LEXICAL_CACHE_SESSIONS = int(os.getenv("LEXICAL_CACHE_SESSIONS", "64"))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS chunks (
+    session_id TEXT NOT NULL,
+    chunk_id TEXT NOT NULL,
+    terms TEXT NOT NULL,
+    length INTEGER NOT NULL,
+    PRIMARY KEY (session_id, chunk_id)
+);
+"""
+
+# Keeps identifiers whole ("save15", "discount_code", "/apply_coupon", "john@example.com")
+_TOKEN_RE = re.compile(r"[a-z0-9]+(?:[_\-./@][a-z0-9]+)*")
+_SPLIT_RE = re.compile(r"[_\-./@]")
+
+
+def tokenize(text: str) -> List[str]:
+    tokens = []
+    for token in _TOKEN_RE.findall(text.lower()):
+        tokens.append(token)
+        if not token.isalnum():
+            # Compound identifiers also match on their parts
+            tokens.extend(part for part in _SPLIT_RE.split(token) if part)
+    return tokens
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[str]], k: int = RRF_K) -> List[str]:
+    """
+    Fuses ranked id lists: score(id) = sum over lists of 1 / (k + rank). Best first.
+    """
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, item in enumerate(ranking, start=1):
+            scores[item] = scores.get(item, 0.0) + 1.0 / (k + rank)
+    return sorted(scores, key=lambda item: -scores[item])
+
+
+class _CompiledIndex:
+    """
+    Array-backed BM25 index for one session. Terms are sorted so lookups are a
+    binary search; postings for term i are doc_ids/tfs[offsets[i]:offsets[i+1]].
+    """
+
+    def __init__(self, arrays):
+        self.chunk_ids = arrays["chunk_ids"]
+        self.doc_len = arrays["doc_len"]
+        self.terms = arrays["terms"]
+        self.offsets = arrays["offsets"]
+        self.doc_ids = arrays["doc_ids"]
+        self.tfs = arrays["tfs"]
+        self.avg_len = float(self.doc_len.mean()) if len(self.doc_len) else 0.0
+
+    def search(self, query: str, n: int) -> List[Tuple[str, float]]:
+        n_docs = len(self.doc_len)
+        if not n_docs:
+            return []
+        scores = np.zeros(n_docs, dtype=np.float32)
+        for term in set(tokenize(query)):
+            i = int(np.searchsorted(self.terms, term))
+            if i >= len(self.terms) or self.terms[i] != term:
+                continue
+            start, end = self.offsets[i], self.offsets[i + 1]
+            docs, tf = self.doc_ids[start:end], self.tfs[start:end]
+            df = end - start
+            idf = np.log1p((n_docs - df + 0.5) / (df + 0.5))
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * self.doc_len[docs] / self.avg_len)
+            # A term's postings hold each doc once, so fancy-index += is safe
+            scores[docs] += idf * tf * (BM25_K1 + 1) / (tf + norm)
+        hits = np.flatnonzero(scores > 0)
+        top = hits[np.argsort(-scores[hits], kind="stable")[:n]]
+        return [(str(self.chunk_ids[i]), float(scores[i])) for i in top]
+
+
+class LexicalIndex:
+    """
+    Per-session BM25 index over the same chunks (and chunk ids) as the vector DB.
+    KnowledgeBaseBuilder records each chunk's term counts in SQLite as it indexes
+    and compiles the session into sorted, array-backed postings (.npz) at the end
+    of a build; queries load that file once and keep it in memory until it changes.
+    Sessions indexed before BM25 existed are backfilled from the vector DB on
+    their first hybrid query (see ensure_index).
+    """
+
+    def __init__(self, index_dir: str, cache_sessions: int = LEXICAL_CACHE_SESSIONS):
+        self.index_dir = index_dir
+        self.cache_sessions = max(1, cache_sessions)
+        os.makedirs(index_dir, exist_ok=True)
+        self.db_path = os.path.join(index_dir, "lexical.db")
+        self._lock = threading.Lock()
+        # session_id -> (file mtime, compiled index), most recently used last
+        self._compiled: "OrderedDict[str, Tuple[int, _CompiledIndex]]" = OrderedDict()
+        # Sessions ensure_index found nothing to backfill for
+        self._nothing_to_backfill: Set[str] = set()
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _path(self, session_id: str) -> str:
+        return os.path.join(self.index_dir, hashlib.sha1(session_id.encode("utf-8")).hexdigest()[:20] + ".npz")
+
+    def has_index(self, session_id: str) -> bool:
+        return os.path.exists(self._path(session_id))
+
+    def ensure_index(self, session_id: str, load_chunks: Callable[[], Tuple[List[str], List[str]]]) -> bool:
+        """
+        Builds a missing session index from load_chunks() -> (chunk_ids, texts),
+        the session's chunks in the vector DB. Returns whether an index exists.
+        """
+        if self.has_index(session_id):
+            return True
+        with self._lock:
+            if session_id in self._nothing_to_backfill:
+                return False
+        chunk_ids, texts = load_chunks()
+        if chunk_ids:
+            self.add_chunks(session_id, chunk_ids, texts)
+            with stage("lexical.compile"):
+                self.compile(session_id)
+        else:
+            with self._lock:
+                self._nothing_to_backfill.add(session_id)
+        return self.has_index(session_id)
+
+    def add_chunks(self, session_id: str, chunk_ids: List[str], texts: List[str]):
+        rows = []
+        for chunk_id, text in zip(chunk_ids, texts):
+            tokens = tokenize(text)
+            rows.append((session_id, chunk_id, json.dumps(Counter(tokens), separators=(",", ":")), len(tokens)))
+        with self._lock, self._connect() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO chunks (session_id, chunk_id, terms, length) VALUES (?, ?, ?, ?)", rows
+            )
+
+    def delete_chunks(self, session_id: str, chunk_ids: List[str]):
+        if not chunk_ids:
+            return
+        with self._lock, self._connect() as conn:
+            conn.executemany(
+                "DELETE FROM chunks WHERE session_id = ? AND chunk_id = ?", [(session_id, c) for c in chunk_ids]
+            )
+
+    def delete_session(self, session_id: str):
+        with self._lock, self._connect() as conn:
+            conn.execute("DELETE FROM chunks WHERE session_id = ?", (session_id,))
+            self._compiled.pop(session_id, None)
+        try:
+            os.remove(self._path(session_id))
+        except FileNotFoundError:
+            pass
+
+    def compile(self, session_id: str) -> int:
+        """
+        Rebuilds the session's array-backed postings from the stored term counts.
+        Returns the number of indexed chunks.
+        """
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT chunk_id, terms, length FROM chunks WHERE session_id = ? ORDER BY chunk_id", (session_id,)
+            ).fetchall()
+        path = self._path(session_id)
+        if not rows:
+            self.delete_session(session_id)
+            return 0
+
+        postings: Dict[str, List[Tuple[int, int]]] = {}
+        for doc, row in enumerate(rows):
+            for term, tf in json.loads(row["terms"]).items():
+                postings.setdefault(term, []).append((doc, tf))
+        terms = sorted(postings)
+        offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(postings[t]) for t in terms])
+        total = int(offsets[-1])
+
+        # A unique temp file per build, so concurrent builds of one session never share one
+        fd, tmp_path = tempfile.mkstemp(dir=self.index_dir, suffix=".tmp.npz")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.savez(
+                    f,
+                    chunk_ids=np.array([row["chunk_id"] for row in rows], dtype=str),
+                    doc_len=np.array([row["length"] for row in rows], dtype=np.float32),
+                    terms=np.array(terms, dtype=str),
+                    offsets=offsets,
+                    doc_ids=np.fromiter((d for t in terms for d, _ in postings[t]), dtype=np.int32, count=total),
+                    tfs=np.fromiter((tf for t in terms for _, tf in postings[t]), dtype=np.float32, count=total),
+                )
+            # Atomic swap so concurrent queries never read a half-written file
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        with self._lock:
+            self._compiled.pop(session_id, None)
+        return len(rows)
+
+    def _load(self, session_id: str) -> Optional[_CompiledIndex]:
+        path = self._path(session_id)
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+        with self._lock:
+            cached = self._compiled.get(session_id)
+            if cached is not None and cached[0] == mtime:
+                self._compiled.move_to_end(session_id)
+                return cached[1]
+        with np.load(path, allow_pickle=False) as arrays:
+            index = _CompiledIndex({name: arrays[name] for name in arrays.files})
+        with self._lock:
+            self._compiled[session_id] = (mtime, index)
+            while len(self._compiled) > self.cache_sessions:
+                self._compiled.popitem(last=False)
+        return index
+
+    def search(self, session_id: str, query: str, n: int = 10) -> List[Tuple[str, float]]:
+        """
+        Top-n (chunk_id, bm25 score) for the query within one session.
+        """
+        with stage("lexical.search"):
+            index = self._load(session_id)
+            return index.search(query, n) if index is not None else []
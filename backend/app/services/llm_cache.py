@@ -0,0 +1,155 @@
+# app/services/llm_cache.py
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional, Tuple
+
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "1") == "1"
+LLM_CACHE_TTL_SECONDS = int(os.getenv("LLM_CACHE_TTL_SECONDS", str(24 * 3600)))
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "2000"))
+# Empty = memory only; set a path to keep responses across restarts and workers
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", "")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    response TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    last_access REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_responses_access ON responses(last_access);
+"""
+
+
+class LLMResponseCache:
+    """
+    Caches raw LLM responses keyed by sha256(provider, model, temperature,
+    system prompt, user prompt). An in-memory LRU serves repeats; with db_path
+    set, a SQLite tier behind it survives restarts and is shared by workers.
+    Entries expire after ttl_seconds and the least recently used are evicted
+    beyond max_entries.
+    """
+
+    def __init__(
+        self,
+        ttl_seconds: int = LLM_CACHE_TTL_SECONDS,
+        max_entries: int = LLM_CACHE_MAX_ENTRIES,
+        db_path: Optional[str] = LLM_CACHE_PATH or None,
+    ):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max(1, max_entries)
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        # key -> (created_at, response), most recently used last
+        self._memory: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if db_path:
+            os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+            with self._connect() as conn:
+                conn.executescript(_SCHEMA)
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def make_key(provider: str, model: str, temperature: float, system_prompt: str, user_prompt: str) -> str:
+        h = hashlib.sha256(json.dumps([provider, model, temperature]).encode("utf-8"))
+        for part in (system_prompt, user_prompt):
+            h.update(b"\0")
+            h.update(hashlib.sha256(part.encode("utf-8")).digest())
+        return h.hexdigest()
+
+    def _expired(self, created_at: float, now: float) -> bool:
+        return bool(self.ttl_seconds) and now - created_at > self.ttl_seconds
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and self._expired(entry[0], now):
+                del self._memory[key]
+                entry = None
+            if entry is None and self.db_path:
+                entry = self._disk_get(key, now)
+                if entry is not None:
+                    self._remember(key, entry)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._memory.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key: str, response: str):
+        now = time.time()
+        with self._lock:
+            self._remember(key, (now, response))
+            if self.db_path:
+                with self._connect() as conn:
+                    conn.execute(
+                        "INSERT OR REPLACE INTO responses (key, response, created_at, last_access) VALUES (?, ?, ?, ?)",
+                        (key, response, now, now),
+                    )
+                    self._disk_evict(conn, now)
+
+    def _remember(self, key: str, entry: Tuple[float, str]):
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self.evictions += 1
+
+    def _disk_get(self, key: str, now: float) -> Optional[Tuple[float, str]]:
+        with self._connect() as conn:
+            row = conn.execute("SELECT created_at, response FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if self._expired(row[0], now):
+                conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                return None
+            conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+        return row[0], row[1]
+
+    def _disk_evict(self, conn: sqlite3.Connection, now: float):
+        if self.ttl_seconds:
+            conn.execute("DELETE FROM responses WHERE created_at < ?", (now - self.ttl_seconds,))
+        excess = conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0] - self.max_entries
+        if excess > 0:
+            conn.execute(
+                "DELETE FROM responses WHERE key IN (SELECT key FROM responses ORDER BY last_access LIMIT ?)", (excess,)
+            )
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits / lookups) if lookups else 0.0,
+            "entries": len(self._memory),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "evictions": self.evictions,
+            "disk": bool(self.db_path),
+        }
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            if self.db_path:
+                with self._connect() as conn:
+                    conn.execute("DELETE FROM responses")
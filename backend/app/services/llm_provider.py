@@ -1,64 +1,343 @@
 import os
 import json
-import requests  # pip install requests
-from groq import Groq  # pip install groq
+import asyncio
+import random
+import time
+import httpx
+from groq import Groq, AsyncGroq, RateLimitError  # pip install groq
 from dotenv import load_dotenv
+from typing import AsyncIterator, Optional
+from app.services.llm_cache import LLMResponseCache
+from app.utils.concurrency import LLM_MAX_CONCURRENCY
+from app.utils.http_client import http_timeout, make_async_client, make_client
+from app.utils.metrics import CACHE_LOOKUPS, LLM_TOKENS, observe_stage, stage
+from app.utils.tokens import count_tokens
 
 load_dotenv()
 
+# Rate-limited (HTTP 429) async calls are retried with exponential backoff + jitter,
+# honouring the provider's Retry-After header when it sends one
+LLM_RATE_LIMIT_RETRIES = int(os.getenv("LLM_RATE_LIMIT_RETRIES", "4"))
+LLM_BACKOFF_BASE_SECONDS = float(os.getenv("LLM_BACKOFF_BASE_SECONDS", "1.0"))
+LLM_BACKOFF_MAX_SECONDS = float(os.getenv("LLM_BACKOFF_MAX_SECONDS", "30.0"))
+# Max silence between response bytes. Local Ollama on CPU can take minutes before its first token.
+OLLAMA_READ_TIMEOUT = float(os.getenv("OLLAMA_READ_TIMEOUT", "300"))
+GROQ_READ_TIMEOUT = float(os.getenv("GROQ_READ_TIMEOUT", "60"))
+# Model pulled into the local Ollama server
+OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "llama3")
+
+
+class LLMRateLimited(Exception):
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def _retry_after(headers) -> Optional[float]:
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
 class LLMProvider:
-    def __init__(self, provider="groq", model_name="llama-3.3-70b-versatile"):
+    def __init__(
+        self,
+        provider="groq",
+        model_name="llama-3.3-70b-versatile",
+        cache: Optional[LLMResponseCache] = None,
+        temperature: float = 0.1,  # Low temp for precision
+        ollama_model: Optional[str] = None,
+    ):
         self.provider = provider
         self.model_name = model_name
+        self.ollama_model = ollama_model or OLLAMA_MODEL
+        self.temperature = temperature
+        # Identical prompts return the stored response instead of a new completion
+        self.cache = cache
         self.client = None
-        
+        self.async_client = None
+
         if self.provider == "groq":
             api_key = os.getenv("GROQ_API_KEY")
             if not api_key:
                 # Fallback to Ollama if Groq key is missing, or raise warning
                 print("⚠️ GROQ_API_KEY not found. Ensure you set it if using Groq.")
             else:
-                self.client = Groq(api_key=api_key)
-        
-        # Ollama doesn't need a client init for HTTP requests, 
-        # but we can set the base URL
+                # The SDK keeps its own pooled httpx client; only the timeouts need setting
+                self.client = Groq(api_key=api_key, timeout=http_timeout(GROQ_READ_TIMEOUT))
+                self.async_client = AsyncGroq(api_key=api_key, timeout=http_timeout(GROQ_READ_TIMEOUT))
+
+        # Ollama is plain HTTP: pooled keep-alive clients are created on first use
         self.ollama_base_url = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
+        self._ollama_sync_client = None
+        self._ollama_async_client = None
+
+        # Bounds concurrent LLM calls made through the async path
+        self._semaphore = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
+
+    def _messages(self, system_prompt: str, user_content: str):
+        return [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_content}
+        ]
+
+    def _ollama_payload(self, system_prompt: str, user_content: str, stream: bool = False):
+        return {
+            "model": self.ollama_model,  # Ensure the model is pulled in Ollama
+            "messages": self._messages(system_prompt, user_content),
+            "stream": stream
+        }
+
+    def _ollama_client(self) -> httpx.AsyncClient:
+        if self._ollama_async_client is None:
+            self._ollama_async_client = make_async_client("ollama", self.ollama_base_url, OLLAMA_READ_TIMEOUT)
+        return self._ollama_async_client
+
+    def _ollama_blocking_client(self) -> httpx.Client:
+        if self._ollama_sync_client is None:
+            self._ollama_sync_client = make_client("ollama", self.ollama_base_url, OLLAMA_READ_TIMEOUT)
+        return self._ollama_sync_client
+
+    async def aclose(self):
+        if self._ollama_async_client is not None:
+            await self._ollama_async_client.aclose()
+            self._ollama_async_client = None
+        if self._ollama_sync_client is not None:
+            self._ollama_sync_client.close()
+            self._ollama_sync_client = None
 
-    def generate_response(self, system_prompt: str, user_content: str) -> str:
+    @property
+    def effective_model(self) -> str:
+        # Ollama requests always go to the locally pulled model
+        return self.model_name if self.provider == "groq" else self.ollama_model
+
+    def _cache_key(self, system_prompt: str, user_content: str) -> str:
+        return LLMResponseCache.make_key(self.provider, self.effective_model, self.temperature, system_prompt, user_content)
+
+    def _cached(self, key: str, use_cache: bool) -> Optional[str]:
+        if self.cache is None or not use_cache:
+            return None
+        response = self.cache.get(key)
+        CACHE_LOOKUPS.inc(cache="llm", result="miss" if response is None else "hit")
+        return response
+
+    def _store(self, key: str, response: Optional[str]):
+        # Failures are returned as "Error..." strings; never replay them
+        if self.cache is not None and response and not response.startswith("Error"):
+            self.cache.put(key, response)
+
+    def generate_response(self, system_prompt: str, user_content: str, use_cache: bool = True) -> str:
         """
         Sends request to LLM (Groq or Ollama) and returns raw string response.
+        With a cache attached, identical prompts are answered from it; use_cache=False
+        forces a fresh completion (which then replaces the cached one).
+        """
+        key = self._cache_key(system_prompt, user_content)
+        cached = self._cached(key, use_cache)
+        if cached is not None:
+            return cached
+        response = self._generate(system_prompt, user_content)
+        self._store(key, response)
+        return response
+
+    def _count_usage(self, system_prompt: str, user_content: str, response: str, prompt_tokens=None, completion_tokens=None):
+        """
+        Adds a completion to qa_llm_tokens_total: the provider's reported usage when
+        it sends one, else our tokenizer's count.
         """
+        if prompt_tokens is None:
+            prompt_tokens = count_tokens(system_prompt) + count_tokens(user_content)
+        if completion_tokens is None:
+            completion_tokens = count_tokens(response)
+        LLM_TOKENS.inc(prompt_tokens, model=self.effective_model, direction="in")
+        LLM_TOKENS.inc(completion_tokens, model=self.effective_model, direction="out")
+
+    def _count_groq_usage(self, system_prompt: str, user_content: str, chat_completion) -> str:
+        content = chat_completion.choices[0].message.content
+        usage = getattr(chat_completion, "usage", None)
+        self._count_usage(
+            system_prompt, user_content, content,
+            getattr(usage, "prompt_tokens", None), getattr(usage, "completion_tokens", None),
+        )
+        return content
+
+    def _count_ollama_usage(self, system_prompt: str, user_content: str, data) -> str:
+        content = data["message"]["content"]
+        self._count_usage(system_prompt, user_content, content, data.get("prompt_eval_count"), data.get("eval_count"))
+        return content
+
+    def _generate(self, system_prompt: str, user_content: str) -> str:
         try:
             if self.provider == "groq":
                 if not self.client:
                     return "Error: Groq client not initialized (missing API Key)."
-                
-                chat_completion = self.client.chat.completions.create(
-                    messages=[
-                        {"role": "system", "content": system_prompt},
-                        {"role": "user", "content": user_content}
-                    ],
-                    model=self.model_name,
-                    temperature=0.1,  # Low temp for precision
-                )
-                return chat_completion.choices[0].message.content
+
+                with stage("llm.groq", model=self.model_name):
+                    chat_completion = self.client.chat.completions.create(
+                        messages=self._messages(system_prompt, user_content),
+                        model=self.model_name,
+                        temperature=self.temperature,
+                    )
+                return self._count_groq_usage(system_prompt, user_content, chat_completion)
 
             elif self.provider == "ollama":
                 # Robust Ollama Implementation via HTTP
-                payload = {
-                    "model": "llama3",  # Ensure you have 'llama3' pulled in Ollama
-                    "messages": [
-                        {"role": "system", "content": system_prompt},
-                        {"role": "user", "content": user_content}
-                    ],
-                    "stream": False
-                }
-                response = requests.post(f"{self.ollama_base_url}/api/chat", json=payload)
-                
+                payload = self._ollama_payload(system_prompt, user_content)
+                with stage("llm.ollama", model=self.ollama_model):
+                    response = self._ollama_blocking_client().post("/api/chat", json=payload)
+
                 if response.status_code == 200:
-                    return response.json()["message"]["content"]
+                    return self._count_ollama_usage(system_prompt, user_content, response.json())
                 else:
                     return f"Error from Ollama: {response.text}"
 
         except Exception as e:
-            return f"Error interacting with LLM: {str(e)}"
\ No newline at end of file
+            return f"Error interacting with LLM: {str(e)}"
+
+    async def agenerate_response(self, system_prompt: str, user_content: str, use_cache: bool = True) -> str:
+        """
+        Async variant of generate_response: awaits the LLM without blocking the event loop.
+        """
+        key = self._cache_key(system_prompt, user_content)
+        cached = self._cached(key, use_cache)
+        if cached is not None:
+            return cached
+        response = await self._agenerate(system_prompt, user_content)
+        self._store(key, response)
+        return response
+
+    async def _agenerate(self, system_prompt: str, user_content: str) -> str:
+        for attempt in range(LLM_RATE_LIMIT_RETRIES + 1):
+            try:
+                # Backoff sleeps happen outside the semaphore so they don't hold a slot
+                async with self._semaphore:
+                    return await self._acomplete(system_prompt, user_content)
+            except LLMRateLimited as e:
+                if attempt == LLM_RATE_LIMIT_RETRIES:
+                    return f"Error interacting with LLM: rate limited after {attempt + 1} attempts ({e})"
+                await asyncio.sleep(self._backoff_delay(attempt, e.retry_after))
+            except Exception as e:
+                return f"Error interacting with LLM: {str(e)}"
+
+    def _backoff_delay(self, attempt: int, retry_after: Optional[float]) -> float:
+        if retry_after is not None:
+            return min(retry_after, LLM_BACKOFF_MAX_SECONDS)
+        delay = min(LLM_BACKOFF_BASE_SECONDS * (2 ** attempt), LLM_BACKOFF_MAX_SECONDS)
+        # Full jitter keeps a fanned-out batch from retrying in lockstep
+        return random.uniform(0, delay)
+
+    async def _acomplete(self, system_prompt: str, user_content: str) -> str:
+        """
+        One async LLM round-trip. Raises LLMRateLimited on HTTP 429.
+        """
+        if self.provider == "groq":
+            if not self.async_client:
+                return "Error: Groq client not initialized (missing API Key)."
+
+            try:
+                with stage("llm.groq", model=self.model_name):
+                    chat_completion = await self.async_client.chat.completions.create(
+                        messages=self._messages(system_prompt, user_content),
+                        model=self.model_name,
+                        temperature=self.temperature,
+                    )
+            except RateLimitError as e:
+                raise LLMRateLimited(str(e), _retry_after(e.response.headers)) from e
+            return self._count_groq_usage(system_prompt, user_content, chat_completion)
+
+        elif self.provider == "ollama":
+            payload = self._ollama_payload(system_prompt, user_content)
+            with stage("llm.ollama", model=self.ollama_model):
+                response = await self._ollama_client().post("/api/chat", json=payload)
+
+            if response.status_code == 200:
+                return self._count_ollama_usage(system_prompt, user_content, response.json())
+            elif response.status_code == 429:
+                raise LLMRateLimited(response.text, _retry_after(response.headers))
+            else:
+                return f"Error from Ollama: {response.text}"
+
+    async def astream_response(
+        self, system_prompt: str, user_content: str, use_cache: bool = True
+    ) -> AsyncIterator[str]:
+        """
+        Streaming variant of agenerate_response: yields text deltas as the LLM produces them.
+        A cache hit is yielded as a single chunk; a stream that completes is cached like a
+        normal response. Failures are yielded as an "Error..." chunk and never cached.
+        """
+        key = self._cache_key(system_prompt, user_content)
+        cached = self._cached(key, use_cache)
+        if cached is not None:
+            yield cached
+            return
+
+        parts = []
+        try:
+            async for delta in self._astream(system_prompt, user_content):
+                parts.append(delta)
+                yield delta
+        except Exception as e:
+            yield f"Error interacting with LLM: {str(e)}"
+            return
+        self._store(key, "".join(parts))
+
+    async def _astream(self, system_prompt: str, user_content: str) -> AsyncIterator[str]:
+        """
+        Yields the deltas of _astream_deltas, recording time to first token and the
+        whole stream as stages (no span: it would outlive the generator's context).
+        """
+        start = time.perf_counter()
+        parts = []
+        usage = {}
+        async for delta in self._astream_deltas(system_prompt, user_content, usage):
+            if not parts:
+                observe_stage(f"llm.{self.provider}.first_token", time.perf_counter() - start)
+            parts.append(delta)
+            yield delta
+        observe_stage(f"llm.{self.provider}.stream", time.perf_counter() - start)
+        self._count_usage(system_prompt, user_content, "".join(parts), usage.get("prompt_tokens"), usage.get("completion_tokens"))
+
+    async def _astream_deltas(self, system_prompt: str, user_content: str, usage: dict) -> AsyncIterator[str]:
+        # The semaphore is held for the whole stream, not just until the first token
+        async with self._semaphore:
+            if self.provider == "groq":
+                if not self.async_client:
+                    raise RuntimeError("Groq client not initialized (missing API Key).")
+
+                try:
+                    stream = await self.async_client.chat.completions.create(
+                        messages=self._messages(system_prompt, user_content),
+                        model=self.model_name,
+                        temperature=self.temperature,
+                        stream=True,
+                    )
+                except RateLimitError as e:
+                    raise LLMRateLimited(str(e), _retry_after(e.response.headers)) from e
+                async for chunk in stream:
+                    delta = chunk.choices[0].delta.content if chunk.choices else None
+                    if delta:
+                        yield delta
+
+            elif self.provider == "ollama":
+                # Ollama streams NDJSON: one {"message": {"content": ...}, "done": ...} object per line
+                payload = self._ollama_payload(system_prompt, user_content, stream=True)
+                async with self._ollama_client().stream("POST", "/api/chat", json=payload) as response:
+                    if response.status_code == 429:
+                        body = await response.aread()
+                        raise LLMRateLimited(body.decode("utf-8", "replace"), _retry_after(response.headers))
+                    if response.status_code != 200:
+                        body = await response.aread()
+                        raise RuntimeError(f"Ollama returned {response.status_code}: {body.decode('utf-8', 'replace')}")
+                    async for line in response.aiter_lines():
+                        if not line.strip():
+                            continue
+                        data = json.loads(line)
+                        delta = (data.get("message") or {}).get("content")
+                        if delta:
+                            yield delta
+                        if data.get("done"):
+                            # The final object carries the token counts
+                            usage["prompt_tokens"] = data.get("prompt_eval_count")
+                            usage["completion_tokens"] = data.get("eval_count")
+                            break
@@ -0,0 +1,402 @@
+# app/services/llm_router.py
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Dict, List, Optional, Set
+from app.services.llm_cache import LLMResponseCache
+from app.services.llm_provider import (
+    LLMProvider,
+    LLMRateLimited,
+    LLM_RATE_LIMIT_RETRIES,
+)
+from app.utils.metrics import CACHE_LOOKUPS
+
+# Backends in order of preference: "provider:model[@requests_per_minute]", comma separated.
+# Add a local Ollama (",ollama:llama3") or a client-side rate cap ("@30") explicitly.
+LLM_BACKENDS = os.getenv("LLM_BACKENDS", "groq:llama-3.3-70b-versatile")
+# Start a duplicate request on the next backend when the first is slower than its p95
+LLM_HEDGE_ENABLED = os.getenv("LLM_HEDGE_ENABLED", "0") == "1"
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+# A backend whose error EWMA is above this is tried last until it has been quiet for the cooldown
+LLM_UNHEALTHY_ERROR_RATE = float(os.getenv("LLM_UNHEALTHY_ERROR_RATE", "0.5"))
+LLM_UNHEALTHY_COOLDOWN_SECONDS = float(os.getenv("LLM_UNHEALTHY_COOLDOWN_SECONDS", "30"))
+EWMA_ALPHA = 0.2
+LATENCY_WINDOW = 200
+
+
+class TokenBucket:
+    """
+    Client-side rate limit: `rate` tokens per second, bursts up to `capacity`.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = max(1.0, capacity)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_acquire(self) -> bool:
+        with self._lock:
+            self._refill(time.monotonic())
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            return False
+
+    def wait_time(self) -> float:
+        with self._lock:
+            self._refill(time.monotonic())
+            return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def drain(self):
+        # The provider says we are over its limit, whatever our count says
+        with self._lock:
+            self.tokens = 0.0
+            self.updated = time.monotonic()
+
+
+class Backend:
+    """
+    One routable LLM (an LLMProvider without its own cache; its semaphore caps the
+    backend's in-flight requests at LLM_MAX_CONCURRENCY) with its health numbers:
+    latency and error-rate EWMAs, recent latencies for the hedge threshold, an
+    optional token bucket and the time until which the provider asked us to back off.
+    """
+
+    def __init__(self, llm: LLMProvider, rpm: float = 0):
+        self.llm = llm
+        self.name = f"{llm.provider}:{llm.effective_model}"
+        self.bucket = TokenBucket(rpm / 60, capacity=max(1.0, rpm / 10)) if rpm else None
+        self.ewma_latency: Optional[float] = None
+        self.ewma_error = 0.0
+        self.latencies: deque = deque(maxlen=LATENCY_WINDOW)
+        self.requests = 0
+        self.failures = 0
+        self.rate_limited = 0
+        self.throttled_in_a_row = 0
+        self.hedged = 0
+        self.cooldown_until = 0.0
+        self.last_failure = 0.0
+
+    def record(self, ok: bool, latency: Optional[float] = None):
+        self.requests += 1
+        self.ewma_error = (1 - EWMA_ALPHA) * self.ewma_error + EWMA_ALPHA * (0.0 if ok else 1.0)
+        if ok:
+            self.throttled_in_a_row = 0
+            self.latencies.append(latency)
+            self.ewma_latency = latency if self.ewma_latency is None else (1 - EWMA_ALPHA) * self.ewma_latency + EWMA_ALPHA * latency
+        else:
+            self.failures += 1
+            self.last_failure = time.monotonic()
+
+    def back_off(self, retry_after: Optional[float]):
+        # Same policy as a lone provider's retries: Retry-After, else exponential backoff with jitter
+        self.rate_limited += 1
+        self.cooldown_until = time.monotonic() + self.llm._backoff_delay(min(self.throttled_in_a_row, 5), retry_after)
+        self.throttled_in_a_row += 1
+        if self.bucket is not None:
+            self.bucket.drain()
+
+    def ready_in(self) -> float:
+        """
+        Seconds until this backend may be called (0 = now).
+        """
+        wait = max(0.0, self.cooldown_until - time.monotonic())
+        if self.bucket is not None:
+            wait = max(wait, self.bucket.wait_time())
+        return wait
+
+    @property
+    def unhealthy(self) -> bool:
+        return (
+            self.ewma_error > LLM_UNHEALTHY_ERROR_RATE
+            and time.monotonic() - self.last_failure < LLM_UNHEALTHY_COOLDOWN_SECONDS
+        )
+
+    def p95(self) -> Optional[float]:
+        if len(self.latencies) < LLM_HEDGE_MIN_SAMPLES:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[int(0.95 * (len(ordered) - 1))]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "failures": self.failures,
+            "rate_limited": self.rate_limited,
+            "hedged": self.hedged,
+            "ewma_latency_s": self.ewma_latency,
+            "ewma_error": round(self.ewma_error, 4),
+            "p95_s": self.p95(),
+            "ready_in_s": round(self.ready_in(), 2),
+            "unhealthy": self.unhealthy,
+        }
+
+
+class BackendUnavailable(Exception):
+    pass
+
+
+def parse_backends(spec: str) -> List[Dict[str, Any]]:
+    """
+    "groq:llama-3.3-70b-versatile@30,ollama:llama3" -> [{"provider", "model", "rpm"}, ...]
+    """
+    backends = []
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        item, _, rpm = item.partition("@")
+        provider, _, model = item.partition(":")
+        backends.append({"provider": provider, "model": model or None, "rpm": float(rpm) if rpm else 0})
+    return backends
+
+
+def build_backend(provider: str, model: Optional[str], rpm: float = 0) -> Backend:
+    # Responses are cached once, by the router, not per backend
+    if provider == "ollama":
+        llm = LLMProvider(provider="ollama", ollama_model=model)
+    else:
+        llm = LLMProvider(provider=provider, model_name=model or "llama-3.3-70b-versatile")
+    return Backend(llm, rpm=rpm)
+
+
+class LLMRouter:
+    """
+    Drop-in for LLMProvider that routes each completion over several backends
+    (Groq models, local Ollama) in order of preference. Backends that are
+    rate limited (client-side token bucket, or a 429 with its Retry-After),
+    failing, or erroring often are skipped, so a request fails over instead of
+    returning an error. With hedging on, a request still running past the
+    backend's p95 latency is duplicated on the next backend and the first
+    answer wins. Streams fail over only before their first token.
+
+    A backend that fails outright (connection refused, server error) is out for
+    the rest of the request; while any other backend is only rate limited the
+    request waits for it, as a single provider would, instead of failing.
+    """
+
+    def __init__(
+        self,
+        backends: List[Backend],
+        cache: Optional[LLMResponseCache] = None,
+        hedge: bool = LLM_HEDGE_ENABLED,
+        temperature: float = 0.1,
+    ):
+        if not backends:
+            raise ValueError("LLMRouter needs at least one backend")
+        self.backends = backends
+        self.cache = cache
+        self.hedge = hedge
+        self.temperature = temperature
+        self.provider = "router"
+
+    @property
+    def effective_model(self) -> str:
+        # Prompts are sized for the preferred backend
+        return self.backends[0].llm.effective_model
+
+    def _cache_key(self, system_prompt: str, user_content: str) -> str:
+        names = ",".join(b.name for b in self.backends)
+        return LLMResponseCache.make_key(self.provider, names, self.temperature, system_prompt, user_content)
+
+    def _cached(self, key: str, use_cache: bool) -> Optional[str]:
+        if self.cache is None or not use_cache:
+            return None
+        response = self.cache.get(key)
+        CACHE_LOOKUPS.inc(cache="llm", result="miss" if response is None else "hit")
+        return response
+
+    def _store(self, key: str, response: Optional[str]):
+        if self.cache is not None and response and not response.startswith("Error"):
+            self.cache.put(key, response)
+
+    def _ordered(self, failed: Set[Backend] = frozenset()) -> List[Backend]:
+        """
+        Backends callable right now, preferred first; unhealthy ones go last.
+        """
+        ready = [b for b in self.backends if b not in failed and b.ready_in() == 0]
+        return sorted(ready, key=lambda b: (b.unhealthy, self.backends.index(b)))
+
+    def _wait_time(self, failed: Set[Backend]) -> Optional[float]:
+        """
+        Seconds until the first backend that has not failed outright is callable
+        again, or None when every backend has failed.
+        """
+        waiting = [b for b in self.backends if b not in failed]
+        if not waiting:
+            return None
+        return max(min(b.ready_in() for b in waiting), 0.05)
+
+    def _all_failed(self, errors: List[str]) -> str:
+        return f"Error interacting with LLM: all backends failed ({'; '.join(errors[-len(self.backends):]) or 'rate limited'})"
+
+    # ------------------------------------------------------
+    # Sync path
+    # ------------------------------------------------------
+    def generate_response(self, system_prompt: str, user_content: str, use_cache: bool = True) -> str:
+        key = self._cache_key(system_prompt, user_content)
+        cached = self._cached(key, use_cache)
+        if cached is not None:
+            return cached
+        errors, failed = [], set()
+        while True:
+            for backend in self._ordered(failed):
+                if backend.bucket is not None and not backend.bucket.try_acquire():
+                    continue
+                start = time.perf_counter()
+                response = backend.llm._generate(system_prompt, user_content)
+                ok = bool(response) and not response.startswith("Error")
+                backend.record(ok, time.perf_counter() - start)
+                if ok:
+                    self._store(key, response)
+                    return response
+                errors.append(f"{backend.name}: {response}")
+                failed.add(backend)
+            wait = self._wait_time(failed)
+            if wait is None:
+                return self._all_failed(errors)
+            time.sleep(wait)
+
+    # ------------------------------------------------------
+    # Async path
+    # ------------------------------------------------------
+    async def agenerate_response(self, system_prompt: str, user_content: str, use_cache: bool = True) -> str:
+        key = self._cache_key(system_prompt, user_content)
+        cached = self._cached(key, use_cache)
+        if cached is not None:
+            return cached
+        response = await self._agenerate(system_prompt, user_content)
+        self._store(key, response)
+        return response
+
+    async def _attempt(self, backend: Backend, system_prompt: str, user_content: str) -> str:
+        if backend.bucket is not None and not backend.bucket.try_acquire():
+            raise BackendUnavailable(f"{backend.name} is over its request rate")
+        async with backend.llm._semaphore:
+            start = time.perf_counter()
+            try:
+                response = await backend.llm._acomplete(system_prompt, user_content)
+            except LLMRateLimited as e:
+                backend.record(False)
+                backend.back_off(e.retry_after)
+                raise
+            except asyncio.CancelledError:
+                # Lost a hedge race: neither a success nor a failure
+                raise
+            except Exception:
+                backend.record(False)
+                raise
+            if not response or response.startswith("Error"):
+                backend.record(False)
+                raise RuntimeError(response or "empty response")
+            backend.record(True, time.perf_counter() - start)
+            return response
+
+    async def _ahedged(self, primary: Backend, secondary: Backend, system_prompt: str, user_content: str) -> str:
+        first = asyncio.ensure_future(self._attempt(primary, system_prompt, user_content))
+        tasks = {first}
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=primary.p95())
+            if done:
+                return first.result()
+            secondary.hedged += 1
+            tasks.add(asyncio.ensure_future(self._attempt(secondary, system_prompt, user_content)))
+            error = None
+            while tasks:
+                done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def _agenerate(self, system_prompt: str, user_content: str) -> str:
+        errors, failed = [], set()
+        throttled_rounds = 0
+        while True:
+            candidates = self._ordered(failed)
+            throttled = False
+            for i, backend in enumerate(candidates):
+                secondary = candidates[i + 1] if i + 1 < len(candidates) else None
+                try:
+                    if self.hedge and secondary is not None and backend.p95() is not None:
+                        return await self._ahedged(backend, secondary, system_prompt, user_content)
+                    return await self._attempt(backend, system_prompt, user_content)
+                except LLMRateLimited as e:
+                    errors.append(f"{backend.name}: {e}")
+                    throttled = True
+                except BackendUnavailable as e:
+                    # Our own token bucket: waiting for it is queueing, not a retry
+                    errors.append(f"{backend.name}: {e}")
+                except Exception as e:
+                    errors.append(f"{backend.name}: {e}")
+                    failed.add(backend)
+            throttled_rounds += throttled
+            wait = self._wait_time(failed)
+            if wait is None or throttled_rounds > LLM_RATE_LIMIT_RETRIES:
+                return self._all_failed(errors)
+            # Everything left is rate limited: wait for the first backend to free up
+            await asyncio.sleep(wait)
+
+    async def astream_response(
+        self, system_prompt: str, user_content: str, use_cache: bool = True
+    ) -> AsyncIterator[str]:
+        """
+        Streams from the first backend that produces a token. Once tokens have been
+        yielded the stream is committed to that backend.
+        """
+        key = self._cache_key(system_prompt, user_content)
+        cached = self._cached(key, use_cache)
+        if cached is not None:
+            yield cached
+            return
+
+        errors, failed = [], set()
+        throttled_rounds = 0
+        while True:
+            throttled = False
+            for backend in self._ordered(failed):
+                if backend.bucket is not None and not backend.bucket.try_acquire():
+                    continue
+                parts = []
+                start = time.perf_counter()
+                try:
+                    async for delta in backend.llm._astream(system_prompt, user_content):
+                        parts.append(delta)
+                        yield delta
+                except Exception as e:
+                    backend.record(False)
+                    if parts:
+                        yield f"Error interacting with LLM: {str(e)}"
+                        return
+                    errors.append(f"{backend.name}: {e}")
+                    if isinstance(e, LLMRateLimited):
+                        backend.back_off(e.retry_after)
+                        throttled = True
+                    else:
+                        failed.add(backend)
+                    continue
+                backend.record(True, time.perf_counter() - start)
+                self._store(key, "".join(parts))
+                return
+            throttled_rounds += throttled
+            wait = self._wait_time(failed)
+            if wait is None or throttled_rounds > LLM_RATE_LIMIT_RETRIES:
+                yield self._all_failed(errors)
+                return
+            await asyncio.sleep(wait)
+
+    async def aclose(self):
+        for backend in self.backends:
+            await backend.llm.aclose()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"hedge": self.hedge, "backends": {b.name: b.stats() for b in self.backends}}
@@ -0,0 +1,160 @@
+# app/services/onnx_embeddings.py
+import json
+import os
+from typing import List, Optional, Tuple
+import numpy as np
+from app.services.embedding_cache import EmbeddingCache
+from app.services.embeddings import EmbeddingService
+
+# int8 dynamic-quantized weights: ~4x smaller and faster on CPU, tiny similarity drift
+EMBEDDING_ONNX_QUANTIZE = os.getenv("EMBEDDING_ONNX_QUANTIZE", "0") == "1"
+# 0 = let onnxruntime use every physical core
+EMBEDDING_ONNX_THREADS = int(os.getenv("EMBEDDING_ONNX_THREADS", "0"))
+EMBEDDING_ONNX_INTER_THREADS = int(os.getenv("EMBEDDING_ONNX_INTER_THREADS", "1"))
+EMBEDDING_ONNX_BATCH_SIZE = int(os.getenv("EMBEDDING_ONNX_BATCH_SIZE", "32"))
+# all-MiniLM-L6-v2 was trained with 256-token inputs; longer text is truncated, as in sentence-transformers
+EMBEDDING_ONNX_MAX_LENGTH = int(os.getenv("EMBEDDING_ONNX_MAX_LENGTH", "256"))
+# Optional local directory holding model.onnx (and/or the quantized file) plus tokenizer.json;
+# when unset the files are fetched once from the model's Hugging Face repo
+EMBEDDING_ONNX_DIR = os.getenv("EMBEDDING_ONNX_DIR", "")
+
+# ONNX exports published alongside sentence-transformers models on the hub
+ONNX_MODEL_FILES = {False: "onnx/model.onnx", True: "onnx/model_quint8_avx2.onnx"}
+
+
+class OnnxEmbeddingService(EmbeddingService):
+    """
+    EmbeddingService running the exported transformer on ONNX Runtime instead of
+    PyTorch, with optional int8 weights and explicit thread counts. Tokenization
+    uses the model's fast tokenizer; mean pooling and L2 normalization reproduce
+    the sentence-transformers pipeline, so vectors stay comparable with the
+    torch backend. Neither torch nor sentence-transformers is imported.
+    """
+
+    def __init__(
+        self,
+        model_name: str = "all-MiniLM-L6-v2",
+        cache: Optional[EmbeddingCache] = None,
+        quantize: bool = EMBEDDING_ONNX_QUANTIZE,
+        intra_op_threads: int = EMBEDDING_ONNX_THREADS,
+        inter_op_threads: int = EMBEDDING_ONNX_INTER_THREADS,
+        batch_size: int = EMBEDDING_ONNX_BATCH_SIZE,
+        max_length: int = EMBEDDING_ONNX_MAX_LENGTH,
+        model_dir: str = EMBEDDING_ONNX_DIR,
+    ):
+        super().__init__(model_name=model_name, cache=cache)
+        self.quantize = quantize
+        self.intra_op_threads = intra_op_threads
+        self.inter_op_threads = inter_op_threads
+        self.batch_size = max(1, batch_size)
+        self.max_length = max_length
+        self.model_dir = model_dir
+        self.normalize = True
+        self._tokenizer = None
+        self._input_names: List[str] = []
+        self._dimension: Optional[int] = None
+
+    @property
+    def cache_namespace(self) -> str:
+        # Quantized vectors differ slightly from full-precision ones
+        return f"{self.model_name}:onnx-{'int8' if self.quantize else 'fp32'}"
+
+    @property
+    def repo_id(self) -> str:
+        return self.model_name if "/" in self.model_name else f"sentence-transformers/{self.model_name}"
+
+    def _fetch(self, filename: str) -> Optional[str]:
+        """
+        Local path of one model file, from model_dir or the hub cache. None if the model has no such file.
+        """
+        if self.model_dir:
+            for candidate in (os.path.join(self.model_dir, filename), os.path.join(self.model_dir, os.path.basename(filename))):
+                if os.path.exists(candidate):
+                    return candidate
+            return None
+        from huggingface_hub import hf_hub_download
+        from huggingface_hub.utils import EntryNotFoundError, LocalEntryNotFoundError
+        try:
+            return hf_hub_download(self.repo_id, filename)
+        except LocalEntryNotFoundError:
+            # Offline and not cached: a download problem, not a missing file
+            raise
+        except EntryNotFoundError:
+            return None
+
+    def _model_files(self) -> Tuple[str, str]:
+        model_path = self._fetch(ONNX_MODEL_FILES[self.quantize])
+        if model_path is None:
+            raise FileNotFoundError(f"No {ONNX_MODEL_FILES[self.quantize]} for {self.model_name}")
+        tokenizer_path = self._fetch("tokenizer.json")
+        if tokenizer_path is None:
+            raise FileNotFoundError(f"No tokenizer.json for {self.model_name}")
+
+        # Models without a Normalize module produce unnormalized sentence vectors
+        modules_path = self._fetch("modules.json")
+        if modules_path is not None:
+            with open(modules_path, encoding="utf-8") as f:
+                self.normalize = any(m.get("type", "").endswith("Normalize") for m in json.load(f))
+        return model_path, tokenizer_path
+
+    @property
+    def model(self):
+        if self._model is None:
+            with self._load_lock:
+                if self._model is None:
+                    import onnxruntime as ort
+                    from tokenizers import Tokenizer
+
+                    model_path, tokenizer_path = self._model_files()
+                    options = ort.SessionOptions()
+                    options.intra_op_num_threads = self.intra_op_threads
+                    options.inter_op_num_threads = self.inter_op_threads
+                    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+                    session = ort.InferenceSession(model_path, sess_options=options, providers=["CPUExecutionProvider"])
+
+                    tokenizer = Tokenizer.from_file(tokenizer_path)
+                    tokenizer.enable_truncation(max_length=self.max_length)
+                    # Pad to the longest text of each batch, not to max_length
+                    tokenizer.enable_padding()
+                    self._tokenizer = tokenizer
+                    self._input_names = [i.name for i in session.get_inputs()]
+                    self._model = session
+        return self._model
+
+    @property
+    def dimension(self) -> int:
+        if self._dimension is None:
+            self._dimension = int(self._encode(["dimension probe"]).shape[1])
+        return self._dimension
+
+    def _encode_batch(self, texts: List[str]) -> np.ndarray:
+        session = self.model
+        encodings = self._tokenizer.encode_batch(texts)
+        feeds = {
+            "input_ids": np.array([e.ids for e in encodings], dtype=np.int64),
+            "attention_mask": np.array([e.attention_mask for e in encodings], dtype=np.int64),
+            "token_type_ids": np.array([e.type_ids for e in encodings], dtype=np.int64),
+        }
+        token_embeddings = session.run(None, {name: feeds[name] for name in self._input_names})[0]
+
+        # Mean pooling over real (non-padding) tokens
+        mask = feeds["attention_mask"][:, :, None].astype(np.float32)
+        summed = (token_embeddings * mask).sum(axis=1)
+        embeddings = summed / np.clip(mask.sum(axis=1), 1e-9, None)
+        if self.normalize:
+            embeddings /= np.clip(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12, None)
+        return embeddings.astype(np.float32, copy=False)
+
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        if not texts:
+            return np.empty((0, self.dimension), dtype=np.float32)
+        # Sort by length so each padded batch wastes as little compute as possible
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        out = None
+        for start in range(0, len(order), self.batch_size):
+            rows = order[start:start + self.batch_size]
+            batch = self._encode_batch([texts[i] for i in rows])
+            if out is None:
+                out = np.empty((len(texts), batch.shape[1]), dtype=np.float32)
+            out[rows] = batch
+        return out
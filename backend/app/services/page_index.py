@@ -0,0 +1,124 @@
+# app/services/page_index.py
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional, Tuple
+from app.utils.parser_utils import build_selector_index, SELECTOR_INDEX_VERSION
+
+# Parsed pages kept in memory per worker (the SQLite index is the source of truth)
+PAGE_CACHE_SIZE = int(os.getenv("PAGE_CACHE_SIZE", "128"))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS pages (
+    session_id TEXT PRIMARY KEY,
+    path TEXT NOT NULL,
+    content_hash TEXT NOT NULL,
+    selectors TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+"""
+
+
+class PageIndex:
+    """
+    Maps each session to its uploaded HTML page and that page's selector index
+    (inputs, buttons, forms, labels, ids/names, CSS paths), built once at upload.
+    Script generation looks pages up here instead of scanning the upload dir and
+    re-parsing the HTML. Re-uploading replaces the session's entry; the in-memory
+    copy is checked against the stored content hash so other workers see it too.
+    """
+
+    def __init__(self, db_path: str, cache_size: int = PAGE_CACHE_SIZE):
+        self.db_path = db_path
+        self.cache_size = max(1, cache_size)
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._lock = threading.Lock()
+        # session_id -> (content_hash, selectors), most recently used last. The raw
+        # HTML is not kept: prompts are built from the selector index alone.
+        self._memory: "OrderedDict[str, Tuple[str, Dict]]" = OrderedDict()
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def index_page(self, session_id: str, path: str) -> Dict:
+        """
+        Parses the page at path and stores it as the session's page; returns its selector index.
+        """
+        with open(path, "r", encoding="utf-8", errors="ignore") as f:
+            html = f.read()
+        content_hash = hashlib.sha256(html.encode("utf-8")).hexdigest()
+
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT path, content_hash, selectors FROM pages WHERE session_id = ?", (session_id,)
+            ).fetchone()
+        if row is not None and row["path"] == path and row["content_hash"] == content_hash:
+            selectors = json.loads(row["selectors"])
+            # Same page uploaded again: keep the existing index unless its format is outdated
+            if selectors.get("version") == SELECTOR_INDEX_VERSION:
+                return selectors
+
+        selectors = build_selector_index(html)
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO pages (session_id, path, content_hash, selectors, updated_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (session_id, path, content_hash, json.dumps(selectors, separators=(",", ":")), time.time()),
+            )
+            self._remember(session_id, (content_hash, selectors))
+        return selectors
+
+    def get(self, session_id: str) -> Optional[Dict]:
+        """
+        Returns the selector index of the session's page, or None if it has none indexed.
+        """
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT path, content_hash, selectors FROM pages WHERE session_id = ?", (session_id,)
+            ).fetchone()
+        if row is None:
+            return None
+
+        with self._lock:
+            entry = self._memory.get(session_id)
+            if entry is not None and entry[0] == row["content_hash"]:
+                self._memory.move_to_end(session_id)
+                return entry[1]
+
+        selectors = json.loads(row["selectors"])
+        if selectors.get("version") != SELECTOR_INDEX_VERSION:
+            # Indexed by an older build: rebuild once in the current format
+            try:
+                return self.index_page(session_id, row["path"])
+            except FileNotFoundError:
+                self.delete_session(session_id)
+                return None
+        with self._lock:
+            self._remember(session_id, (row["content_hash"], selectors))
+        return selectors
+
+    def _remember(self, session_id: str, entry: Tuple[str, Dict]):
+        self._memory[session_id] = entry
+        self._memory.move_to_end(session_id)
+        while len(self._memory) > self.cache_size:
+            self._memory.popitem(last=False)
+
+    def delete_session(self, session_id: str):
+        with self._lock, self._connect() as conn:
+            conn.execute("DELETE FROM pages WHERE session_id = ?", (session_id,))
+            self._memory.pop(session_id, None)
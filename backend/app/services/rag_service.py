@@ -1,31 +1,228 @@
+import asyncio
 import json
+import os
 import re  # <--- Import Regex
-from typing import List, Dict, Any
+import time
+from typing import List, Dict, Any, Optional, AsyncIterator, Tuple
 from app.services.vector_db import VectorDB
 from app.services.embeddings import EmbeddingService
+from app.services.batching_embedder import BatchingEmbedder, EMBED_BATCHING_ENABLED
+from app.services.lexical_index import LexicalIndex, reciprocal_rank_fusion
 from app.services.llm_provider import LLMProvider
+from app.services.registry import get_embedder, get_vector_db, get_llm, get_lexical_index, get_reranker
+from app.services.reranker import Reranker, RERANK_ENABLED, RERANK_CANDIDATES
+from app.utils.concurrency import run_in_pool
+from app.utils.context_builder import assemble_context, context_budget
+from app.utils.metrics import CHUNKS, PROMPT_TOKENS, stage
+from app.utils.tokens import count_tokens
+
+# "dense" = vector search only, "hybrid" = vector + BM25 fused with reciprocal-rank fusion
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "hybrid")
+# In hybrid mode each retriever returns k * this many candidates before fusion
+HYBRID_FETCH_MULTIPLIER = int(os.getenv("HYBRID_FETCH_MULTIPLIER", "4"))
 
 class RAGService:
-    def __init__(self, persist_dir: str = "./chroma_db"):
-        self.vector_db = VectorDB(persist_dir=persist_dir)
-        self.embedder = EmbeddingService()
-        self.llm = LLMProvider() 
+    def __init__(
+        self,
+        persist_dir: str = "./chroma_db",
+        embedder: Optional[EmbeddingService] = None,
+        vector_db: Optional[VectorDB] = None,
+        llm: Optional[LLMProvider] = None,
+        context_token_budget: Optional[int] = None,
+        lexical_index: Optional[LexicalIndex] = None,
+        retrieval_mode: str = RETRIEVAL_MODE,
+        reranker: Optional[Reranker] = None,
+        rerank_candidates: int = RERANK_CANDIDATES,
+        query_embedder: Optional[BatchingEmbedder] = None,
+    ):
+        # Default to the process-wide shared instances
+        self.vector_db = vector_db or get_vector_db(persist_dir)
+        self.embedder = embedder or get_embedder()
+        self.llm = llm or get_llm()
+        # Concurrent requests' query embeddings are encoded together in micro-batches
+        self.query_embedder = query_embedder or (BatchingEmbedder(self.embedder) if EMBED_BATCHING_ENABLED else None)
+        # The BM25 index lives next to the vector store it mirrors
+        vdb_dir = getattr(self.vector_db, "persist_dir", None)
+        self.lexical_index = lexical_index or (get_lexical_index(vdb_dir) if vdb_dir else None)
+        self.retrieval_mode = retrieval_mode
+        # Optional cross-encoder stage: over-fetch rerank_candidates, keep the best k
+        self.reranker = reranker or (get_reranker() if RERANK_ENABLED else None)
+        self.rerank_candidates = rerank_candidates
+        # Max tokens of retrieved context per prompt, sized for the model in use
+        self.context_token_budget = context_token_budget or context_budget(getattr(self.llm, "effective_model", None))
 
     # UPDATED: Accept session_id
-    def generate_test_cases(self, query: str, session_id: str, k: int = 5,) -> List[Dict[str, Any]]:
-        # 1. Embed & Retrieve (Same as before)
-        query_embedding = self.embedder.embed_texts([query])[0].tolist()
-        results = self.vector_db.query(query_embedding, n_results=k, session_id=session_id)
-        
+    def generate_test_cases(self, query: str, session_id: str, k: int = 5, use_cache: bool = True) -> List[Dict[str, Any]]:
+        # 1. Embed & Retrieve (and rerank)
+        results, retrieval_stats = self._select(query, session_id, k)
+
         # If absolutely no docs found in DB
         if not results:
             return [{"error": "Knowledge Base is empty or no matches found."}]
 
-        context_str = ""
-        for i, doc in enumerate(results):
-            source = doc['metadata'].get('source', 'Unknown')
-            text = doc['document']
-            context_str += f"--- SOURCE {i+1}: {source} ---\n{text}\n\n"
+        system_prompt, user_prompt, _ = self._build_prompts(query, results, retrieval_stats)
+
+        # 3. Call LLM
+        raw_response = self.llm.generate_response(system_prompt, user_prompt, use_cache=use_cache)
+
+        return self._parse_response(raw_response)
+
+    async def agenerate_test_cases(
+        self, query: str, session_id: str, k: int = 5, use_cache: bool = True
+    ) -> List[Dict[str, Any]]:
+        """
+        Async variant: embedding and Chroma run on bounded pools, the LLM call is awaited.
+        use_cache=False skips the LLM response cache (forced regeneration).
+        """
+        test_cases, _ = await self.agenerate_test_cases_with_stats(query, session_id, k=k, use_cache=use_cache)
+        return test_cases
+
+    async def agenerate_test_cases_with_stats(
+        self, query: str, session_id: str, k: int = 5, use_cache: bool = True
+    ) -> Tuple[List[Dict[str, Any]], Optional[Dict[str, Any]]]:
+        """
+        Same as agenerate_test_cases, also returning the prompt/context token stats (None if nothing was retrieved).
+        """
+        results, retrieval_stats = await self._aselect(query, session_id, k)
+
+        if not results:
+            return [{"error": "Knowledge Base is empty or no matches found."}], None
+
+        system_prompt, user_prompt, stats = self._build_prompts(query, results, retrieval_stats)
+        raw_response = await self.llm.agenerate_response(system_prompt, user_prompt, use_cache=use_cache)
+        return self._parse_response(raw_response), stats
+
+    async def astream_test_cases(
+        self, query: str, session_id: str, k: int = 5, use_cache: bool = True
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Streaming variant: yields {"event": "token", "text": ...} as the LLM writes,
+        then one {"event": "done", "results": [...], "prompt_stats": ...} with the parsed test cases.
+        """
+        results, retrieval_stats = await self._aselect(query, session_id, k)
+
+        if not results:
+            yield {"event": "done", "results": [{"error": "Knowledge Base is empty or no matches found."}], "prompt_stats": None}
+            return
+
+        system_prompt, user_prompt, stats = self._build_prompts(query, results, retrieval_stats)
+        parts = []
+        async for delta in self.llm.astream_response(system_prompt, user_prompt, use_cache=use_cache):
+            parts.append(delta)
+            yield {"event": "token", "text": delta}
+        yield {"event": "done", "results": self._parse_response("".join(parts)), "prompt_stats": stats}
+
+    def _candidate_count(self, k: int) -> int:
+        return max(k, self.rerank_candidates) if self.reranker is not None else k
+
+    def _select(self, query: str, session_id: str, k: int) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+        """
+        The k chunks to build the context from, plus retrieval timing stats.
+        """
+        start = time.perf_counter()
+        with stage("retrieve"):
+            candidates = self._retrieve(query, session_id, self._candidate_count(k))
+        stats = {"retrieval_ms": round((time.perf_counter() - start) * 1000, 1)}
+        if self.reranker is None or not candidates:
+            return candidates, stats
+        results, rerank_stats = self.reranker.rerank(query, candidates, k)
+        stats.update(rerank_stats)
+        return results, stats
+
+    async def _aselect(self, query: str, session_id: str, k: int) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+        """
+        Async _select: the cross-encoder runs on the embed pool, like the bi-encoder.
+        """
+        start = time.perf_counter()
+        with stage("retrieve"):
+            candidates = await self._aretrieve(query, session_id, self._candidate_count(k))
+        stats = {"retrieval_ms": round((time.perf_counter() - start) * 1000, 1)}
+        if self.reranker is None or not candidates:
+            return candidates, stats
+        results, rerank_stats = await run_in_pool("embed", self.reranker.rerank, query, candidates, k)
+        stats.update(rerank_stats)
+        return results, stats
+
+    @property
+    def hybrid(self) -> bool:
+        return self.retrieval_mode == "hybrid" and self.lexical_index is not None
+
+    def _retrieve(self, query: str, session_id: str, k: int) -> List[Dict[str, Any]]:
+        n = k * HYBRID_FETCH_MULTIPLIER if self.hybrid else k
+        # Pass the float32 row straight to Chroma instead of boxing it into a list
+        query_embedding = self.embedder.embed_texts([query])[0]
+        dense = self.vector_db.query(query_embedding, n_results=n, session_id=session_id)
+        if not self.hybrid:
+            return dense
+        lexical = self._lexical_search(session_id, query, n)
+        ranked, missing = self._fuse(dense, lexical, k)
+        fetched = self.vector_db.get_by_ids(missing, session_id=session_id) if missing else []
+        return self._collect(ranked, dense, fetched)
+
+    async def _aretrieve(self, query: str, session_id: str, k: int) -> List[Dict[str, Any]]:
+        """
+        Dense retrieval, or in hybrid mode dense + BM25 run concurrently and fused with RRF.
+        """
+        if not self.hybrid:
+            return await self._adense(query, session_id, k)
+        n = k * HYBRID_FETCH_MULTIPLIER
+        dense, lexical = await asyncio.gather(
+            self._adense(query, session_id, n),
+            run_in_pool("vector", self._lexical_search, session_id, query, n),
+        )
+        ranked, missing = self._fuse(dense, lexical, k)
+        fetched = await run_in_pool("vector", self.vector_db.get_by_ids, missing, session_id=session_id) if missing else []
+        return self._collect(ranked, dense, fetched)
+
+    def _lexical_search(self, session_id: str, query: str, n: int) -> List[Tuple[str, float]]:
+        # Sessions indexed before BM25 existed get their index built on first use
+        self.lexical_index.ensure_index(session_id, lambda: self.vector_db.get_session_chunks(session_id))
+        return self.lexical_index.search(session_id, query, n)
+
+    async def _adense(self, query: str, session_id: str, n: int) -> List[Dict[str, Any]]:
+        if self.query_embedder is not None:
+            embeddings = await self.query_embedder.aembed([query])
+        else:
+            embeddings = await run_in_pool("embed", self.embedder.embed_texts, [query])
+        query_embedding = embeddings[0]
+        return await run_in_pool("vector", self.vector_db.query, query_embedding, n_results=n, session_id=session_id)
+
+    @staticmethod
+    def _fuse(dense: List[Dict[str, Any]], lexical: List[Tuple[str, float]], k: int) -> Tuple[List[str], List[str]]:
+        """
+        Top-k chunk ids by reciprocal-rank fusion, plus the ids only BM25 found
+        (their text still has to be fetched from the vector DB).
+        """
+        dense_ids = [r["id"] for r in dense]
+        ranked = reciprocal_rank_fusion([dense_ids, [chunk_id for chunk_id, _ in lexical]])[:k]
+        known = set(dense_ids)
+        return ranked, [chunk_id for chunk_id in ranked if chunk_id not in known]
+
+    @staticmethod
+    def _collect(ranked: List[str], dense: List[Dict[str, Any]], fetched: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        by_id = {r["id"]: r for r in fetched}
+        by_id.update((r["id"], r) for r in dense)
+        return [by_id[chunk_id] for chunk_id in ranked if chunk_id in by_id]
+
+    def _build_prompts(self, query: str, results: List[Dict[str, Any]], retrieval_stats: Optional[Dict[str, Any]] = None):
+        """
+        Returns (system_prompt, user_prompt, prompt_stats). Retrieved chunks are
+        deduplicated, merged per source and fitted to context_token_budget.
+        retrieval_stats (timings, rerank numbers) are carried into prompt_stats.
+        """
+        with stage("prompt.testcases"):
+            system_prompt, user_prompt, stats = self._assemble_prompts(query, results)
+        stats.update(retrieval_stats or {})
+        CHUNKS.inc(stats["chunks_retrieved"], event="retrieved")
+        CHUNKS.inc(stats["chunks_used"], event="used")
+        CHUNKS.inc(stats["duplicates_removed"], event="deduplicated")
+        CHUNKS.inc(stats["merged"], event="merged")
+        PROMPT_TOKENS.observe(stats["prompt_tokens"], prompt="testcases", part="total")
+        PROMPT_TOKENS.observe(stats["context_tokens"], prompt="testcases", part="context")
+        return system_prompt, user_prompt, stats
+
+    def _assemble_prompts(self, query: str, results: List[Dict[str, Any]]):
+        context_str, stats = assemble_context(results, self.context_token_budget)
 
         # 2. Strict System Prompt
         system_prompt = """
@@ -57,9 +254,14 @@ class RAGService:
         User Query: "{query}"
         """
 
-        # 3. Call LLM
-        raw_response = self.llm.generate_response(system_prompt, user_prompt)
+        stats["prompt_tokens"] = count_tokens(system_prompt) + count_tokens(user_prompt)
+        return system_prompt, user_prompt, stats
+
+    def _parse_response(self, raw_response: str) -> List[Dict[str, Any]]:
+        with stage("parse.testcases"):
+            return self._parse_json_array(raw_response)
 
+    def _parse_json_array(self, raw_response: str) -> List[Dict[str, Any]]:
         # 4. ROBUST PARSING LOGIC (The Fix)
         try:
             # Step A: Remove Markdown code blocks if present
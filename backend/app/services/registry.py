@@ -0,0 +1,190 @@
+# app/services/registry.py
+import os
+import threading
+import chromadb
+from typing import Dict, Tuple
+from app.services.embeddings import EmbeddingService, EMBEDDING_BACKEND
+from app.services.embedding_cache import EmbeddingCache, EMBEDDING_CACHE_PATH
+from app.services.lexical_index import LexicalIndex
+from app.services.llm_cache import LLMResponseCache, LLM_CACHE_ENABLED
+from app.services.llm_provider import LLMProvider
+from app.services.llm_router import LLMRouter, LLM_BACKENDS, build_backend, parse_backends
+from app.services.onnx_embeddings import OnnxEmbeddingService
+from app.services.reranker import Reranker, RERANK_MODEL
+from app.services.vector_db import VectorDB
+
+DEFAULT_PERSIST_DIR = "./chroma_db"
+EMBEDDING_CACHE_ENABLED = os.getenv("EMBEDDING_CACHE_ENABLED", "1") == "1"
+
+
+class ServiceRegistry:
+    """
+    Process-wide container for the heavy, shareable services.
+    Owns one lazily-loaded EmbeddingService per model (torch or ONNX backend,
+    per EMBEDDING_BACKEND), one Chroma client per persist dir, one VectorDB per
+    (persist_dir, collection), one BM25 LexicalIndex per persist dir, one
+    cross-encoder Reranker per model, one LLMProvider per (provider, model) and
+    one LLMRouter per backend list, backed by a shared response cache, so every
+    service in a worker reuses them.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._embedders: Dict[str, EmbeddingService] = {}
+        self._embedding_cache = None
+        self._clients: Dict[str, "chromadb.ClientAPI"] = {}
+        self._vector_dbs: Dict[Tuple[str, str], VectorDB] = {}
+        self._lexical_indexes: Dict[str, LexicalIndex] = {}
+        self._rerankers: Dict[str, Reranker] = {}
+        self._llm_cache = None
+        self._llms: Dict[Tuple[str, str], LLMProvider] = {}
+        self._llm_routers: Dict[str, LLMRouter] = {}
+
+    def get_embedder(self, model_name: str = "all-MiniLM-L6-v2") -> EmbeddingService:
+        with self._lock:
+            embedder = self._embedders.get(model_name)
+            if embedder is None:
+                # Both backends defer the model load until the first encode
+                backend = OnnxEmbeddingService if EMBEDDING_BACKEND == "onnx" else EmbeddingService
+                embedder = backend(model_name=model_name, cache=self.get_embedding_cache())
+                self._embedders[model_name] = embedder
+            return embedder
+
+    def register_embedder(self, embedder, model_name: str = "all-MiniLM-L6-v2"):
+        """
+        Serve a ready-made embedder for model_name (benchmarks swap in a stand-in model this way).
+        """
+        with self._lock:
+            self._embedders[model_name] = embedder
+
+    def get_embedding_cache(self):
+        """
+        One on-disk embedding cache per process; keys are namespaced by model.
+        """
+        if not EMBEDDING_CACHE_ENABLED:
+            return None
+        with self._lock:
+            if self._embedding_cache is None:
+                self._embedding_cache = EmbeddingCache(EMBEDDING_CACHE_PATH)
+            return self._embedding_cache
+
+    def get_llm_cache(self):
+        """
+        One LLM response cache per process, shared by every provider/model (they are part of the key).
+        """
+        if not LLM_CACHE_ENABLED:
+            return None
+        with self._lock:
+            if self._llm_cache is None:
+                self._llm_cache = LLMResponseCache()
+            return self._llm_cache
+
+    def get_llm(self, provider: str = "groq", model_name: str = "llama-3.3-70b-versatile") -> LLMProvider:
+        key = (provider, model_name)
+        with self._lock:
+            llm = self._llms.get(key)
+            if llm is None:
+                llm = LLMProvider(provider=provider, model_name=model_name, cache=self.get_llm_cache())
+                self._llms[key] = llm
+            return llm
+
+    def get_llm_router(self, backends: str = LLM_BACKENDS) -> LLMRouter:
+        """
+        Router over the backends in `backends` ("provider:model[@rpm],..."). The router
+        owns the response cache; its backends get their own uncached providers so their
+        health and rate limits aren't shared with direct get_llm() users.
+        """
+        with self._lock:
+            router = self._llm_routers.get(backends)
+            if router is None:
+                router = LLMRouter(
+                    [build_backend(**spec) for spec in parse_backends(backends)],
+                    cache=self.get_llm_cache(),
+                )
+                self._llm_routers[backends] = router
+            return router
+
+    def get_chroma_client(self, persist_dir: str = DEFAULT_PERSIST_DIR):
+        path = os.path.abspath(persist_dir)
+        with self._lock:
+            client = self._clients.get(path)
+            if client is None:
+                os.makedirs(path, exist_ok=True)
+                client = chromadb.PersistentClient(path=path)
+                self._clients[path] = client
+            return client
+
+    def get_vector_db(self, persist_dir: str = DEFAULT_PERSIST_DIR, collection_name: str = "qa_agent") -> VectorDB:
+        key = (os.path.abspath(persist_dir), collection_name)
+        with self._lock:
+            vdb = self._vector_dbs.get(key)
+            if vdb is None:
+                vdb = VectorDB(
+                    persist_dir=persist_dir,
+                    collection_name=collection_name,
+                    client=self.get_chroma_client(persist_dir),
+                )
+                self._vector_dbs[key] = vdb
+            return vdb
+
+    def get_lexical_index(self, persist_dir: str = DEFAULT_PERSIST_DIR) -> LexicalIndex:
+        # Lives next to the Chroma data it mirrors
+        path = os.path.abspath(persist_dir)
+        with self._lock:
+            index = self._lexical_indexes.get(path)
+            if index is None:
+                index = LexicalIndex(os.path.join(path, "lexical"))
+                self._lexical_indexes[path] = index
+            return index
+
+    def get_reranker(self, model_name: str = RERANK_MODEL) -> Reranker:
+        with self._lock:
+            reranker = self._rerankers.get(model_name)
+            if reranker is None:
+                # Reranker defers the model load until the first score
+                reranker = Reranker(model_name=model_name)
+                self._rerankers[model_name] = reranker
+            return reranker
+
+    def reset(self):
+        """
+        Drop all cached instances (used by tests to get a clean registry).
+        """
+        with self._lock:
+            self._embedders.clear()
+            self._embedding_cache = None
+            self._clients.clear()
+            self._vector_dbs.clear()
+            self._lexical_indexes.clear()
+            self._rerankers.clear()
+            self._llm_cache = None
+            self._llms.clear()
+            self._llm_routers.clear()
+
+
+# Default registry shared by the whole process
+registry = ServiceRegistry()
+
+
+def get_embedder(model_name: str = "all-MiniLM-L6-v2") -> EmbeddingService:
+    return registry.get_embedder(model_name)
+
+
+def get_vector_db(persist_dir: str = DEFAULT_PERSIST_DIR, collection_name: str = "qa_agent") -> VectorDB:
+    return registry.get_vector_db(persist_dir, collection_name)
+
+
+def get_llm(provider: str = "groq", model_name: str = "llama-3.3-70b-versatile") -> LLMProvider:
+    return registry.get_llm(provider, model_name)
+
+
+def get_llm_router(backends: str = LLM_BACKENDS) -> LLMRouter:
+    return registry.get_llm_router(backends)
+
+
+def get_lexical_index(persist_dir: str = DEFAULT_PERSIST_DIR) -> LexicalIndex:
+    return registry.get_lexical_index(persist_dir)
+
+
+def get_reranker(model_name: str = RERANK_MODEL) -> Reranker:
+    return registry.get_reranker(model_name)
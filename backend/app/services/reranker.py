@@ -0,0 +1,116 @@
+# app/services/reranker.py
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Any, Dict, List, Tuple
+from app.utils.metrics import CACHE_LOOKUPS, stage
+
+if TYPE_CHECKING:
+    from sentence_transformers import CrossEncoder
+
+RERANK_ENABLED = os.getenv("RERANK_ENABLED", "0") == "1"
+RERANK_MODEL = os.getenv("RERANK_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+# Candidates retrieved per query before reranking down to k
+RERANK_CANDIDATES = int(os.getenv("RERANK_CANDIDATES", "20"))
+RERANK_BATCH_SIZE = int(os.getenv("RERANK_BATCH_SIZE", "16"))
+RERANK_CACHE_ENTRIES = int(os.getenv("RERANK_CACHE_ENTRIES", "20000"))
+
+
+class Reranker:
+    """
+    Scores (query, chunk) pairs with a small CPU cross-encoder and keeps the best k.
+    The model is loaded lazily on first use. Scores are cached per (query, chunk id)
+    in an in-memory LRU; chunk ids are content-addressed, so a cached score is
+    never stale.
+    """
+
+    def __init__(
+        self,
+        model_name: str = RERANK_MODEL,
+        batch_size: int = RERANK_BATCH_SIZE,
+        cache_entries: int = RERANK_CACHE_ENTRIES,
+    ):
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.cache_entries = max(1, cache_entries)
+        self._model = None
+        self._load_lock = threading.Lock()
+        self._lock = threading.Lock()
+        # (query, chunk id) -> score, most recently used last
+        self._scores: "OrderedDict[Tuple[str, str], float]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def model(self) -> "CrossEncoder":
+        if self._model is None:
+            with self._load_lock:
+                if self._model is None:
+                    from sentence_transformers import CrossEncoder
+                    self._model = CrossEncoder(self.model_name, device="cpu")
+        return self._model
+
+    def _predict(self, pairs: List[Tuple[str, str]]) -> List[float]:
+        scores = self.model.predict(pairs, batch_size=self.batch_size, show_progress_bar=False, convert_to_numpy=True)
+        return [float(s) for s in scores]
+
+    def score(self, query: str, candidates: List[Dict[str, Any]]) -> Tuple[List[float], int]:
+        """
+        Relevance score per candidate (higher is better). Returns (scores, cache hits).
+        """
+        keys = [(query, c.get("id") or c["document"]) for c in candidates]
+        scores: Dict[Tuple[str, str], float] = {}
+        with self._lock:
+            for key in keys:
+                if key in self._scores:
+                    self._scores.move_to_end(key)
+                    scores[key] = self._scores[key]
+        hits = sum(1 for key in keys if key in scores)
+
+        # Score each distinct missing pair once, in model-sized batches
+        missing = {}
+        for key, c in zip(keys, candidates):
+            if key not in scores and key not in missing:
+                missing[key] = (query, c["document"])
+        if missing:
+            with stage("rerank.predict"):
+                fresh = dict(zip(missing.keys(), self._predict(list(missing.values()))))
+            scores.update(fresh)
+            with self._lock:
+                self._scores.update(fresh)
+                while len(self._scores) > self.cache_entries:
+                    self._scores.popitem(last=False)
+        with self._lock:
+            self.hits += hits
+            self.misses += len(missing)
+        CACHE_LOOKUPS.inc(hits, cache="rerank", result="hit")
+        CACHE_LOOKUPS.inc(len(keys) - hits, cache="rerank", result="miss")
+        return [scores[key] for key in keys], hits
+
+    def rerank(self, query: str, candidates: List[Dict[str, Any]], k: int) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+        """
+        Best k candidates by cross-encoder score, each with a 'rerank_score'.
+        Returns (results, stats) with the timing and cache numbers for tuning N.
+        """
+        start = time.perf_counter()
+        scores, hits = self.score(query, candidates) if candidates else ([], 0)
+        order = sorted(range(len(candidates)), key=lambda i: -scores[i])[:k]
+        results = [dict(candidates[i], rerank_score=scores[i]) for i in order]
+        stats = {
+            "rerank_candidates": len(candidates),
+            "rerank_cache_hits": hits,
+            "rerank_ms": round((time.perf_counter() - start) * 1000, 1),
+        }
+        return results, stats
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "model": self.model_name,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits / lookups) if lookups else 0.0,
+            "entries": len(self._scores),
+            "max_entries": self.cache_entries,
+        }
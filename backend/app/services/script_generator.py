@@ -1,88 +1,111 @@
 import os
-import json
-from typing import Dict, Any, Optional
-from bs4 import BeautifulSoup
+import asyncio
+import threading
+from typing import Dict, Any, List, Optional, AsyncIterator, Tuple
 from app.services.llm_provider import LLMProvider
+from app.services.page_index import PageIndex
 from app.services.vector_db import VectorDB
+from app.services.registry import get_vector_db, get_llm
+from app.utils.concurrency import run_in_pool
+from app.utils.dom_pruner import SCRIPT_PAGE_TOKEN_BUDGET, render_pruned_dom, select_elements, test_case_text
+from app.utils.metrics import PROMPT_TOKENS, stage
+from app.utils.tokens import count_tokens
+
+# Max LLM calls in flight for one batch request (the provider-wide limit still applies)
+SCRIPT_BATCH_CONCURRENCY = int(os.getenv("SCRIPT_BATCH_CONCURRENCY", "8"))
+NO_HTML_ERROR = "# ERROR: No HTML file found for this session."
 
 
 class ScriptGeneratorService:
-    def __init__(self, upload_dir: str = "uploaded_docs"):
+    def __init__(
+        self,
+        upload_dir: str = "uploaded_docs",
+        vector_db: Optional[VectorDB] = None,
+        llm: Optional[LLMProvider] = None,
+        page_index: Optional[PageIndex] = None,
+        page_token_budget: int = SCRIPT_PAGE_TOKEN_BUDGET,
+    ):
         self.upload_dir = upload_dir
-        self.llm = LLMProvider()
-        self.vector_db = VectorDB()  # Only for extra text docs if needed
+        self.page_token_budget = page_token_budget
+        self.page_index = page_index or PageIndex(os.path.join(upload_dir, "page_index.db"))
+        # session_id -> HTML path for pages uploaded before the page index existed
+        self._legacy_pages: Optional[Dict[str, str]] = None
+        self._legacy_lock = threading.Lock()
+        self.llm = llm or get_llm()
+        self.vector_db = vector_db or get_vector_db()  # Only for extra text docs if needed
 
     # ------------------------------------------------------
-    # Load the session-specific HTML file
+    # Load the session-specific page's selector index
     # ------------------------------------------------------
-    def _load_session_html(self, session_id: str) -> Optional[str]:
+    def _load_page(self, session_id: str) -> Optional[Dict]:
         """
-        Loads the correct HTML file for this session.
-        Files are saved in the format:
-            checkout__<session_id>.html
+        Returns the selector index for this session's page from the page index,
+        which is filled at upload time; no directory scan or HTML parsing here.
         """
-        for fname in os.listdir(self.upload_dir):
-            if fname.endswith(f"__{session_id}.html"):
-                path = os.path.join(self.upload_dir, fname)
-                with open(path, "r", encoding="utf-8", errors="ignore") as f:
-                    return f.read()
-        return None
-
-    # ------------------------------------------------------
-    # Extract useful selector metadata from HTML
-    # ------------------------------------------------------
-    def _extract_html_metadata(self, html: str) -> Dict:
-        soup = BeautifulSoup(html, "html.parser")
-
-        inputs = []
-        for element in soup.find_all(["input", "select", "textarea"]):
-            inputs.append({
-                "tag": element.name,
-                "type": element.get("type"),
-                "id": element.get("id"),
-                "name": element.get("name"),
-                "class": element.get("class"),
-                "placeholder": element.get("placeholder"),
-                "text": element.get_text(strip=True)
-            })
-
-        buttons = []
-        for btn in soup.find_all(["button", "input"]):
-            if btn.name == "button" or (btn.name == "input" and btn.get("type") in ["submit", "button"]):
-                buttons.append({
-                    "tag": btn.name,
-                    "id": btn.get("id"),
-                    "name": btn.get("name"),
-                    "class": btn.get("class"),
-                    "text": btn.get_text(strip=True) or btn.get("value")
-                })
-
-        return {
-            "inputs": inputs,
-            "buttons": buttons
-        }
+        page = self.page_index.get(session_id)
+        if page is None:
+            # Pages uploaded before the index existed: locate once, then index
+            path = self._find_session_html(session_id)
+            if path is None:
+                return None
+            self.page_index.index_page(session_id, path)
+            page = self.page_index.get(session_id)
+        return page
+
+    def _find_session_html(self, session_id: str) -> Optional[str]:
+        """
+        Slow path for pages uploaded before the index: upload_dir is scanned once
+        for files saved as checkout__<session_id>.html. New uploads are indexed
+        as they arrive, so sessions without a page never trigger another scan.
+        """
+        with self._legacy_lock:
+            if self._legacy_pages is None:
+                self._legacy_pages = {}
+                for fname in os.listdir(self.upload_dir) if os.path.isdir(self.upload_dir) else []:
+                    _, sep, rest = fname.rpartition("__")
+                    if sep and rest.endswith(".html"):
+                        self._legacy_pages[rest[:-len(".html")]] = os.path.join(self.upload_dir, fname)
+            return self._legacy_pages.get(session_id)
 
     # ------------------------------------------------------
     # Build prompt with strong grounding
     # ------------------------------------------------------
-    def _build_prompt(self, test_case: Dict, html_raw: str, meta: Dict) -> str:
+    def _build_prompt(self, test_case: Dict, meta: Dict) -> Tuple[str, str, Dict[str, int]]:
+        """
+        Returns (system_prompt, user_prompt, prompt_stats). The page is sent as a pruned
+        DOM: only the elements most relevant to this test case, within page_token_budget.
+        """
+        with stage("prompt.script"):
+            return self._assemble_prompt(test_case, meta)
+
+    def _assemble_prompt(self, test_case: Dict, meta: Dict) -> Tuple[str, str, Dict[str, int]]:
         system_prompt = """
         You are a Senior QA Automation Engineer specializing in Selenium (Python).
 
         STRICT RULES:
-        1. Use ONLY the selectors that exist in the provided HTML.
+        1. Use ONLY the selectors that exist in the provided page elements and id/name lists.
         2. Prefer ID → Name → CSS selectors.
         3. Never hallucinate IDs or names.
         4. Use selenium.webdriver + WebDriverWait + By.
         5. Output ONLY Python code. No explanations.
         """
 
+        elements, page_tokens = select_elements(
+            meta.get("elements", []), test_case_text(test_case), self.page_token_budget
+        )
+        # The full id/name lists keep the LLM grounded on elements that were pruned away,
+        # as long as they fit in what's left of the budget
+        selector_lists = f"IDs: {', '.join(meta.get('ids', []))}\nNames: {', '.join(meta.get('names', []))}"
+        list_tokens = count_tokens(selector_lists)
+        if page_tokens + list_tokens > self.page_token_budget:
+            selector_lists, list_tokens = "(omitted: page too large)", 0
+
         user_prompt = f"""
-        ### RAW HTML OF THE PAGE:
-        {html_raw}
+        ### PAGE ELEMENTS (pruned DOM, most relevant to this test, with CSS paths):
+        {render_pruned_dom(elements)}
 
-        ### EXTRACTED ELEMENT METADATA:
-        {json.dumps(meta, indent=2)}
+        ### ALL SELECTORS ON THE PAGE:
+        {selector_lists}
 
         ### TEST CASE:
         Feature: {test_case.get("Feature")}
@@ -93,28 +116,126 @@ class ScriptGeneratorService:
         Generate a complete runnable Python Selenium script implementing this test.
         """
 
-        return system_prompt, user_prompt
+        page_tokens_raw = meta.get("raw_tokens", 0)
+        stats = {
+            "prompt_tokens": count_tokens(system_prompt) + count_tokens(user_prompt),
+            "page_tokens_raw": page_tokens_raw,
+            "page_tokens_sent": page_tokens + list_tokens,
+            "tokens_saved": max(0, page_tokens_raw - page_tokens - list_tokens),
+            "elements_kept": len(elements),
+            "elements_total": len(meta.get("elements", [])),
+        }
+        PROMPT_TOKENS.observe(stats["prompt_tokens"], prompt="script", part="total")
+        PROMPT_TOKENS.observe(stats["page_tokens_sent"], prompt="script", part="context")
+        PROMPT_TOKENS.observe(stats["tokens_saved"], prompt="script", part="saved")
+        return system_prompt, user_prompt, stats
 
     # ------------------------------------------------------
     # Generate Final Selenium Script
     # ------------------------------------------------------
-    def generate_script(self, test_case: Dict[str, Any], session_id: str) -> str:
-        # Load correct HTML
-        html_raw = self._load_session_html(session_id)
-
-        if not html_raw:
-            return "# ERROR: No HTML file found for this session."
+    def generate_script(self, test_case: Dict[str, Any], session_id: str, use_cache: bool = True) -> str:
+        # Load the page's prebuilt selector metadata
+        meta = self._load_page(session_id)
 
-        # Extract metadata
-        meta = self._extract_html_metadata(html_raw)
+        if meta is None:
+            return NO_HTML_ERROR
 
         # Build prompt
-        system_prompt, user_prompt = self._build_prompt(test_case, html_raw, meta)
+        system_prompt, user_prompt, _ = self._build_prompt(test_case, meta)
 
         # LLM call
-        raw_output = self.llm.generate_response(system_prompt, user_prompt)
+        raw_output = self.llm.generate_response(system_prompt, user_prompt, use_cache=use_cache)
 
-        # Clean ```python code fences
-        clean = raw_output.replace("```python", "").replace("```", "").strip()
+        return self._clean_output(raw_output)
 
-        return clean
+    async def agenerate_script(self, test_case: Dict[str, Any], session_id: str, use_cache: bool = True) -> str:
+        """
+        Async variant: the page lookup runs on the parse pool, the LLM call is
+        awaited. use_cache=False forces a fresh completion.
+        """
+        script, _ = await self.agenerate_script_with_stats(test_case, session_id, use_cache=use_cache)
+        return script
+
+    async def agenerate_script_with_stats(
+        self, test_case: Dict[str, Any], session_id: str, use_cache: bool = True
+    ) -> Tuple[str, Optional[Dict[str, int]]]:
+        """
+        Same as agenerate_script, also returning the prompt token stats (None without a page).
+        """
+        meta = await self._aload_page(session_id)
+
+        if meta is None:
+            return NO_HTML_ERROR, None
+
+        system_prompt, user_prompt, stats = await self._abuild_prompt(test_case, meta)
+        raw_output = await self.llm.agenerate_response(system_prompt, user_prompt, use_cache=use_cache)
+        return self._clean_output(raw_output), stats
+
+    async def astream_script(
+        self, test_case: Dict[str, Any], session_id: str, use_cache: bool = True
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Streaming variant: yields {"event": "token", "text": ...} as the LLM writes,
+        then one {"event": "done", "script": ..., "prompt_stats": ...} with the cleaned script.
+        """
+        meta = await self._aload_page(session_id)
+
+        if meta is None:
+            yield {"event": "done", "script": NO_HTML_ERROR, "prompt_stats": None}
+            return
+
+        system_prompt, user_prompt, stats = await self._abuild_prompt(test_case, meta)
+        parts = []
+        async for delta in self.llm.astream_response(system_prompt, user_prompt, use_cache=use_cache):
+            parts.append(delta)
+            yield {"event": "token", "text": delta}
+        yield {"event": "done", "script": self._clean_output("".join(parts)), "prompt_stats": stats}
+
+    async def agenerate_scripts(
+        self,
+        test_cases: List[Dict[str, Any]],
+        session_id: str,
+        use_cache: bool = True,
+        max_concurrency: int = SCRIPT_BATCH_CONCURRENCY,
+    ) -> AsyncIterator[Tuple[int, str, Optional[Dict[str, int]]]]:
+        """
+        Batch variant: the session page is loaded once, then one LLM call
+        per test case is fanned out with at most max_concurrency in flight.
+        Yields (index, script, prompt_stats) in completion order.
+        """
+        meta = await self._aload_page(session_id)
+
+        if meta is None:
+            for i in range(len(test_cases)):
+                yield i, NO_HTML_ERROR, None
+            return
+
+        limit = asyncio.Semaphore(max(1, max_concurrency))
+
+        async def generate_one(index: int, test_case: Dict[str, Any]) -> Tuple[int, str, Dict[str, int]]:
+            async with limit:
+                system_prompt, user_prompt, stats = await self._abuild_prompt(test_case, meta)
+                raw_output = await self.llm.agenerate_response(system_prompt, user_prompt, use_cache=use_cache)
+                return index, self._clean_output(raw_output), stats
+
+        tasks = [asyncio.ensure_future(generate_one(i, tc)) for i, tc in enumerate(test_cases)]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            # Client went away mid-batch: don't keep spending LLM quota
+            for task in tasks:
+                task.cancel()
+
+    async def _abuild_prompt(self, test_case: Dict, meta: Dict) -> Tuple[str, str, Dict[str, int]]:
+        # DOM pruning and token counting are CPU work; a batch runs many at once
+        return await run_in_pool("parse", self._build_prompt, test_case, meta)
+
+    async def _aload_page(self, session_id: str) -> Optional[Dict]:
+        # Index lookup touches SQLite (and rarely disk), so keep it off the event loop
+        return await run_in_pool("parse", self._load_page, session_id)
+
+    def _clean_output(self, raw_output: str) -> str:
+        # Clean ```python code fences
+        with stage("parse.script"):
+            return raw_output.replace("```python", "").replace("```", "").strip()
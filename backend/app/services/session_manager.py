@@ -0,0 +1,186 @@
+# app/services/session_manager.py
+import asyncio
+import glob
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional
+from app.services.kb_manifest import KBManifest
+from app.services.lexical_index import LexicalIndex
+from app.services.page_index import PageIndex
+from app.services.vector_db import VectorDB
+from app.utils.concurrency import run_in_pool
+
+SESSIONS_DB_PATH = os.getenv("SESSIONS_DB_PATH", "./sessions.db")
+# Sessions idle for longer than this are evicted (seconds; 0 disables TTL eviction)
+SESSION_TTL_SECONDS = int(os.getenv("SESSION_TTL_SECONDS", str(24 * 3600)))
+# Keep at most this many sessions, evicting the least recently used (0 = unlimited)
+MAX_SESSIONS = int(os.getenv("MAX_SESSIONS", "0"))
+SESSION_REAP_INTERVAL = int(os.getenv("SESSION_REAP_INTERVAL", "600"))
+# last_access is written at most this often per session to keep request overhead low
+TOUCH_INTERVAL = 30
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    session_id TEXT PRIMARY KEY,
+    created_at REAL NOT NULL,
+    last_access REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_sessions_access ON sessions(last_access);
+"""
+
+
+class SessionManager:
+    """
+    Tracks last access per session and evicts idle sessions (TTL) or the least
+    recently used ones beyond MAX_SESSIONS. Eviction deletes the session's vectors,
+    its BM25 postings, its manifest entries, its saved HTML pages and their page index entry.
+    """
+
+    def __init__(
+        self,
+        vector_db: VectorDB,
+        manifest: KBManifest,
+        upload_dir: str = "uploaded_docs",
+        db_path: str = SESSIONS_DB_PATH,
+        ttl_seconds: int = SESSION_TTL_SECONDS,
+        max_sessions: int = MAX_SESSIONS,
+        is_busy: Optional[Callable[[str], bool]] = None,
+        page_index: Optional[PageIndex] = None,
+        lexical_index: Optional[LexicalIndex] = None,
+    ):
+        self.vector_db = vector_db
+        self.manifest = manifest
+        self.page_index = page_index
+        self.lexical_index = lexical_index
+        self.upload_dir = upload_dir
+        self.db_path = db_path
+        self.ttl_seconds = ttl_seconds
+        self.max_sessions = max_sessions
+        # Sessions with queued/running KB jobs must not be evicted underneath them
+        self.is_busy = is_busy or (lambda session_id: False)
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._last_touch: Dict[str, float] = {}
+        self._reaper: Optional[asyncio.Task] = None
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def touch(self, session_id: str):
+        now = time.time()
+        if now - self._last_touch.get(session_id, 0) < TOUCH_INTERVAL:
+            return
+        self._last_touch[session_id] = now
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "INSERT INTO sessions (session_id, created_at, last_access) VALUES (?, ?, ?) "
+                "ON CONFLICT(session_id) DO UPDATE SET last_access = excluded.last_access",
+                (session_id, now, now),
+            )
+
+    def _html_files(self, session_id: str) -> List[str]:
+        return glob.glob(os.path.join(glob.escape(self.upload_dir), f"*__{glob.escape(session_id)}.html"))
+
+    def candidates_for_eviction(self, now: Optional[float] = None) -> List[str]:
+        """
+        Sessions past their TTL plus, if over MAX_SESSIONS, the least recently used excess.
+        """
+        now = now or time.time()
+        with self._connect() as conn:
+            rows = conn.execute("SELECT session_id, last_access FROM sessions ORDER BY last_access").fetchall()
+        expired = [r["session_id"] for r in rows if self.ttl_seconds and now - r["last_access"] > self.ttl_seconds]
+        if self.max_sessions and len(rows) - len(expired) > self.max_sessions:
+            expired_set = set(expired)
+            remaining = [r["session_id"] for r in rows if r["session_id"] not in expired_set]
+            expired.extend(remaining[:len(remaining) - self.max_sessions])
+        return expired
+
+    def evict(self, session_id: str) -> Dict[str, Any]:
+        chunks = self.vector_db.delete_session(session_id)
+        if self.lexical_index is not None:
+            self.lexical_index.delete_session(session_id)
+        removed_files = 0
+        for path in self._html_files(session_id):
+            try:
+                os.remove(path)
+                removed_files += 1
+            except FileNotFoundError:
+                pass
+        self.manifest.delete_session(session_id)
+        if self.page_index is not None:
+            self.page_index.delete_session(session_id)
+        with self._lock, self._connect() as conn:
+            conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+        self._last_touch.pop(session_id, None)
+        return {"session_id": session_id, "chunks_deleted": chunks, "files_deleted": removed_files}
+
+    def reap(self) -> List[Dict[str, Any]]:
+        """
+        Evicts every eligible session that has no active KB job.
+        """
+        evicted = []
+        for session_id in self.candidates_for_eviction():
+            if self.is_busy(session_id):
+                continue
+            try:
+                evicted.append(self.evict(session_id))
+            except Exception as e:
+                print(f"Error evicting session {session_id}: {e}")
+        return evicted
+
+    def storage_report(self) -> List[Dict[str, Any]]:
+        """
+        Per-session storage: chunk count, saved HTML bytes and access times.
+        """
+        with self._connect() as conn:
+            rows = conn.execute("SELECT * FROM sessions ORDER BY last_access DESC").fetchall()
+        now = time.time()
+        report = []
+        for r in rows:
+            html_files = self._html_files(r["session_id"])
+            report.append({
+                "session_id": r["session_id"],
+                "chunks": self.vector_db.count_session(r["session_id"]),
+                "html_files": len(html_files),
+                "html_bytes": sum(os.path.getsize(p) for p in html_files if os.path.exists(p)),
+                "created_at": r["created_at"],
+                "last_access": r["last_access"],
+                "idle_seconds": round(now - r["last_access"], 1),
+            })
+        return report
+
+    # ------------------------------------------------------
+    # Background reaper
+    # ------------------------------------------------------
+    def start_reaper(self, interval: int = SESSION_REAP_INTERVAL):
+        if self._reaper is None:
+            self._reaper = asyncio.create_task(self._reap_loop(interval))
+
+    async def stop_reaper(self):
+        if self._reaper is not None:
+            self._reaper.cancel()
+            await asyncio.gather(self._reaper, return_exceptions=True)
+            self._reaper = None
+
+    async def _reap_loop(self, interval: int):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                evicted = await run_in_pool("vector", self.reap)
+                if evicted:
+                    print(f"Session reaper evicted {len(evicted)} session(s)")
+            except Exception as e:
+                print(f"Session reaper error: {e}")
@@ -1,25 +1,60 @@
 # app/services/vector_db.py
 import chromadb
-from typing import List, Dict, Any, Optional
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+import hashlib
 import os
+import threading
 import uuid
+import numpy as np
+from app.utils.metrics import stage
+
+# Collection layout:
+#   "single"  - one collection for every session, queries use a session_id `where` filter
+#   "session" - one collection per session, queries search only that session's vectors
+#   "bucket"  - sessions hashed into VECTOR_SHARD_BUCKETS collections (filter still applied)
+VECTOR_SHARD_MODE = os.getenv("VECTOR_SHARD_MODE", "single")
+VECTOR_SHARD_BUCKETS = int(os.getenv("VECTOR_SHARD_BUCKETS", "64"))
+SHARD_MODES = ("single", "session", "bucket")
+
+
+def _collection_gone(error: Exception) -> bool:
+    # NotFoundError on current Chroma, ValueError/InvalidCollectionException on older ones
+    return "does not exist" in str(error)
+
 
 class VectorDB:
     """
     Simple wrapper around Chroma to store embeddings + documents + metadata.
     Provides a stable query() that normalizes results across Chroma versions.
+    In "session"/"bucket" shard modes writes and queries are routed to the
+    session's own collection; collection handles are cached per name, and a
+    handle whose collection another worker dropped is re-resolved on first use.
     """
 
-    def __init__(self, persist_dir: str = "./chroma_db", collection_name: str = "qa_agent"):
+    def __init__(
+        self,
+        persist_dir: str = "./chroma_db",
+        collection_name: str = "qa_agent",
+        client=None,
+        shard_mode: str = VECTOR_SHARD_MODE,
+        shard_buckets: int = VECTOR_SHARD_BUCKETS,
+    ):
+        if shard_mode not in SHARD_MODES:
+            raise ValueError(f"Unknown shard mode: {shard_mode}")
         self.persist_dir = persist_dir
         self.collection_name = collection_name
+        self.shard_mode = shard_mode
+        self.shard_buckets = max(1, shard_buckets)
+        self._collections: Dict[str, Any] = {}
+        self._collections_lock = threading.Lock()
 
         # Ensure directory exists
         os.makedirs(self.persist_dir, exist_ok=True)
 
         # Setup Chroma client with persistence (new API)
         # If your chroma version differs, this should still work for local persistent usage.
-        self.client = chromadb.PersistentClient(path=self.persist_dir)
+        # A shared client can be injected (see app/services/registry.py).
+        self.client = client or chromadb.PersistentClient(path=self.persist_dir)
 
         # create or get collection without embedding_function (we will add explicit embeddings)
         try:
@@ -28,24 +63,164 @@ class VectorDB:
         except Exception:
             # fallback: create it
             self.collection = self.client.create_collection(name=self.collection_name)
+        self._collections[self.collection_name] = self.collection
+
+    # ------------------------------------------------------
+    # Shard routing
+    # ------------------------------------------------------
+    def shard_name(self, session_id: Optional[str]) -> str:
+        """
+        Name of the collection holding this session's vectors.
+        Chroma names are limited to [a-zA-Z0-9._-], so session ids are hashed.
+        """
+        if self.shard_mode == "single" or not session_id:
+            return self.collection_name
+        digest = hashlib.sha1(session_id.encode("utf-8")).hexdigest()
+        if self.shard_mode == "session":
+            return f"{self.collection_name}_s_{digest[:20]}"
+        return f"{self.collection_name}_b_{int(digest, 16) % self.shard_buckets:04d}"
+
+    def _shard(self, session_id: Optional[str], create: bool = True):
+        """
+        Cached collection handle for a session's shard; None if it doesn't exist and create=False.
+        """
+        name = self.shard_name(session_id)
+        collection = self._collections.get(name)
+        if collection is not None:
+            return collection
+        with self._collections_lock:
+            collection = self._collections.get(name)
+            if collection is None:
+                if create:
+                    collection = self.client.get_or_create_collection(name=name)
+                else:
+                    try:
+                        collection = self.client.get_collection(name)
+                    except Exception:
+                        return None
+                self._collections[name] = collection
+            return collection
+
+    def _on_shard(self, session_id: Optional[str], op: Callable[[Any], Any], create: bool = True, default: Any = None):
+        """
+        op(collection) on the session's shard, or default if it doesn't exist and create=False.
+        """
+        collection = self._shard(session_id, create=create)
+        if collection is None:
+            return default
+        try:
+            return op(collection)
+        except Exception as e:
+            if not _collection_gone(e):
+                raise
+        # Cached handle outlived its collection (e.g. delete_session on another worker)
+        with self._collections_lock:
+            self._collections.pop(self.shard_name(session_id), None)
+        collection = self._shard(session_id, create=create)
+        return default if collection is None else op(collection)
+
+    @staticmethod
+    def _session_of(metadatas: Optional[List[Dict[str, Any]]]) -> Optional[str]:
+        # Every chunk written by KnowledgeBaseBuilder carries its session in metadata
+        return metadatas[0].get("session_id") if metadatas else None
+
+    def _shard_names(self) -> List[str]:
+        prefix = f"{self.collection_name}_{self.shard_mode[0]}_"
+        names = []
+        for c in self.client.list_collections():
+            name = getattr(c, "name", c)
+            if name.startswith(prefix):
+                names.append(name)
+        return names
+
+    def count(self) -> int:
+        """
+        Total number of stored chunks across all shards.
+        """
+        total = self.collection.count()
+        if self.shard_mode != "single":
+            total += sum(self.client.get_collection(name).count() for name in self._shard_names())
+        return total
 
     def add_documents(
         self,
         texts: List[str],
-        embeddings: List[List[float]],
+        embeddings: Union[np.ndarray, List[List[float]]],
         metadatas: List[Dict[str, Any]],
-        ids: Optional[List[str]] = None
+        ids: Optional[List[str]] = None,
+        session_id: Optional[str] = None,
     ):
         """
         Add lists of texts (documents/chunks), their embeddings, and metadata to Chroma.
+        Embeddings may be a float32 (n, dim) ndarray, which Chroma consumes without a list copy.
         """
         if ids is None:
             ids = [str(uuid.uuid4()) for _ in range(len(texts))]
 
         # Chroma expects lists
-        self.collection.add(ids=ids, documents=texts, metadatas=metadatas, embeddings=embeddings)
+        with stage("vector.add"):
+            self._on_shard(
+                session_id or self._session_of(metadatas),
+                lambda c: c.add(ids=ids, documents=texts, metadatas=metadatas, embeddings=embeddings),
+            )
+
+    def upsert_documents(
+        self,
+        ids: List[str],
+        texts: List[str],
+        embeddings: Union[np.ndarray, List[List[float]]],
+        metadatas: List[Dict[str, Any]],
+        session_id: Optional[str] = None,
+    ):
+        """
+        Insert-or-replace by id. Used with content-addressed ids so re-indexing never duplicates chunks.
+        """
+        with stage("vector.upsert"):
+            self._on_shard(
+                session_id or self._session_of(metadatas),
+                lambda c: c.upsert(ids=ids, documents=texts, metadatas=metadatas, embeddings=embeddings),
+            )
 
-    def query(self, query_embedding: List[float], n_results: int = 5, session_id: str = None) -> List[Dict[str, Any]]:
+    def update_metadatas(self, ids: List[str], metadatas: List[Dict[str, Any]], session_id: Optional[str] = None):
+        """
+        Update metadata only (no re-embedding), e.g. when a kept chunk moved position.
+        """
+        if ids:
+            self._on_shard(session_id or self._session_of(metadatas), lambda c: c.update(ids=ids, metadatas=metadatas))
+
+    def delete_ids(self, ids: List[str], session_id: Optional[str] = None):
+        if ids:
+            self._on_shard(session_id, lambda c: c.delete(ids=ids), create=False)
+
+    def count_session(self, session_id: str) -> int:
+        if self.shard_mode == "session":
+            return self._on_shard(session_id, lambda c: c.count(), create=False, default=0)
+        res = self._on_shard(
+            session_id, lambda c: c.get(where={"session_id": session_id}, include=[]), create=False, default={}
+        )
+        return len(res.get("ids") or [])
+
+    def delete_session(self, session_id: str) -> int:
+        """
+        Deletes every chunk tagged with this session; returns how many were removed.
+        In "session" mode the whole shard collection is dropped.
+        """
+        count = self.count_session(session_id)
+        if self.shard_mode == "session":
+            name = self.shard_name(session_id)
+            with self._collections_lock:
+                if self._collections.pop(name, None) is not None:
+                    try:
+                        self.client.delete_collection(name=name)
+                    except Exception as e:
+                        # Another worker dropped it first
+                        if not _collection_gone(e):
+                            raise
+        elif count:
+            self._on_shard(session_id, lambda c: c.delete(where={"session_id": session_id}))
+        return count
+
+    def query(self, query_embedding: Union[np.ndarray, List[float]], n_results: int = 5, session_id: str = None) -> List[Dict[str, Any]]:
         """
         Query by embedding: returns list of dicts with 'id', 'document', 'metadata', 'distance'
 
@@ -56,14 +231,21 @@ class VectorDB:
         include = ['metadatas', 'documents', 'distances']
 
         # CRITICAL FIX: Add the 'where' filter
-        where_filter = {"session_id": session_id} if session_id else None
+        # (a per-session shard only holds that session's vectors, so it needs none)
+        where_filter = {"session_id": session_id} if session_id and self.shard_mode != "session" else None
 
-        results = self.collection.query(
-            query_embeddings=[query_embedding],
-            n_results=n_results,
-            include=include,
-            where=where_filter  # <--- This prevents cross-contamination
-        )
+        with stage("vector.query"):
+            # A session with no shard yet has nothing indexed
+            results = self._on_shard(
+                session_id,
+                lambda c: c.query(
+                    query_embeddings=[query_embedding],
+                    n_results=n_results,
+                    include=include,
+                    where=where_filter  # <--- This prevents cross-contamination
+                ),
+                create=False,
+            )
 
         # results expected to be dict of lists (one entry per query)
         if not results:
@@ -106,6 +288,36 @@ class VectorDB:
             })
         return out
 
+    def get_session_chunks(self, session_id: str) -> Tuple[List[str], List[str]]:
+        """
+        (chunk ids, texts) of every chunk stored for the session.
+        """
+        res = self._on_shard(
+            session_id, lambda c: c.get(where={"session_id": session_id}, include=["documents"]), create=False, default={}
+        )
+        return list(res.get("ids") or []), list(res.get("documents") or [])
+
+    def get_by_ids(self, ids: List[str], session_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Fetch chunks by id (e.g. lexical-only hits in hybrid retrieval), in the order given.
+        Same dict shape as query(); 'distance' is None since nothing was compared.
+        """
+        if not ids:
+            return []
+        with stage("vector.get"):
+            res = self._on_shard(
+                session_id, lambda c: c.get(ids=ids, include=["documents", "metadatas"]), create=False, default={}
+            )
+        found = {
+            chunk_id: (doc, meta)
+            for chunk_id, doc, meta in zip(res.get("ids") or [], res.get("documents") or [], res.get("metadatas") or [])
+        }
+        return [
+            {"id": chunk_id, "document": found[chunk_id][0], "metadata": found[chunk_id][1] or {}, "distance": None}
+            for chunk_id in ids
+            if chunk_id in found
+        ]
+
     def persist(self):
         """
         Persist the DB to disk (Chroma duckdb+parquet uses automatic persistence, but call for clarity).
@@ -118,8 +330,13 @@ class VectorDB:
             pass
 
     def reset_collection(self):
-        try:
-            self.client.delete_collection(name=self.collection_name)
-        except Exception:
-            pass
-        self.collection = self.client.create_collection(name=self.collection_name)
+        with self._collections_lock:
+            names = [self.collection_name] + (self._shard_names() if self.shard_mode != "single" else [])
+            for name in names:
+                try:
+                    self.client.delete_collection(name=name)
+                except Exception:
+                    pass
+            self._collections.clear()
+            self.collection = self.client.create_collection(name=self.collection_name)
+            self._collections[self.collection_name] = self.collection
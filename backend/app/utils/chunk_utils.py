@@ -1,6 +1,7 @@
 # app/utils/chunk_utils.py
-from typing import List
+from typing import Iterable, Iterator, List
 import math
+import hashlib
 
 try:
     # prefer langchain splitter for robust splits
@@ -38,3 +39,58 @@ def chunk_text(text: str, chunk_size: int = 800, chunk_overlap: int = 150):
             return simple_chunk_text(text, chunk_size=chunk_size, chunk_overlap=chunk_overlap)
     else:
         return simple_chunk_text(text, chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+
+def make_chunk_id(session_id: str, source: str, chunk: str) -> str:
+    """
+    Content-addressed chunk id: the same chunk text from the same source in the
+    same session always maps to the same id, so re-uploads upsert instead of duplicating.
+    """
+    h = hashlib.sha256()
+    for part in (session_id, source, chunk):
+        h.update(part.encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+def iter_chunks(pieces: Iterable[str], chunk_size: int = 800, chunk_overlap: int = 150, window_chunks: int = 16) -> Iterator[str]:
+    """
+    Incremental chunker for streamed text (e.g. PDF pages).
+    Buffers incoming pieces until roughly `window_chunks` chunks' worth of text is
+    available, splits the buffer with chunk_text, emits every chunk but the last and
+    carries the last one into the next window so overlaps survive the seam.
+    Memory stays bounded by the window, not by the document size.
+    """
+    # chunk_size counts characters for the langchain splitter but words for the fallback
+    window = chunk_size * window_chunks * (1 if _HAS_LANGCHAIN else 8)
+    lookback = window // window_chunks
+    buffer: List[str] = []
+    buffered = 0
+    # Offset of the last whitespace in the buffer, tracked per piece so the buffer is never rescanned
+    last_sep = -1
+    for piece in pieces:
+        if not piece:
+            continue
+        sep = max(piece.rfind(" "), piece.rfind("\n"))
+        if sep >= 0:
+            last_sep = buffered + sep
+        buffer.append(piece)
+        buffered += len(piece)
+        if buffered < window:
+            continue
+        text = "".join(buffer)
+        # Split at the last whitespace so no word is cut at a piece boundary, unless
+        # there is none within a chunk of the end (e.g. minified JS/JSON): then cut here
+        cut = last_sep if last_sep >= buffered - lookback else buffered
+        head, tail = text[:cut], text[cut:]
+        chunks = chunk_text(head, chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+        if len(chunks) > 1:
+            yield from chunks[:-1]
+            # The last chunk is carried (tail starts with whitespace, keeping words apart)
+            carry = chunks[-1] + tail
+        else:
+            yield from chunks
+            carry = tail
+        buffer = [carry] if carry else []
+        buffered = len(carry)
+        last_sep = max(carry.rfind(" "), carry.rfind("\n"))
+    if buffer:
+        yield from chunk_text("".join(buffer), chunk_size=chunk_size, chunk_overlap=chunk_overlap)
@@ -0,0 +1,79 @@
+# app/utils/concurrency.py
+import asyncio
+import contextvars
+import functools
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict
+
+# Pool sizes are configurable per deployment. Embedding is CPU heavy and
+# already multi-threaded inside torch, so it gets a small pool; Chroma and
+# parsing calls are short and can overlap more.
+POOL_SIZES = {
+    "embed": int(os.getenv("EMBED_POOL_SIZE", "2")),
+    "vector": int(os.getenv("VECTOR_POOL_SIZE", "4")),
+    "parse": int(os.getenv("PARSE_POOL_SIZE", "2")),
+}
+
+# Text extraction (PyMuPDF, BeautifulSoup) holds the GIL, so multi-file uploads
+# are extracted on a process pool sized to the available cores.
+EXTRACT_PROCESSES = int(os.getenv("EXTRACT_PROCESSES", str(os.cpu_count() or 1)))
+
+# Max in-flight LLM requests per worker (they are network bound, not CPU bound)
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "32"))
+
+_pools: Dict[str, ThreadPoolExecutor] = {}
+_pools_lock = threading.Lock()
+_process_pool = None
+
+
+def get_pool(kind: str) -> ThreadPoolExecutor:
+    """
+    Returns the bounded thread pool for a workload kind ("embed", "vector", "parse").
+    """
+    with _pools_lock:
+        pool = _pools.get(kind)
+        if pool is None:
+            if kind not in POOL_SIZES:
+                raise ValueError(f"Unknown pool kind: {kind}")
+            pool = ThreadPoolExecutor(max_workers=max(1, POOL_SIZES[kind]), thread_name_prefix=f"qa-{kind}")
+            _pools[kind] = pool
+        return pool
+
+
+async def run_in_pool(kind: str, fn: Callable[..., Any], *args, **kwargs) -> Any:
+    """
+    Runs a blocking callable on the given pool without blocking the event loop.
+    The caller's context goes along, so spans opened in the pool nest under the request's.
+    """
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(get_pool(kind), functools.partial(context.run, fn, *args, **kwargs))
+
+
+def get_process_pool() -> ProcessPoolExecutor:
+    """
+    Returns the shared extraction process pool. Uses 'spawn' so worker processes
+    never inherit the parent's threads (torch, uvicorn) or locks.
+    """
+    global _process_pool
+    with _pools_lock:
+        if _process_pool is None:
+            _process_pool = ProcessPoolExecutor(
+                max_workers=max(1, EXTRACT_PROCESSES),
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _process_pool
+
+
+def shutdown_pools(wait: bool = True):
+    global _process_pool
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.shutdown(wait=wait)
+        _pools.clear()
+        if _process_pool is not None:
+            _process_pool.shutdown(wait=wait, cancel_futures=True)
+            _process_pool = None
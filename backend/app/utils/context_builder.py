@@ -0,0 +1,113 @@
+# app/utils/context_builder.py
+import os
+import re
+from typing import Any, Dict, List, Optional, Tuple
+from app.utils.tokens import count_tokens, truncate_to_tokens
+
+# Context tokens per model. Well below the context windows on purpose:
+# prompt size drives Groq latency long before the window is the limit.
+MODEL_CONTEXT_BUDGETS = {
+    "llama-3.3-70b-versatile": 6000,
+    "llama3": 3000,
+}
+DEFAULT_CONTEXT_BUDGET = 4000
+# Set to override the per-model budgets
+RAG_CONTEXT_TOKEN_BUDGET = os.getenv("RAG_CONTEXT_TOKEN_BUDGET")
+# Chunk overlaps are ~150 chars; look a bit further to be safe
+MAX_OVERLAP_CHARS = 400
+MIN_OVERLAP_CHARS = 20
+
+
+def context_budget(model_name: Optional[str]) -> int:
+    if RAG_CONTEXT_TOKEN_BUDGET:
+        return int(RAG_CONTEXT_TOKEN_BUDGET)
+    return MODEL_CONTEXT_BUDGETS.get(model_name, DEFAULT_CONTEXT_BUDGET)
+
+
+def _normalized(text: str) -> str:
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def _overlap(left: str, right: str) -> int:
+    """
+    Length of the longest suffix of left that is also a prefix of right.
+    """
+    for size in range(min(len(left), len(right), MAX_OVERLAP_CHARS), MIN_OVERLAP_CHARS - 1, -1):
+        if left.endswith(right[:size]):
+            return size
+    return 0
+
+
+def _render(selected: List[Dict[str, Any]], stats: Dict[str, int]) -> str:
+    """
+    One block per source (in order of its best-ranked chunk). Within a source,
+    chunks are put back in document order; adjacent chunks are merged with their
+    shared overlap written once, gaps are marked with "[...]".
+    """
+    blocks: Dict[str, List[Dict[str, Any]]] = {}
+    for doc in selected:
+        blocks.setdefault(doc["metadata"].get("source", "Unknown"), []).append(doc)
+
+    merged = 0
+    context_str = ""
+    for i, (source, docs) in enumerate(blocks.items()):
+        docs = sorted(docs, key=lambda d: d["metadata"].get("chunk_index", -1))
+        spans = [docs[0]["document"]]
+        for prev, doc in zip(docs, docs[1:]):
+            prev_index = prev["metadata"].get("chunk_index")
+            index = doc["metadata"].get("chunk_index")
+            size = _overlap(spans[-1], doc["document"]) if prev_index is not None and index == prev_index + 1 else 0
+            if size:
+                spans[-1] += doc["document"][size:]
+                merged += 1
+            else:
+                spans.append(doc["document"])
+        context_str += f"--- SOURCE {i+1}: {source} ---\n" + "\n[...]\n".join(spans) + "\n\n"
+    stats["merged"] = merged
+    return context_str
+
+
+def assemble_context(results: List[Dict[str, Any]], token_budget: int) -> Tuple[str, Dict[str, int]]:
+    """
+    Builds the LLM context from ranked retrieval results within token_budget.
+    Exact duplicate chunks are dropped, chunks are taken greedily in rank order
+    while the rendered context still fits, and overlapping neighbours from the
+    same source are merged. If even the best chunk doesn't fit it is truncated.
+    Returns (context_str, stats).
+    """
+    stats = {"chunks_retrieved": len(results), "duplicates_removed": 0, "chunks_used": 0,
+             "merged": 0, "truncated": 0, "context_tokens": 0, "budget": token_budget}
+
+    seen = set()
+    candidates = []
+    for doc in results:
+        key = _normalized(doc["document"])
+        if key in seen:
+            stats["duplicates_removed"] += 1
+            continue
+        seen.add(key)
+        candidates.append(doc)
+
+    selected: List[Dict[str, Any]] = []
+    context_str, context_tokens = "", 0
+    for doc in candidates:
+        trial_stats = dict(stats)
+        trial = _render(selected + [doc], trial_stats)
+        trial_tokens = count_tokens(trial)
+        if trial_tokens <= token_budget:
+            selected.append(doc)
+            context_str, context_tokens, stats = trial, trial_tokens, trial_stats
+
+    if not selected and candidates:
+        # The top chunk alone is over budget: keep as much of it as fits
+        best = dict(candidates[0])
+        header_tokens = count_tokens(_render([dict(best, document="")], dict(stats)))
+        best["document"] = truncate_to_tokens(best["document"], max(0, token_budget - header_tokens))
+        selected = [best]
+        context_str = _render(selected, stats)
+        context_tokens = count_tokens(context_str)
+        stats["truncated"] = 1
+
+    stats["chunks_used"] = len(selected)
+    stats["context_tokens"] = context_tokens
+    return context_str, stats
@@ -0,0 +1,44 @@
+# app/utils/dom_pruner.py
+import os
+from typing import Any, Dict, List, Tuple
+from app.utils.parser_utils import keyword_set
+
+# Max tokens of page markup sent to the script LLM per test case
+SCRIPT_PAGE_TOKEN_BUDGET = int(os.getenv("SCRIPT_PAGE_TOKEN_BUDGET", "2000"))
+
+_STOPWORDS = {
+    "the", "and", "for", "with", "that", "this", "then", "when", "into", "from", "are", "is",
+    "be", "to", "of", "in", "on", "it", "an", "as", "at", "by", "or", "should", "must",
+    "user", "test", "verify", "page", "valid", "invalid",
+}
+
+
+def test_case_text(test_case: Dict[str, Any]) -> str:
+    return " ".join(str(test_case.get(k) or "") for k in ("Feature", "Test_Scenario", "Expected_Result"))
+
+
+def select_elements(elements: List[Dict], query: str, token_budget: int) -> Tuple[List[Dict], int]:
+    """
+    Picks the pruned-DOM elements most relevant to the query that fit in token_budget.
+    Score = keyword overlap with the query, plus a small bonus for controls so the
+    page's buttons and inputs outrank unrelated text. Returns (elements in document order, tokens used).
+    """
+    query_words = keyword_set(query) - _STOPWORDS
+    ranked = sorted(
+        range(len(elements)),
+        key=lambda i: (
+            -(len(query_words.intersection(elements[i]["keywords"].split())) + (0.5 if elements[i]["control"] else 0)),
+            i,
+        ),
+    )
+    kept, used = [], 0
+    for i in ranked:
+        if used + elements[i]["tokens"] > token_budget:
+            continue
+        kept.append(i)
+        used += elements[i]["tokens"]
+    return [elements[i] for i in sorted(kept)], used
+
+
+def render_pruned_dom(elements: List[Dict]) -> str:
+    return "\n".join(el["line"] for el in elements)
@@ -0,0 +1,113 @@
+# app/utils/http_client.py
+import os
+import threading
+from typing import Any, Dict
+import httpx
+
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "64"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", "16"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))
+# Failed connection attempts are retried (the request was never sent, so this is safe for POSTs)
+HTTP_CONNECT_RETRIES = int(os.getenv("HTTP_CONNECT_RETRIES", "2"))
+
+
+class ConnectionStats:
+    """
+    Counts requests and newly opened TCP connections for one client, using
+    httpcore's trace hook; every request that didn't open a connection reused one.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.new_connections = 0
+
+    def trace(self, event_name: str, info: Dict[str, Any]):
+        if event_name == "connection.connect_tcp.complete":
+            with self._lock:
+                self.new_connections += 1
+
+    async def atrace(self, event_name: str, info: Dict[str, Any]):
+        # httpcore requires a coroutine callback on async connections
+        self.trace(event_name, info)
+
+    def _count(self, request: httpx.Request, trace):
+        request.extensions["trace"] = trace
+        with self._lock:
+            self.requests += 1
+
+    def on_request(self, request: httpx.Request):
+        self._count(request, self.trace)
+
+    async def aon_request(self, request: httpx.Request):
+        self._count(request, self.atrace)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            requests, connections = self.requests, self.new_connections
+        return {
+            "requests": requests,
+            "new_connections": connections,
+            "reuse_rate": (1 - connections / requests) if requests else 0.0,
+        }
+
+
+_stats: Dict[str, ConnectionStats] = {}
+_stats_lock = threading.Lock()
+
+
+def connection_stats(name: str) -> ConnectionStats:
+    with _stats_lock:
+        stats = _stats.get(name)
+        if stats is None:
+            stats = ConnectionStats()
+            _stats[name] = stats
+        return stats
+
+
+def all_connection_stats() -> Dict[str, Dict[str, Any]]:
+    with _stats_lock:
+        return {name: stats.stats() for name, stats in _stats.items()}
+
+
+def http_timeout(read: float, connect: float = HTTP_CONNECT_TIMEOUT) -> httpx.Timeout:
+    """
+    Connect (and pool-wait) time is short; read/write bound the silence between bytes,
+    not the whole response, so long LLM streams are fine as long as tokens keep coming.
+    """
+    return httpx.Timeout(connect=connect, read=read, write=read, pool=connect)
+
+
+def _limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+        keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+    )
+
+
+def make_async_client(name: str, base_url: str, read_timeout: float) -> httpx.AsyncClient:
+    """
+    Pooled keep-alive AsyncClient; its connection reuse is reported under `name`.
+    """
+    stats = connection_stats(name)
+    return httpx.AsyncClient(
+        base_url=base_url,
+        timeout=http_timeout(read_timeout),
+        transport=httpx.AsyncHTTPTransport(limits=_limits(), retries=HTTP_CONNECT_RETRIES),
+        event_hooks={"request": [stats.aon_request]},
+    )
+
+
+def make_client(name: str, base_url: str, read_timeout: float) -> httpx.Client:
+    """
+    Blocking counterpart of make_async_client, for the sync code paths.
+    """
+    stats = connection_stats(name)
+    return httpx.Client(
+        base_url=base_url,
+        timeout=http_timeout(read_timeout),
+        transport=httpx.HTTPTransport(limits=_limits(), retries=HTTP_CONNECT_RETRIES),
+        event_hooks={"request": [stats.on_request]},
+    )
@@ -0,0 +1,67 @@
+# app/utils/loop_monitor.py
+import asyncio
+import os
+from typing import Any, Dict, Optional
+from app.utils.metrics import EVENT_LOOP_LAG, Histogram
+
+# How often the monitor wakes, and the lag reported as a stall
+LOOP_LAG_INTERVAL_MS = float(os.getenv("LOOP_LAG_INTERVAL_MS", "100"))
+LOOP_LAG_WARN_MS = float(os.getenv("LOOP_LAG_WARN_MS", "250"))
+LAG_BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 250, 500, 1000, 2500, 5000)
+
+
+class LoopLagMonitor:
+    """
+    Sleeps for a fixed interval on the event loop and measures how late it wakes
+    up. Lag means something ran on the loop thread without yielding (blocking
+    I/O, CPU work that belongs on a pool), delaying every other request.
+    """
+
+    def __init__(self, name: str = "app", interval_ms: float = LOOP_LAG_INTERVAL_MS, warn_ms: float = LOOP_LAG_WARN_MS):
+        self.name = name
+        self.interval = interval_ms / 1000
+        self.warn_ms = warn_ms
+        self.lag_ms = Histogram(LAG_BUCKETS_MS)
+        self.max_lag_ms = 0.0
+        self.stalls = 0
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - start - self.interval)
+            lag_ms = lag * 1000
+            self.lag_ms.observe(lag_ms)
+            EVENT_LOOP_LAG.observe(lag, loop=self.name)
+            self.max_lag_ms = max(self.max_lag_ms, lag_ms)
+            if lag_ms >= self.warn_ms:
+                self.stalls += 1
+                print(f"⚠️ Event loop ({self.name}) blocked for {lag_ms:.0f} ms")
+
+    def stats(self) -> Dict[str, Any]:
+        snapshot = self.lag_ms.snapshot()
+        return {
+            "interval_ms": self.interval * 1000,
+            "samples": snapshot["count"],
+            "mean_ms": round(snapshot["mean"], 3),
+            "p50_ms": self.lag_ms.quantile(0.5),
+            "p99_ms": self.lag_ms.quantile(0.99),
+            "max_ms": round(self.max_lag_ms, 3),
+            "stalls": self.stalls,
+            "stall_threshold_ms": self.warn_ms,
+        }
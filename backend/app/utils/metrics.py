@@ -0,0 +1,221 @@
+# app/utils/metrics.py
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, List, Sequence, Tuple
+from app.utils.tracing import span
+
+
+class Histogram:
+    """
+    Fixed-bucket histogram: a count per upper bound (plus +Inf), the sum and the
+    total count. Quantiles are estimated as the upper bound of the bucket they
+    fall in. Thread-safe.
+    """
+
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        self._counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        with self._lock:
+            self._counts[bisect.bisect_left(self.buckets, value)] += 1
+            self.sum += value
+            self.count += 1
+
+    def quantile(self, q: float) -> float:
+        with self._lock:
+            if not self.count:
+                return 0.0
+            target = q * self.count
+            seen = 0
+            for bound, n in zip(self.buckets + (float("inf"),), self._counts):
+                seen += n
+                if seen >= target:
+                    return bound
+            return float("inf")
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            cumulative, seen = {}, 0
+            for bound, n in zip(self.buckets + (float("inf"),), self._counts):
+                seen += n
+                cumulative["+Inf" if bound == float("inf") else str(bound)] = seen
+            count, total = self.count, self.sum
+        return {
+            "count": count,
+            "sum": total,
+            "mean": (total / count) if count else 0.0,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "buckets": cumulative,
+        }
+
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+TOKEN_BUCKETS = (0, 100, 250, 500, 1000, 2000, 4000, 8000, 16000, 32000, 64000)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _label_str(labelnames: Sequence[str], values: Sequence[str]) -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(labelnames, values)]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    """
+    Monotonic counter with one value per label combination. Thread-safe.
+    """
+
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            return self._values.get(key, 0)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return [f"{self.name}{_label_str(self.labelnames, key)} {value}" for key, value in values]
+
+
+class HistogramFamily:
+    """
+    One Histogram per label combination, all with the same buckets.
+    """
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._children: Dict[Tuple[str, ...], Histogram] = {}
+
+    def labels(self, **labels) -> Histogram:
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            child = self._children.get(key)
+            if child is None:
+                child = Histogram(self.buckets)
+                self._children[key] = child
+            return child
+
+    def observe(self, value: float, **labels):
+        self.labels(**labels).observe(value)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            children = sorted(self._children.items())
+        lines = []
+        for key, child in children:
+            snap = child.snapshot()
+            for bound, count in snap["buckets"].items():
+                labels = _label_str(self.labelnames + ("le",), key + (bound,))
+                lines.append(f"{self.name}_bucket{labels} {count}")
+            lines.append(f"{self.name}_sum{_label_str(self.labelnames, key)} {snap['sum']}")
+            lines.append(f"{self.name}_count{_label_str(self.labelnames, key)} {snap['count']}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    Named counters and histograms, rendered in the Prometheus text format.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics: Dict[str, Any] = {}
+
+    def _register(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, help, labelnames))
+
+    def histogram(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS) -> HistogramFamily:
+        return self._register(HistogramFamily(name, help, labelnames, buckets))
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = sorted(self._metrics.items())
+        lines = []
+        for name, metric in metrics:
+            lines.append(f"# HELP {name} {metric.help}")
+            lines.append(f"# TYPE {name} {metric.kind}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+# Process-wide registry served on /metrics
+METRICS = MetricsRegistry()
+STAGE_SECONDS = METRICS.histogram(
+    "qa_stage_duration_seconds", "Time spent per pipeline stage (extraction, chunking, embedding, vector I/O, prompt, LLM, parsing).", ("stage",)
+)
+STAGE_ERRORS = METRICS.counter("qa_stage_errors_total", "Pipeline stages that raised.", ("stage",))
+HTTP_SECONDS = METRICS.histogram("qa_http_request_duration_seconds", "HTTP request latency by route.", ("method", "route", "status"))
+LLM_TOKENS = METRICS.counter("qa_llm_tokens_total", "LLM tokens sent (in) and generated (out).", ("model", "direction"))
+CACHE_LOOKUPS = METRICS.counter("qa_cache_lookups_total", "Cache lookups by cache and result (hit/miss).", ("cache", "result"))
+CHUNKS = METRICS.counter("qa_chunks_total", "Chunks indexed, reused, deleted, retrieved, used, deduplicated and merged.", ("event",))
+PROMPT_TOKENS = METRICS.histogram(
+    "qa_prompt_tokens", "Tokens per LLM prompt: the whole prompt, the page/context part and what pruning saved.",
+    ("prompt", "part"), buckets=TOKEN_BUCKETS,
+)
+EMBED_BATCH_SIZE = METRICS.histogram(
+    "qa_embed_batch_size", "Texts per micro-batched embedding call.", buckets=(1, 2, 4, 8, 16, 32, 64, 128)
+)
+EMBED_QUEUE_WAIT = METRICS.histogram(
+    "qa_embed_batch_queue_wait_seconds", "How long an embedding request waited for its micro-batch to flush."
+)
+EVENT_LOOP_LAG = METRICS.histogram("qa_event_loop_lag_seconds", "How late the event loop ran a timer (time it was blocked).", ("loop",))
+
+
+def observe_stage(name: str, seconds: float):
+    """
+    Records a stage timed elsewhere (e.g. in an extraction worker process).
+    """
+    STAGE_SECONDS.observe(seconds, stage=name)
+
+
+@contextmanager
+def stage(name: str, **attributes):
+    """
+    Times the block into qa_stage_duration_seconds{stage=name} (counting it in
+    qa_stage_errors_total if it raises) and, with tracing on, wraps it in a span.
+    """
+    start = time.perf_counter()
+    with span(name, attributes):
+        try:
+            yield
+        except BaseException:
+            STAGE_ERRORS.inc(stage=name)
+            raise
+        finally:
+            STAGE_SECONDS.observe(time.perf_counter() - start, stage=name)
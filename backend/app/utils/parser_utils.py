@@ -1,7 +1,189 @@
+import json
+import re
 from bs4 import BeautifulSoup
+from app.utils.tokens import count_tokens
+
+# Bump when build_selector_index output changes so stored indexes are rebuilt
+SELECTOR_INDEX_VERSION = 2
+# Subtrees a Selenium script never needs
+NON_CONTENT_TAGS = ["head", "script", "style", "noscript", "svg", "template", "iframe", "link", "meta"]
+CONTROL_TAGS = ["input", "select", "textarea", "button", "a"]
+# Attributes worth showing the LLM; inline styles and on* handlers are dropped
+KEPT_ATTRS = ("id", "name", "type", "value", "placeholder", "href", "for", "role", "aria-label", "data-testid", "class")
+MAX_ELEMENT_TEXT = 80
+MAX_SELECT_OPTIONS = 20
 
 def parse_html(raw_html: str):
     soup = BeautifulSoup(raw_html, "html.parser")
     # Extract visible text
     text = soup.get_text(separator="\n", strip=True)
     return text
+
+
+def css_path(element) -> str:
+    """
+    Short CSS selector for a tag: anchored at the nearest ancestor with an id,
+    otherwise a tag / :nth-of-type path from the document root.
+    """
+    parts = []
+    while element is not None and element.name not in (None, "[document]", "html"):
+        if element.get("id"):
+            parts.append(f"{element.name}#{element['id']}")
+            break
+        siblings = element.parent.find_all(element.name, recursive=False) if element.parent else [element]
+        if len(siblings) > 1:
+            position = next(i for i, s in enumerate(siblings) if s is element) + 1
+            parts.append(f"{element.name}:nth-of-type({position})")
+        else:
+            parts.append(element.name)
+        element = element.parent
+    return " > ".join(reversed(parts))
+
+
+def _compact(fields: dict) -> dict:
+    # Drop empty attributes so the stored index (and the prompt) stays small
+    return {k: v for k, v in fields.items() if v not in (None, "", [])}
+
+
+def build_selector_index(raw_html: str) -> dict:
+    """
+    Parses a page once and returns the selectors a script needs:
+    inputs (with their label text), buttons, forms, labels, and every id / name.
+    Each element carries a CSS path usable as a fallback locator. "elements" is
+    the pruned DOM used in prompts, with per-element keywords and token counts.
+    """
+    soup = BeautifulSoup(raw_html, "html.parser")
+
+    labels = []
+    label_for = {}
+    for label in soup.find_all("label"):
+        text = label.get_text(strip=True)
+        target = label.get("for")
+        if target:
+            label_for[target] = text
+        else:
+            # <label>Code <input ...></label> labels its nested control
+            nested = label.find(["input", "select", "textarea"])
+            if nested is not None:
+                label_for[id(nested)] = text
+        labels.append(_compact({"for": target, "text": text}))
+
+    inputs = []
+    for element in soup.find_all(["input", "select", "textarea"]):
+        inputs.append(_compact({
+            "tag": element.name,
+            "type": element.get("type"),
+            "id": element.get("id"),
+            "name": element.get("name"),
+            "class": element.get("class"),
+            "placeholder": element.get("placeholder"),
+            "text": element.get_text(strip=True),
+            "label": label_for.get(element.get("id")) or label_for.get(id(element)),
+            "css": css_path(element),
+        }))
+
+    buttons = []
+    for btn in soup.find_all(["button", "input"]):
+        if btn.name == "button" or (btn.name == "input" and btn.get("type") in ["submit", "button"]):
+            buttons.append(_compact({
+                "tag": btn.name,
+                "id": btn.get("id"),
+                "name": btn.get("name"),
+                "class": btn.get("class"),
+                "text": btn.get_text(strip=True) or btn.get("value"),
+                "css": css_path(btn),
+            }))
+
+    forms = []
+    for form in soup.find_all("form"):
+        forms.append(_compact({
+            "id": form.get("id"),
+            "name": form.get("name"),
+            "action": form.get("action"),
+            "method": form.get("method"),
+            "css": css_path(form),
+        }))
+
+    # What the page cost per request when sent raw next to the indented metadata
+    raw_tokens = count_tokens(raw_html) + count_tokens(json.dumps({"inputs": inputs, "buttons": buttons}, indent=2))
+    ids = sorted({el["id"] for el in soup.find_all(id=True)})
+    names = sorted({el["name"] for el in soup.find_all(attrs={"name": True})})
+
+    for tag in soup.find_all(NON_CONTENT_TAGS):
+        tag.decompose()
+
+    elements = []
+    for el in soup.find_all(True):
+        is_control = el.name in CONTROL_TAGS and (el.name != "a" or el.get("href") or el.get("id"))
+        # Non-interactive elements are kept when a test could assert on them:
+        # headings, and id-bearing leaves such as <div id="success-msg">
+        is_anchor = el.name in ("h1", "h2", "h3") or (
+            el.get("id") and el.name not in ("form", "label") and not el.find(id=True) and not el.find(CONTROL_TAGS)
+        )
+        if not (is_control or is_anchor):
+            continue
+        label = (label_for.get(el.get("id")) or label_for.get(id(el))) if is_control else None
+        notes = ([f"label: {label}"] if label else []) + [f"css: {css_path(el)}"]
+        line = f"{_render_element(el)}  <!-- {' | '.join(notes)} -->"
+        elements.append({
+            "line": line,
+            "keywords": " ".join(sorted(keyword_set(
+                el.get("id"), el.get("name"), el.get("placeholder"), el.get("aria-label"),
+                el.get("value"), el.get("type"), label, el.get_text(" ", strip=True)[:MAX_ELEMENT_TEXT],
+            ))),
+            "tokens": count_tokens(line),
+            "control": bool(is_control),
+        })
+
+    return {
+        "version": SELECTOR_INDEX_VERSION,
+        "inputs": inputs,
+        "buttons": buttons,
+        "forms": forms,
+        "labels": labels,
+        "ids": ids,
+        "names": names,
+        # Pruned DOM: one rendered line per relevant element, in document order
+        "elements": elements,
+        "raw_tokens": raw_tokens,
+    }
+
+
+def keyword_set(*parts) -> set:
+    """
+    Lowercase words from the given strings, with ids like "discountCode" or
+    "apply-coupon_btn" split into their parts.
+    """
+    words = set()
+    for part in parts:
+        if not part:
+            continue
+        if isinstance(part, list):
+            part = " ".join(part)
+        part = re.sub(r"([a-z])([A-Z])", r"\1 \2", str(part))
+        words.update(w for w in re.split(r"[^a-z0-9]+", part.lower()) if len(w) > 1)
+    return words
+
+
+def _render_element(el) -> str:
+    """
+    Compact HTML for one element: kept attributes only, text truncated, no children markup.
+    """
+    attrs = []
+    for key in KEPT_ATTRS:
+        value = el.get(key)
+        if value in (None, "", []):
+            continue
+        if isinstance(value, list):
+            value = " ".join(value)
+        attrs.append(f'{key}="{str(value).replace(chr(34), "&quot;")}"')
+    open_tag = "<" + " ".join([el.name] + attrs) + ">"
+    if el.name == "input":
+        return open_tag
+    if el.name == "select":
+        options = "".join(
+            f'<option value="{o.get("value", "")}">{o.get_text(strip=True)[:MAX_ELEMENT_TEXT]}</option>'
+            for o in el.find_all("option")[:MAX_SELECT_OPTIONS]
+        )
+        return f"{open_tag}{options}</select>"
+    return f"{open_tag}{el.get_text(' ', strip=True)[:MAX_ELEMENT_TEXT]}</{el.name}>"
@@ -0,0 +1,42 @@
+# app/utils/tokens.py
+import os
+from functools import lru_cache
+
+# Llama 3 uses a tiktoken BPE; cl100k_base counts within a few percent of it,
+# which is plenty for prompt budgeting
+TOKENIZER_ENCODING = os.getenv("TOKENIZER_ENCODING", "cl100k_base")
+
+
+@lru_cache(maxsize=1)
+def _encoding():
+    try:
+        import tiktoken
+        return tiktoken.get_encoding(TOKENIZER_ENCODING)
+    except Exception as e:
+        # Not installed, or the BPE file can't be fetched offline
+        print(f"⚠️ Tokenizer unavailable ({e}); estimating 4 characters per token.")
+        return None
+
+
+def count_tokens(text: str) -> int:
+    if not text:
+        return 0
+    encoding = _encoding()
+    if encoding is None:
+        return (len(text) + 3) // 4
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """
+    Longest prefix of text that is at most max_tokens tokens.
+    """
+    if max_tokens <= 0:
+        return ""
+    encoding = _encoding()
+    if encoding is None:
+        return text[:max_tokens * 4]
+    tokens = encoding.encode(text, disallowed_special=())
+    if len(tokens) <= max_tokens:
+        return text
+    return encoding.decode(tokens[:max_tokens])
@@ -0,0 +1,61 @@
+# app/utils/tracing.py
+import os
+import threading
+from contextlib import nullcontext
+from typing import Any, Dict, Optional
+
+# Optional OpenTelemetry spans around every pipeline stage (see metrics.stage)
+OTEL_TRACES_ENABLED = os.getenv("OTEL_TRACES_ENABLED", "0") == "1"
+OTEL_SERVICE_NAME = os.getenv("OTEL_SERVICE_NAME", "qa-agent-backend")
+
+_tracer = None
+_tracer_lock = threading.Lock()
+_disabled = not OTEL_TRACES_ENABLED
+
+
+def _init_tracer():
+    """
+    Spans go to the OTLP collector at OTEL_EXPORTER_OTLP_ENDPOINT if set, else to stdout.
+    """
+    from opentelemetry import trace
+    from opentelemetry.sdk.resources import Resource
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import BatchSpanProcessor, ConsoleSpanExporter
+
+    if os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT"):
+        from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import OTLPSpanExporter
+        exporter = OTLPSpanExporter()
+    else:
+        exporter = ConsoleSpanExporter()
+    provider = TracerProvider(resource=Resource.create({"service.name": OTEL_SERVICE_NAME}))
+    provider.add_span_processor(BatchSpanProcessor(exporter))
+    trace.set_tracer_provider(provider)
+    return trace.get_tracer("app")
+
+
+def get_tracer():
+    """
+    The process tracer, or None when tracing is off or OpenTelemetry can't be set up.
+    """
+    global _tracer, _disabled
+    if _disabled:
+        return None
+    if _tracer is None:
+        with _tracer_lock:
+            if _tracer is None and not _disabled:
+                try:
+                    _tracer = _init_tracer()
+                except Exception as e:
+                    print(f"⚠️ OpenTelemetry unavailable ({e}); tracing disabled.")
+                    _disabled = True
+    return _tracer
+
+
+def span(name: str, attributes: Optional[Dict[str, Any]] = None):
+    """
+    Context manager for a span named `name` (a no-op when tracing is off).
+    """
+    tracer = get_tracer()
+    if tracer is None:
+        return nullcontext()
+    return tracer.start_as_current_span(name, attributes=attributes or None)
@@ -0,0 +1,514 @@
+"""
+End-to-end benchmark suite: ingestion, retrieval and generation on
+project_assets/ and on synthetic corpora scaled from it (--scales 10 100 1000
+makes that many revised copies of every asset, so no chunk is a duplicate).
+
+Per scale:
+    extract   MB/s per format (pdf, html, json, text)
+    chunk     chunks/s
+    embed     embeddings/s (first --embed-limit chunks)
+    vector    Chroma add throughput and query p50/p95 as the collection grows
+Once, against the real FastAPI app on a local port:
+    endpoints upload-to-indexed time per session, then /generate-testcases and
+              /generate-selenium-script throughput and latency, with the LLM
+              served by benchmarks/stub_llm_server.py (deterministic, no network)
+
+Results are written as JSON; --compare flags throughput/latency metrics that
+regressed by more than --tolerance against an earlier run (exit code 1).
+--embedder hash swaps the model for a hashed bag-of-words stand-in, to
+benchmark everything else on machines without the model.
+
+Usage (from backend/):
+    python benchmarks/e2e_suite.py
+    python benchmarks/e2e_suite.py --scales 1 10 100 1000 --out results/base.json
+    python benchmarks/e2e_suite.py --embedder hash --stages extract chunk vector
+    python benchmarks/e2e_suite.py --compare results/base.json --tolerance 0.1
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import platform
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+import zlib
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+# The stand-in LLM has no rate limit to respect (read when the app modules load)
+os.environ.setdefault("LLM_BACKENDS", "groq:llama-3.3-70b-versatile,ollama:llama3")
+
+import chromadb
+import fitz
+import httpx
+import numpy as np
+
+from app.services.file_ingestion import detect_file_type, iter_local_file_text
+from app.services.registry import registry
+from app.services.vector_db import VectorDB
+from app.utils.chunk_utils import iter_chunks
+from stub_llm_server import StubLLMServer
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ASSETS_DIR = os.path.join(os.path.dirname(BACKEND_DIR), "project_assets")
+STAGES = ("extract", "chunk", "embed", "vector", "endpoints")
+SESSION = "bench-session"
+QUERIES = [
+    "What does the SAVE15 code do?",
+    "Which endpoint applies a coupon?",
+    "How much does express shipping cost?",
+    "Phone number validation rule",
+    "Colour of inline error messages",
+    "Message shown after payment succeeds",
+    "How is the final total calculated?",
+    "Minimum item quantity in the cart",
+]
+TEST_CASE = {
+    "Test_ID": "TC-001",
+    "Feature": "Discount code",
+    "Test_Scenario": "Apply SAVE15 and submit the order",
+    "Expected_Result": "Total is reduced by 15%",
+}
+
+
+class HashEmbedder:
+    """Hashed bag-of-words unit vectors: no model, deterministic, ~free."""
+
+    def __init__(self, dimension: int = 384):
+        self.dimension = dimension
+        self.cache = None
+
+    def embed_texts(self, texts, out=None):
+        if out is None:
+            out = np.empty((len(texts), self.dimension), dtype=np.float32)
+        out[...] = 0
+        for row, text in enumerate(texts):
+            for word in text.lower().split():
+                out[row, zlib.crc32(word.encode("utf-8")) % self.dimension] += 1
+        out /= np.maximum(np.linalg.norm(out, axis=1, keepdims=True), 1e-9)
+        return out
+
+
+def make_embedder(name: str):
+    if name == "hash":
+        return HashEmbedder()
+    if name == "onnx":
+        from app.services.onnx_embeddings import OnnxEmbeddingService
+        return OnnxEmbeddingService()
+    from app.services.embeddings import EmbeddingService
+    return EmbeddingService()
+
+
+# ------------------------------------------------------
+# Corpus
+# ------------------------------------------------------
+def _revise_strings(value, suffix: str):
+    if isinstance(value, str):
+        return value + suffix
+    if isinstance(value, list):
+        return [_revise_strings(v, suffix) for v in value]
+    if isinstance(value, dict):
+        return {k: _revise_strings(v, suffix) for k, v in value.items()}
+    return value
+
+
+def write_revision(src: str, dst: str, revision: int):
+    """
+    Copy of an asset whose text differs slightly per revision (same format, ~same size).
+    """
+    if revision == 0:
+        shutil.copyfile(src, dst)
+        return
+    file_type = detect_file_type(src)
+    if file_type == "pdf":
+        with fitz.open(src) as doc:
+            for page in doc:
+                page.insert_text((36, 24), f"Revision {revision}, page {page.number + 1}")
+            doc.save(dst)
+    elif file_type == "json":
+        with open(src, encoding="utf-8") as f:
+            data = json.load(f)
+        with open(dst, "w", encoding="utf-8") as f:
+            json.dump(_revise_strings(data, f" (rev {revision})"), f, indent=2)
+    else:
+        with open(src, encoding="utf-8") as f:
+            text = f.read()
+        if file_type == "html":
+            text = text.replace("<body>", f"<body>\n<p>Revision {revision}</p>", 1)
+        else:
+            text = "".join(line.rstrip("\n") + f" [rev {revision}]\n" if line.strip() else line for line in text.splitlines(True))
+        with open(dst, "w", encoding="utf-8") as f:
+            f.write(text)
+
+
+def make_corpus(scale: int, out_dir: str) -> list:
+    paths = []
+    for name in sorted(os.listdir(ASSETS_DIR)):
+        stem, ext = os.path.splitext(name)
+        for revision in range(scale):
+            dst = os.path.join(out_dir, f"{stem}_{revision:04d}{ext}")
+            write_revision(os.path.join(ASSETS_DIR, name), dst, revision)
+            paths.append(dst)
+    return paths
+
+
+# ------------------------------------------------------
+# Stages
+# ------------------------------------------------------
+def percentiles_ms(seconds) -> dict:
+    ms = np.array(seconds) * 1000
+    return {f"p{q}_ms": round(float(np.percentile(ms, q)), 3) for q in (50, 95, 99)} if len(ms) else {}
+
+
+def bench_extract(paths: list) -> tuple:
+    """
+    HTML is measured through parse_html, as used for text extraction and the page index.
+    """
+    formats, texts = {}, []
+    for path in paths:
+        start = time.perf_counter()
+        text = "".join(iter_local_file_text(path))
+        elapsed = time.perf_counter() - start
+        agg = formats.setdefault(detect_file_type(path), {"files": 0, "bytes": 0, "chars": 0, "seconds": 0.0})
+        agg["files"] += 1
+        agg["bytes"] += os.path.getsize(path)
+        agg["chars"] += len(text)
+        agg["seconds"] += elapsed
+        texts.append(text)
+    for agg in formats.values():
+        agg["mb_per_s"] = round(agg["bytes"] / 1e6 / agg["seconds"], 3) if agg["seconds"] else None
+    return formats, texts
+
+
+def bench_chunk(texts: list, args) -> tuple:
+    start = time.perf_counter()
+    chunks = [c for text in texts for c in iter_chunks([text], chunk_size=args.chunk_size, chunk_overlap=args.chunk_overlap)]
+    elapsed = time.perf_counter() - start
+    return {"chunks": len(chunks), "seconds": elapsed, "chunks_per_s": round(len(chunks) / elapsed, 1)}, chunks
+
+
+def bench_embed(embedder, chunks: list, args) -> tuple:
+    sample = chunks[:args.embed_limit]
+    embedder.embed_texts(sample[:8])  # load the model outside the timing
+    vectors = np.empty((len(sample), embedder.dimension), dtype=np.float32)
+    start = time.perf_counter()
+    for i in range(0, len(sample), args.batch_size):
+        embedder.embed_texts(sample[i:i + args.batch_size], out=vectors[i:i + args.batch_size])
+    elapsed = time.perf_counter() - start
+    result = {"texts": len(sample), "batch_size": args.batch_size, "seconds": elapsed,
+              "embeddings_per_s": round(len(sample) / elapsed, 1)}
+    return result, vectors
+
+
+def checkpoints(total: int) -> list:
+    # 1-2-5 steps from 1000 up to the collection size
+    sizes, base = [], 1000
+    while base < total:
+        sizes += [s for s in (base, 2 * base, 5 * base) if s < total]
+        base *= 10
+    return sizes + [total]
+
+
+def fill_vectors(vectors: np.ndarray, n: int, seed: int = 0) -> np.ndarray:
+    """
+    n unit rows: the embedded sample, then noisy copies of it for chunks past --embed-limit.
+    """
+    if n <= len(vectors):
+        return vectors[:n]
+    rng = np.random.default_rng(seed)
+    extra = vectors[rng.integers(0, len(vectors), n - len(vectors))]
+    extra = extra + rng.normal(0, 0.05, extra.shape).astype(np.float32)
+    extra /= np.linalg.norm(extra, axis=1, keepdims=True)
+    return np.vstack([vectors, extra])
+
+
+def bench_vector(embedder, chunks: list, vectors: np.ndarray, args) -> list:
+    workdir = tempfile.mkdtemp(prefix="bench_e2e_vector_")
+    try:
+        vdb = VectorDB(persist_dir=workdir, client=chromadb.PersistentClient(path=workdir))
+        rows = fill_vectors(vectors, len(chunks))
+        query_vectors = embedder.embed_texts(QUERIES)
+        marks = checkpoints(len(chunks))
+        results, add_times, added = [], [], 0
+        segment_start = time.perf_counter()
+        for i in range(0, len(chunks), args.batch_size):
+            batch = chunks[i:i + args.batch_size]
+            start = time.perf_counter()
+            vdb.upsert_documents(
+                ids=[f"chunk-{i + j}" for j in range(len(batch))],
+                texts=batch,
+                embeddings=rows[i:i + len(batch)],
+                metadatas=[{"session_id": SESSION, "chunk_index": i + j} for j in range(len(batch))],
+                session_id=SESSION,
+            )
+            add_times.append(time.perf_counter() - start)
+            added += len(batch)
+            if added < marks[0]:
+                continue
+            segment = time.perf_counter() - segment_start
+            query_times = []
+            for q in range(args.queries):
+                start = time.perf_counter()
+                vdb.query(query_vectors[q % len(query_vectors)], n_results=args.k, session_id=SESSION)
+                query_times.append(time.perf_counter() - start)
+            segment_added = added - (results[-1]["size"] if results else 0)
+            point = {"size": added, "add_chunks_per_s": round(segment_added / segment, 1)}
+            point.update({f"add_batch_{k}": v for k, v in percentiles_ms(add_times).items()})
+            point.update({f"query_{k}": v for k, v in percentiles_ms(query_times).items()})
+            results.append(point)
+            print(f"    {added:>8} chunks: add {point['add_chunks_per_s']:.0f}/s, query p50 {point['query_p50_ms']:.2f} ms, p95 {point['query_p95_ms']:.2f} ms")
+            marks.pop(0)
+            add_times = []
+            segment_start = time.perf_counter()
+        return results
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def drive(client: httpx.AsyncClient, make_request, n: int, concurrency: int) -> dict:
+    latencies, errors = [], 0
+    pending = iter(range(n))
+
+    async def worker():
+        nonlocal errors
+        for i in pending:
+            start = time.perf_counter()
+            try:
+                response = await make_request(client, i)
+                body = response.json()
+                # Failures come back as 200s with an "error" field (or error items in "results")
+                ok = response.status_code == 200 and "error" not in body and not any(
+                    isinstance(r, dict) and "error" in r for r in body.get("results", [])
+                )
+            except Exception:
+                ok = False
+            latencies.append(time.perf_counter() - start)
+            errors += not ok
+
+    start = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    elapsed = time.perf_counter() - start
+    return dict({"requests": n, "concurrency": concurrency, "errors": errors, "req_per_s": round(n / elapsed, 2)}, **percentiles_ms(latencies))
+
+
+async def ingest_session(client: httpx.AsyncClient, session_id: str) -> float:
+    """
+    Seconds from upload to the KB job completing.
+    """
+    start = time.perf_counter()
+    files = []
+    for name in sorted(os.listdir(ASSETS_DIR)):
+        with open(os.path.join(ASSETS_DIR, name), "rb") as f:
+            files.append(("files", (name, f.read())))
+    headers = {"X-Session-ID": session_id}
+    job = (await client.post("/upload-documents", files=files, headers=headers)).json()
+    while True:
+        status = (await client.get(f"/jobs/{job['job_id']}", headers=headers)).json()["status"]
+        if status in ("completed", "failed"):
+            if status == "failed":
+                raise RuntimeError(f"KB job for {session_id} failed")
+            return time.perf_counter() - start
+        await asyncio.sleep(0.05)
+
+
+async def run_endpoints(base_url: str, args) -> dict:
+    sessions = [f"bench-{uuid.uuid4()}" for _ in range(args.sessions)]
+    # Every request is a fresh completion: nothing is answered from the LLM cache
+    bypass = {"X-Cache-Bypass": "1"}
+
+    async def testcases(client, i):
+        return await client.post("/generate-testcases", data={"query": f"{QUERIES[i % len(QUERIES)]} #{i}"},
+                                 headers=dict(bypass, **{"X-Session-ID": sessions[i % len(sessions)]}))
+
+    async def script(client, i):
+        return await client.post("/generate-selenium-script", data={"testcase_json": json.dumps(dict(TEST_CASE, Test_ID=f"TC-{i}"))},
+                                 headers=dict(bypass, **{"X-Session-ID": sessions[i % len(sessions)]}))
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=300) as client:
+        start = time.perf_counter()
+        ingest = await asyncio.gather(*[ingest_session(client, s) for s in sessions])
+        upload = dict({"sessions": len(sessions), "wall_s": round(time.perf_counter() - start, 3)}, **percentiles_ms(ingest))
+        return {
+            "upload_documents": upload,
+            "generate_testcases": await drive(client, testcases, args.requests, args.concurrency),
+            "generate_selenium_script": await drive(client, script, args.requests, args.concurrency),
+        }
+
+
+def bench_endpoints(embedder, args) -> dict:
+    """
+    Runs the real app (uvicorn, own temp working dir) against the stub LLM server.
+    """
+    import uvicorn
+
+    stub = StubLLMServer(latency_ms=args.llm_latency_ms, token_ms=args.llm_token_ms).start()
+    os.environ.update({"GROQ_BASE_URL": stub.url, "GROQ_API_KEY": "stub", "OLLAMA_BASE_URL": stub.url})
+    registry.register_embedder(embedder)
+    cwd, workdir = os.getcwd(), tempfile.mkdtemp(prefix="bench_e2e_app_")
+    # The app keeps its Chroma data, uploads and job DB under the working directory
+    os.chdir(workdir)
+    server = None
+    try:
+        from app.main import app
+
+        port = free_port()
+        server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+        thread = threading.Thread(target=server.run, daemon=True)
+        thread.start()
+        while not server.started:
+            time.sleep(0.05)
+        result = asyncio.run(run_endpoints(f"http://127.0.0.1:{port}", args))
+        result["llm"] = {"stub_requests": stub.requests, "latency_ms": args.llm_latency_ms, "token_ms": args.llm_token_ms}
+        return result
+    finally:
+        if server is not None:
+            server.should_exit = True
+            thread.join(timeout=30)
+        os.chdir(cwd)
+        stub.stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+# ------------------------------------------------------
+# Results
+# ------------------------------------------------------
+def flatten(value, prefix: str = "") -> dict:
+    """
+    {"a": {"b": 1}, "v": [{"size": 1000, "x_ms": 2}]} -> {"a.b": 1, "v.size=1000.x_ms": 2}
+    """
+    if isinstance(value, dict):
+        out = {}
+        for key, item in value.items():
+            out.update(flatten(item, f"{prefix}.{key}" if prefix else str(key)))
+        return out
+    if isinstance(value, list):
+        out = {}
+        for i, item in enumerate(value):
+            label = f"size={item['size']}" if isinstance(item, dict) and "size" in item else str(i)
+            out.update(flatten(item, f"{prefix}.{label}"))
+        return out
+    return {prefix: value} if isinstance(value, (int, float)) and not isinstance(value, bool) else {}
+
+
+def compare(current: dict, baseline: dict, tolerance: float) -> list:
+    """
+    Prints the change of every throughput (*_per_s, higher is better) and latency
+    (*_ms, lower is better) metric; returns the ones worse than tolerance.
+    """
+    now, before = flatten(current["results"]), flatten(baseline["results"])
+    regressions = []
+    print(f"\n{'metric':<70} {'baseline':>12} {'current':>12} {'change':>8}")
+    for key in sorted(now.keys() & before.keys()):
+        higher_is_better = key.endswith("_per_s")
+        if not (higher_is_better or key.endswith("_ms")) or not before[key]:
+            continue
+        change = (now[key] - before[key]) / before[key]
+        worse = -change if higher_is_better else change
+        flag = "  REGRESSION" if worse > tolerance else ""
+        if flag:
+            regressions.append(key)
+        print(f"{key:<70} {before[key]:>12.3f} {now[key]:>12.3f} {change:>+8.1%}{flag}")
+    return regressions
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=BACKEND_DIR, text=True, stderr=subprocess.DEVNULL).strip()
+    except Exception:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scales", type=int, nargs="+", default=[1, 10])
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=list(STAGES))
+    parser.add_argument("--embedder", choices=("torch", "onnx", "hash"), default="torch")
+    parser.add_argument("--embed-limit", type=int, default=5000, help="max chunks embedded per scale (vector rows past it are noisy copies)")
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--chunk-size", type=int, default=800)
+    parser.add_argument("--chunk-overlap", type=int, default=150)
+    parser.add_argument("--queries", type=int, default=50, help="vector queries per collection size")
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--sessions", type=int, default=4, help="sessions uploaded for the endpoint stage")
+    parser.add_argument("--requests", type=int, default=100, help="requests per generation endpoint")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--llm-latency-ms", type=float, default=50, help="stub LLM delay per request")
+    parser.add_argument("--llm-token-ms", type=float, default=0, help="stub LLM delay per output token")
+    parser.add_argument("--out", help="results JSON (default benchmarks/results/e2e-<timestamp>.json)")
+    parser.add_argument("--compare", help="earlier results JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="relative change counted as a regression")
+    args = parser.parse_args()
+
+    embedder = make_embedder(args.embedder)
+    started = datetime.datetime.now(datetime.timezone.utc)
+    results = {"scales": {}}
+    for scale in args.scales:
+        corpus_dir = tempfile.mkdtemp(prefix=f"bench_e2e_corpus_{scale}x_")
+        try:
+            paths = make_corpus(scale, corpus_dir)
+            print(f"Scale {scale}x: {len(paths)} files, {sum(os.path.getsize(p) for p in paths) / 1e6:.1f} MB")
+            scale_results = {}
+            scale_results["extract"], texts = bench_extract(paths)
+            for file_type, r in sorted(scale_results["extract"].items()):
+                print(f"    extract {file_type:<5} {r['mb_per_s']:>9.2f} MB/s ({r['files']} files)")
+            scale_results["chunk"], chunks = bench_chunk(texts, args)
+            print(f"    chunk         {scale_results['chunk']['chunks_per_s']:>9.0f} chunks/s ({len(chunks)} chunks)")
+            if {"embed", "vector"} & set(args.stages):
+                scale_results["embed"], vectors = bench_embed(embedder, chunks, args)
+                print(f"    embed         {scale_results['embed']['embeddings_per_s']:>9.0f} embeddings/s ({args.embedder})")
+            if "vector" in args.stages:
+                scale_results["vector"] = bench_vector(embedder, chunks, vectors, args)
+            results["scales"][str(scale)] = {stage: r for stage, r in scale_results.items() if stage in args.stages}
+        finally:
+            shutil.rmtree(corpus_dir, ignore_errors=True)
+
+    if "endpoints" in args.stages:
+        print(f"Endpoints: {args.sessions} sessions, {args.requests} requests per endpoint at concurrency {args.concurrency}")
+        results["endpoints"] = bench_endpoints(embedder, args)
+        for name, r in results["endpoints"].items():
+            if "req_per_s" in r:
+                print(f"    {name:<26} {r['req_per_s']:>8.1f} req/s  p50 {r['p50_ms']:.0f} ms  p95 {r['p95_ms']:.0f} ms  errors {r['errors']}")
+        upload = results["endpoints"]["upload_documents"]
+        print(f"    {'upload_documents':<26} {upload['sessions']} sessions indexed in {upload['wall_s']:.1f} s (p50 {upload['p50_ms']:.0f} ms)")
+
+    report = {
+        "meta": {
+            "started": started.isoformat(),
+            "git_commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "args": vars(args),
+        },
+        "results": results,
+    }
+    out = args.out or os.path.join(BACKEND_DIR, "benchmarks", "results", f"e2e-{started:%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {out}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        if regressions:
+            print(f"{len(regressions)} metric(s) regressed by more than {args.tolerance:.0%}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+Peak-memory benchmark for the embedding hand-off in KnowledgeBaseBuilder.
+
+Compares the old path (each batch converted with .tolist() and appended to a
+Python list of lists) with the current path (batches written in place into one
+preallocated float32 matrix). Each mode runs in a fresh subprocess so ru_maxrss
+reflects only that mode.
+
+Usage (from backend/):
+    python benchmarks/embedding_memory.py --chunks 200000
+    python benchmarks/embedding_memory.py --chunks 5000 --real-model --with-chroma
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+BATCH_SIZE = 64
+
+
+class SyntheticEmbedder:
+    """Stand-in encoder producing float32 vectors without loading a model."""
+    dimension = 384
+
+    def __init__(self):
+        self._rng = np.random.default_rng(0)
+
+    def embed_texts(self, texts, out=None):
+        emb = self._rng.random((len(texts), self.dimension), dtype=np.float32)
+        if out is None:
+            return emb
+        out[...] = emb
+        return out
+
+
+def _rss_mb() -> float:
+    # ru_maxrss is KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_mode(mode: str, n_chunks: int, real_model: bool, with_chroma: bool) -> dict:
+    if real_model:
+        from app.services.embeddings import EmbeddingService
+        embedder = EmbeddingService()
+        embedder.embed_texts(["warm up"])
+    else:
+        embedder = SyntheticEmbedder()
+    chunks = [f"chunk {i} " + "lorem ipsum " * 20 for i in range(n_chunks)]
+
+    baseline_rss = _rss_mb()
+    start = time.perf_counter()
+
+    if mode == "list":
+        embeddings = []
+        for i in range(0, n_chunks, BATCH_SIZE):
+            emb = embedder.embed_texts(chunks[i:i + BATCH_SIZE])
+            embeddings.extend(emb.tolist())
+    else:
+        embeddings = np.empty((n_chunks, embedder.dimension), dtype=np.float32)
+        for i in range(0, n_chunks, BATCH_SIZE):
+            embedder.embed_texts(chunks[i:i + BATCH_SIZE], out=embeddings[i:i + BATCH_SIZE])
+
+    if with_chroma:
+        from app.services.vector_db import VectorDB
+        vdb = VectorDB(persist_dir=tempfile.mkdtemp(prefix="bench_chroma_"))
+        ids = [str(i) for i in range(n_chunks)]
+        metas = [{"session_id": "bench"}] * n_chunks
+        # Chroma caps a single write; insert in its max batch size
+        step = vdb.client.get_max_batch_size()
+        for i in range(0, n_chunks, step):
+            vdb.upsert_documents(ids[i:i + step], chunks[i:i + step], embeddings[i:i + step], metas[i:i + step])
+
+    elapsed = time.perf_counter() - start
+    return {
+        "mode": mode,
+        "chunks": n_chunks,
+        "seconds": round(elapsed, 3),
+        "rss_growth_mb": round(_rss_mb() - baseline_rss, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=100000)
+    parser.add_argument("--real-model", action="store_true", help="Use the SentenceTransformer model instead of synthetic vectors")
+    parser.add_argument("--with-chroma", action="store_true", help="Include the upsert into a temporary Chroma collection")
+    parser.add_argument("--mode", choices=["list", "ndarray"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        print(json.dumps(run_mode(args.mode, args.chunks, args.real_model, args.with_chroma)))
+        return
+
+    results = []
+    for mode in ("list", "ndarray"):
+        cmd = [sys.executable, os.path.abspath(__file__), "--mode", mode, "--chunks", str(args.chunks)]
+        if args.real_model:
+            cmd.append("--real-model")
+        if args.with_chroma:
+            cmd.append("--with-chroma")
+        out = subprocess.run(cmd, check=True, capture_output=True, text=True).stdout
+        results.append(json.loads(out.strip().splitlines()[-1]))
+
+    print(f"{'mode':<10}{'chunks':>10}{'seconds':>10}{'peak RSS growth MB':>20}")
+    for r in results:
+        print(f"{r['mode']:<10}{r['chunks']:>10}{r['seconds']:>10}{r['rss_growth_mb']:>20}")
+    old, new = results
+    if new["rss_growth_mb"] > 0:
+        print(f"\nPeak RSS reduction: {old['rss_growth_mb'] / new['rss_growth_mb']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
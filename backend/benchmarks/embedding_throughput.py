@@ -0,0 +1,88 @@
+"""
+Embedding throughput (texts/sec) of the torch and ONNX Runtime backends on CPU,
+plus model load time and cosine drift against the torch vectors.
+
+Texts are chunk-sized (~800 chars) like the ones KnowledgeBaseBuilder embeds;
+--short uses query-sized texts instead. No embedding cache is attached.
+
+Usage (from backend/):
+    python benchmarks/embedding_throughput.py --texts 2000
+    python benchmarks/embedding_throughput.py --threads 1 2 4 --backends onnx onnx-int8
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from app.services.embeddings import EmbeddingService
+from app.services.onnx_embeddings import OnnxEmbeddingService
+
+BATCH_SIZE = 64
+WORDS = "discount code shipping express standard subtotal checkout payment email address phone invalid".split()
+
+
+def make_texts(n: int, short: bool) -> list:
+    rng = np.random.default_rng(0)
+    length = 8 if short else 120
+    return [" ".join(rng.choice(WORDS, size=length)) + f" #{i}" for i in range(n)]
+
+
+def make_embedder(backend: str, model: str, threads: int):
+    if backend == "torch":
+        import torch
+        if threads:
+            torch.set_num_threads(threads)
+        return EmbeddingService(model_name=model)
+    return OnnxEmbeddingService(model_name=model, quantize=backend == "onnx-int8", intra_op_threads=threads)
+
+
+def run(backend: str, threads: int, texts: list, args, reference=None) -> dict:
+    start = time.perf_counter()
+    embedder = make_embedder(backend, args.model, threads)
+    embedder.embed_texts(texts[:1])
+    load_s = time.perf_counter() - start
+
+    vectors = np.empty((len(texts), embedder.dimension), dtype=np.float32)
+    start = time.perf_counter()
+    # Same batch hand-off as KnowledgeBaseBuilder
+    for i in range(0, len(texts), BATCH_SIZE):
+        embedder.embed_texts(texts[i:i + BATCH_SIZE], out=vectors[i:i + BATCH_SIZE])
+    elapsed = time.perf_counter() - start
+
+    drift = None
+    if reference is not None:
+        a = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+        b = reference / np.linalg.norm(reference, axis=1, keepdims=True)
+        drift = float((a * b).sum(axis=1).min())
+    return {"backend": backend, "threads": threads, "load_s": load_s, "tps": len(texts) / elapsed, "min_cos": drift, "vectors": vectors}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--texts", type=int, default=1000)
+    parser.add_argument("--short", action="store_true", help="query-sized texts")
+    parser.add_argument("--model", default="all-MiniLM-L6-v2")
+    parser.add_argument("--threads", type=int, nargs="+", default=[0], help="0 = library default")
+    parser.add_argument("--backends", nargs="+", default=["torch", "onnx", "onnx-int8"],
+                        choices=["torch", "onnx", "onnx-int8"])
+    args = parser.parse_args()
+
+    texts = make_texts(args.texts, args.short)
+    print(f"{len(texts)} texts, model {args.model}")
+    print(f"{'backend':<10} {'threads':>7} {'load s':>7} {'texts/s':>9} {'min cos vs torch':>17}")
+    reference = None
+    for backend in args.backends:
+        for threads in args.threads:
+            r = run(backend, threads, texts, args, reference)
+            if backend == "torch" and reference is None:
+                reference = r["vectors"]
+            drift = f"{r['min_cos']:.5f}" if r["min_cos"] is not None else "-"
+            print(f"{r['backend']:<10} {r['threads'] or 'auto':>7} {r['load_s']:>7.2f} {r['tps']:>9.1f} {drift:>17}")
+
+
+if __name__ == "__main__":
+    main()
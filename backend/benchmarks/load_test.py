@@ -0,0 +1,311 @@
+"""
+Load test for one backend worker: concurrent virtual users, each with its own
+session ID, upload project_assets/, wait for the KB job, then loop on
+/generate-testcases and /generate-selenium-script (with X-Cache-Bypass, so
+every request reaches the LLM).
+
+By default the harness starts two local processes: the mock Groq/Ollama
+server (benchmarks/stub_llm_server.py, configurable latency and token rate,
+optional 429s) and the backend itself (one uvicorn worker pointed at it).
+--target runs against an already running backend instead.
+
+Reports throughput, p50/p95/p99 latency and error rate per endpoint, plus
+event-loop lag on both sides: the backend's (GET /admin/loop-lag; lag there
+means a request blocked the loop) and the load generator's own (if that lags,
+the client is the bottleneck and the numbers understate the server).
+
+Usage (from backend/):
+    python benchmarks/load_test.py --users 50 --duration 60
+    python benchmarks/load_test.py --users 200 --llm-latency-ms 800 --tokens-per-s 40 --llm-backend ollama
+    python benchmarks/load_test.py --users 20 --embedder hash --llm-429-every 10 --out load.json
+    python benchmarks/load_test.py --target http://localhost:8000 --users 10 --duration 30
+"""
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from collections import defaultdict
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+import numpy as np
+
+from app.utils.loop_monitor import LoopLagMonitor
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCH_DIR)
+ASSETS_DIR = os.path.join(os.path.dirname(BACKEND_DIR), "project_assets")
+ENDPOINTS = ("/upload-documents", "kb-ready", "/generate-testcases", "/generate-selenium-script")
+QUERIES = [
+    "Generate test cases for the discount code feature",
+    "Test cases for shipping method selection",
+    "Form validation test cases for the checkout page",
+    "Test cases for the payment flow",
+]
+FALLBACK_TEST_CASE = {
+    "Test_ID": "TC-001",
+    "Feature": "Discount code",
+    "Test_Scenario": "Apply SAVE15 and submit the order",
+    "Expected_Result": "Total is reduced by 15%",
+}
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_for(url: str, process: subprocess.Popen, timeout: float = 120):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{process.args} exited with {process.returncode}")
+        try:
+            httpx.get(url, timeout=1)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    raise TimeoutError(f"{url} did not come up within {timeout}s")
+
+
+def start_processes(args, workdir: str) -> tuple:
+    """
+    Mock LLM server + one backend worker; returns (base_url, processes).
+    """
+    llm_port, app_port = free_port(), free_port()
+    llm_url = f"http://127.0.0.1:{llm_port}"
+    token_ms = 1000 / args.tokens_per_s if args.tokens_per_s else 0
+    stub = subprocess.Popen([
+        sys.executable, os.path.join(BENCH_DIR, "stub_llm_server.py"), "--port", str(llm_port),
+        "--latency-ms", str(args.llm_latency_ms), "--token-ms", str(token_ms),
+        "--rate-limit-every", str(args.llm_429_every),
+    ])
+    wait_for(llm_url, stub)
+
+    backends = {"groq": "groq:llama-3.3-70b-versatile", "ollama": "ollama:llama3"}
+    env = dict(
+        os.environ,
+        GROQ_BASE_URL=llm_url, GROQ_API_KEY="stub", OLLAMA_BASE_URL=llm_url,
+        LLM_BACKENDS=backends[args.llm_backend], PYTHONPATH=BACKEND_DIR,
+    )
+    # The backend keeps its Chroma data, uploads and job DB in its working directory
+    app = subprocess.Popen(
+        [sys.executable, os.path.abspath(__file__), "--serve", str(app_port), "--embedder", args.embedder],
+        cwd=workdir, env=env,
+    )
+    base_url = f"http://127.0.0.1:{app_port}"
+    wait_for(base_url + "/", app)
+    return base_url, [app, stub]
+
+
+def serve(port: int, embedder: str):
+    """
+    Child process: the app under one uvicorn worker, optionally with the hash stand-in embedder.
+    """
+    import uvicorn
+    if embedder != "torch":
+        from e2e_suite import make_embedder
+        from app.services.registry import registry
+        registry.register_embedder(make_embedder(embedder))
+    from app.main import app
+    uvicorn.run(app, host="127.0.0.1", port=port, log_level="warning")
+
+
+class EndpointStats:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.error_samples = defaultdict(list)
+
+    def record(self, endpoint: str, seconds: float, error: str = None):
+        self.latencies[endpoint].append(seconds)
+        if error:
+            self.errors[endpoint] += 1
+            if len(self.error_samples[endpoint]) < 3:
+                self.error_samples[endpoint].append(error[:200])
+
+    def report(self, elapsed: float) -> dict:
+        out = {}
+        for endpoint in ENDPOINTS:
+            latencies = self.latencies.get(endpoint)
+            if not latencies:
+                continue
+            ms = np.array(latencies) * 1000
+            out[endpoint] = {
+                "requests": len(latencies),
+                "errors": self.errors[endpoint],
+                "error_rate": round(self.errors[endpoint] / len(latencies), 4),
+                "req_per_s": round(len(latencies) / elapsed, 2),
+                "p50_ms": round(float(np.percentile(ms, 50)), 1),
+                "p95_ms": round(float(np.percentile(ms, 95)), 1),
+                "p99_ms": round(float(np.percentile(ms, 99)), 1),
+                "max_ms": round(float(ms.max()), 1),
+                "error_samples": self.error_samples[endpoint],
+            }
+        return out
+
+
+def body_error(response: httpx.Response):
+    """
+    Why a response counts as failed, or None. The app reports some failures as
+    200s with an "error" field, or "error" items in "results".
+    """
+    if not response.is_success:
+        return f"HTTP {response.status_code}: {response.text}"
+    body = response.json()
+    if "error" in body:
+        return str(body["error"])
+    for item in body.get("results", []):
+        if isinstance(item, dict) and "error" in item:
+            return str(item["error"])
+    if str(body.get("script", "")).startswith("# ERROR"):
+        return body["script"]
+    return None
+
+
+async def timed(stats: EndpointStats, endpoint: str, request):
+    start = time.perf_counter()
+    try:
+        response = await request
+        error = body_error(response)
+    except Exception as e:
+        response, error = None, f"{type(e).__name__}: {e}"
+    stats.record(endpoint, time.perf_counter() - start, error)
+    return response if error is None else None
+
+
+async def upload(client: httpx.AsyncClient, stats: EndpointStats, session_id: str, files: list) -> bool:
+    headers = {"X-Session-ID": session_id}
+    start = time.perf_counter()
+    response = await timed(stats, "/upload-documents", client.post("/upload-documents", files=files, headers=headers))
+    if response is None:
+        return False
+    job_id = response.json()["job_id"]
+    while True:
+        job = (await client.get(f"/jobs/{job_id}", headers=headers)).json()
+        if job["status"] in ("completed", "failed"):
+            stats.record("kb-ready", time.perf_counter() - start, job.get("error") if job["status"] == "failed" else None)
+            return job["status"] == "completed"
+        await asyncio.sleep(0.25)
+
+
+async def virtual_user(client, stats: EndpointStats, user: int, files: list, deadline: float, args):
+    await asyncio.sleep(user * args.ramp_s / max(1, args.users))
+    session_id = f"load-{user}-{uuid.uuid4()}"
+    if not await upload(client, stats, session_id, files):
+        return
+    headers = {"X-Session-ID": session_id}
+    if not args.use_cache:
+        headers["X-Cache-Bypass"] = "1"
+    i = 0
+    while time.monotonic() < deadline:
+        query = f"{QUERIES[(user + i) % len(QUERIES)]} (user {user}, run {i})"
+        response = await timed(stats, "/generate-testcases", client.post("/generate-testcases", data={"query": query}, headers=headers))
+        results = response.json().get("results") if response is not None else None
+        test_case = results[0] if results else FALLBACK_TEST_CASE
+        await timed(stats, "/generate-selenium-script", client.post(
+            "/generate-selenium-script", data={"testcase_json": json.dumps(test_case)}, headers=headers,
+        ))
+        i += 1
+        if args.think_ms:
+            await asyncio.sleep(args.think_ms / 1000)
+
+
+async def run_load(base_url: str, args) -> dict:
+    files = []
+    for name in sorted(os.listdir(ASSETS_DIR)):
+        with open(os.path.join(ASSETS_DIR, name), "rb") as f:
+            files.append(("files", (name, f.read())))
+
+    stats = EndpointStats()
+    client_lag = LoopLagMonitor(name="load-client", interval_ms=50, warn_ms=float("inf"))
+    limits = httpx.Limits(max_connections=args.users * 2, max_keepalive_connections=args.users * 2)
+    async with httpx.AsyncClient(base_url=base_url, timeout=args.timeout, limits=limits) as client:
+        client_lag.start()
+        start = time.monotonic()
+        deadline = start + args.ramp_s + args.duration
+        await asyncio.gather(*[virtual_user(client, stats, u, files, deadline, args) for u in range(args.users)])
+        elapsed = time.monotonic() - start
+        await client_lag.stop()
+
+        server = {}
+        for name, path in (("loop_lag", "/admin/loop-lag"), ("llm_backends", "/admin/llm-backends")):
+            try:
+                server[name] = (await client.get(path)).json()
+            except Exception as e:
+                server[name] = {"error": str(e)}
+    return {"elapsed_s": round(elapsed, 2), "endpoints": stats.report(elapsed), "server": server, "client_loop_lag": client_lag.stats()}
+
+
+def print_report(report: dict):
+    print(f"\n{'endpoint':<28} {'requests':>8} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7} {'err %':>6}")
+    for endpoint, r in report["endpoints"].items():
+        print(f"{endpoint:<28} {r['requests']:>8} {r['req_per_s']:>8.2f} {r['p50_ms']:>9.1f} {r['p95_ms']:>9.1f} "
+              f"{r['p99_ms']:>9.1f} {r['errors']:>7} {r['error_rate']:>6.1%}")
+        for sample in r["error_samples"]:
+            print(f"    e.g. {sample}")
+    for side, lag in (("backend", report["server"].get("loop_lag", {})), ("load client", report["client_loop_lag"])):
+        if "p99_ms" in lag:
+            print(f"event-loop lag ({side}): p50 <= {lag['p50_ms']} ms, p99 <= {lag['p99_ms']} ms, "
+                  f"max {lag['max_ms']:.0f} ms, {lag.get('stalls', 0)} stalls over {lag['samples']} samples")
+    if report["client_loop_lag"].get("p99_ms", 0) >= 50:
+        print("⚠️ The load generator's own loop is lagging: results are limited by the client, not the backend.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=20, help="concurrent virtual users (one session ID each)")
+    parser.add_argument("--duration", type=float, default=30, help="seconds of generate traffic after the ramp")
+    parser.add_argument("--ramp-s", type=float, default=5, help="users start evenly over this many seconds")
+    parser.add_argument("--think-ms", type=float, default=0, help="pause between a user's iterations")
+    parser.add_argument("--timeout", type=float, default=120, help="per-request timeout")
+    parser.add_argument("--use-cache", action="store_true", help="allow LLM cache hits (default: bypass)")
+    parser.add_argument("--target", help="base URL of a running backend (skips starting the mock LLM and app)")
+    parser.add_argument("--embedder", choices=("torch", "onnx", "hash"), default="torch")
+    parser.add_argument("--llm-backend", choices=("groq", "ollama"), default="groq", help="protocol the app uses to reach the mock")
+    parser.add_argument("--llm-latency-ms", type=float, default=300, help="mock LLM delay before answering")
+    parser.add_argument("--tokens-per-s", type=float, default=0, help="mock LLM output rate (0 = instant)")
+    parser.add_argument("--llm-429-every", type=int, default=0, help="mock answers every Nth request with a 429")
+    parser.add_argument("--out", help="write the report as JSON")
+    parser.add_argument("--serve", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.serve, args.embedder)
+        return
+
+    processes, workdir = [], None
+    try:
+        if args.target:
+            base_url = args.target.rstrip("/")
+        else:
+            workdir = tempfile.mkdtemp(prefix="bench_load_")
+            base_url, processes = start_processes(args, workdir)
+        print(f"{args.users} users against {base_url} for {args.ramp_s:.0f}s ramp + {args.duration:.0f}s")
+        report = asyncio.run(run_load(base_url, args))
+    finally:
+        for process in processes:
+            process.terminate()
+            process.wait(timeout=30)
+        if workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    report["config"] = {k: v for k, v in vars(args).items() if k != "serve"}
+    print_report(report)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
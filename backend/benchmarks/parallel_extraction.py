@@ -0,0 +1,68 @@
+"""
+Wall-clock benchmark for multi-file extraction: one file at a time in-process
+(the old upload loop) versus the shared extraction process pool.
+
+Generates synthetic multi-page PDFs with PyMuPDF so the run is reproducible.
+
+Usage (from backend/):
+    python benchmarks/parallel_extraction.py --files 20 --pages 60
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fitz  # PyMuPDF
+
+from app.services.file_ingestion import detect_file_type, extract_to_file
+from app.utils.concurrency import EXTRACT_PROCESSES, get_process_pool, shutdown_pools
+
+
+def make_pdf(path: str, pages: int):
+    doc = fitz.open()
+    line = "The discount code SAVE15 applies a 15% discount to the cart subtotal. "
+    for p in range(pages):
+        page = doc.new_page()
+        page.insert_textbox(fitz.Rect(36, 36, 576, 806), f"Page {p}\n" + line * 40, fontsize=8)
+    doc.save(path)
+    doc.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=20)
+    parser.add_argument("--pages", type=int, default=60)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench_extract_")
+    paths = [os.path.join(workdir, f"spec_{i}.pdf") for i in range(args.files)]
+    for path in paths:
+        make_pdf(path, args.pages)
+    total_mb = sum(os.path.getsize(p) for p in paths) / 1024 / 1024
+
+    start = time.perf_counter()
+    for path in paths:
+        extract_to_file(path, path + ".seq.txt")
+    sequential = time.perf_counter() - start
+
+    pool = get_process_pool()
+    # Warm the workers so process spawn and imports are not billed to extraction
+    list(pool.map(detect_file_type, ["warmup.pdf"] * EXTRACT_PROCESSES * 2))
+    start = time.perf_counter()
+    futures = [pool.submit(extract_to_file, path, path + ".par.txt") for path in paths]
+    results = [f.result() for f in futures]
+    parallel = time.perf_counter() - start
+    shutdown_pools()
+
+    assert [r["text_path"] for r in results] == [p + ".par.txt" for p in paths]
+    print(f"{args.files} PDFs x {args.pages} pages ({total_mb:.1f} MB), {EXTRACT_PROCESSES} processes")
+    print(f"sequential: {sequential:.2f}s  ({total_mb / sequential:.1f} MB/s)")
+    print(f"process pool: {parallel:.2f}s  ({total_mb / parallel:.1f} MB/s)")
+    print(f"speedup: {sequential / parallel:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Query-embedding throughput under concurrent load: one embed_texts([query]) call
+per request on the embed pool (the old path) versus the BatchingEmbedder
+micro-batcher, at increasing numbers of concurrent callers.
+
+Uses the real model by default; --synthetic swaps in a stand-in whose cost is a
+fixed per-call overhead plus a per-text cost, to show the effect without torch.
+
+Usage (from backend/):
+    python benchmarks/query_batching.py --concurrency 1 8 32 128
+    python benchmarks/query_batching.py --synthetic --requests 2000 --max-wait-ms 2
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from app.services.batching_embedder import BatchingEmbedder
+from app.utils.concurrency import run_in_pool, shutdown_pools
+
+WORDS = "apply discount code save15 express shipping cost invalid email phone payment cart".split()
+
+
+class SyntheticEmbedder:
+    """Costs call_ms per call plus text_ms per text, like a batched encoder."""
+
+    def __init__(self, call_ms: float, text_ms: float):
+        self.call_s = call_ms / 1000
+        self.text_s = text_ms / 1000
+
+    def embed_texts(self, texts):
+        time.sleep(self.call_s + self.text_s * len(texts))
+        return np.ones((len(texts), 384), dtype=np.float32)
+
+
+async def drive(embed, queries, concurrency: int) -> list:
+    latencies = []
+    pending = iter(queries)
+
+    async def client():
+        for query in pending:
+            start = time.perf_counter()
+            await embed(query)
+            latencies.append(time.perf_counter() - start)
+
+    await asyncio.gather(*[client() for _ in range(concurrency)])
+    return latencies
+
+
+def run(mode: str, embedder, queries, concurrency: int, args) -> dict:
+    async def main():
+        if mode == "batched":
+            batcher = BatchingEmbedder(embedder, max_batch_size=args.max_batch, max_wait_ms=args.max_wait_ms)
+            embed = lambda q: batcher.aembed([q])
+        else:
+            batcher = None
+            embed = lambda q: run_in_pool("embed", embedder.embed_texts, [q])
+        start = time.perf_counter()
+        latencies = await drive(embed, queries, concurrency)
+        elapsed = time.perf_counter() - start
+        if batcher is not None:
+            await batcher.close()
+        return elapsed, latencies, batcher.stats() if batcher else None
+
+    elapsed, latencies, stats = asyncio.run(main())
+    latencies_ms = np.array(latencies) * 1000
+    return {
+        "qps": len(queries) / elapsed,
+        "p50_ms": float(np.percentile(latencies_ms, 50)),
+        "p95_ms": float(np.percentile(latencies_ms, 95)),
+        "mean_batch": stats["batch_size"]["mean"] if stats else 1.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32, 128])
+    parser.add_argument("--max-batch", type=int, default=32)
+    parser.add_argument("--max-wait-ms", type=float, default=5)
+    parser.add_argument("--synthetic", action="store_true")
+    parser.add_argument("--call-ms", type=float, default=8, help="synthetic per-call cost")
+    parser.add_argument("--text-ms", type=float, default=0.5, help="synthetic per-text cost")
+    args = parser.parse_args()
+
+    if args.synthetic:
+        embedder = SyntheticEmbedder(args.call_ms, args.text_ms)
+    else:
+        from app.services.embeddings import EmbeddingService
+        embedder = EmbeddingService()
+        embedder.embed_texts(["warm up"])
+    rng = np.random.default_rng(0)
+    # Distinct queries, so nothing is served from a cache
+    queries = [" ".join(rng.choice(WORDS, size=6)) + f" {i}" for i in range(args.requests)]
+
+    print(f"{args.requests} queries, batch <= {args.max_batch}, max wait {args.max_wait_ms} ms")
+    print(f"{'mode':<8} {'callers':>7} {'q/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'batch':>6}")
+    for concurrency in args.concurrency:
+        for mode in ("single", "batched"):
+            r = run(mode, embedder, queries, concurrency, args)
+            print(f"{mode:<8} {concurrency:>7} {r['qps']:>8.1f} {r['p50_ms']:>8.2f} {r['p95_ms']:>8.2f} {r['mean_batch']:>6.1f}")
+    shutdown_pools()
+
+
+if __name__ == "__main__":
+    main()
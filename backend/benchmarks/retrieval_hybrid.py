@@ -0,0 +1,136 @@
+"""
+Retrieval quality and latency: dense vector search alone versus hybrid
+(dense + BM25 fused with reciprocal-rank fusion), optionally followed by
+cross-encoder reranking of the top N candidates (--rerank N ...).
+
+Indexes project_assets/ (specs, UI guide, API spec, checkout page, PDF) into a
+temporary KB, then runs labeled queries. A query counts as a hit@k if any of the
+top-k chunks contains its expected text; most queries name exact identifiers
+(coupon codes, endpoint and field names, messages) where dense search is weakest.
+
+Usage (from backend/):
+    python benchmarks/retrieval_hybrid.py
+    python benchmarks/retrieval_hybrid.py --k 3 --repeat 20 --chunk-size 400
+    python benchmarks/retrieval_hybrid.py --k 3 --rerank 10 20 40
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import chromadb
+import numpy as np
+
+from app.services.embeddings import EmbeddingService
+from app.services.file_ingestion import detect_file_type, iter_local_file_text
+from app.services.kb_builder import KnowledgeBaseBuilder
+from app.services.kb_manifest import KBManifest
+from app.services.lexical_index import LexicalIndex
+from app.services.rag_service import RAGService
+from app.services.reranker import Reranker
+from app.services.vector_db import VectorDB
+
+ASSETS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "project_assets")
+SESSION = "bench-session"
+
+# (query, text the retrieved context must contain)
+QUERIES = [
+    ("What does the SAVE15 code do?", "SAVE15"),
+    ("FREESHIP coupon effect", "FREESHIP"),
+    ("Which endpoint applies a coupon?", "apply_coupon"),
+    ("discount_code field in the order request", "discount_code"),
+    ("Error message for a wrong discount code", "Invalid Code"),
+    ("How much does express shipping cost?", "$10"),
+    ("Phone number validation rule", "10 digits"),
+    ("Email format regex", "@\\S+"),
+    ("Colour of inline error messages", "#FF0000"),
+    ("Message shown after payment succeeds", "Payment Successful"),
+    ("How is the final total calculated?", "final_total"),
+    ("Minimum item quantity in the cart", "Minimum quantity"),
+]
+
+
+def build_kb(workdir: str, embedder: EmbeddingService, args) -> KnowledgeBaseBuilder:
+    vdb = VectorDB(persist_dir=workdir, client=chromadb.PersistentClient(path=workdir))
+    builder = KnowledgeBaseBuilder(
+        embedder=embedder,
+        vector_db=vdb,
+        manifest=KBManifest(os.path.join(workdir, "kb_manifest.db")),
+        lexical_index=LexicalIndex(os.path.join(workdir, "lexical")),
+    )
+    docs = []
+    for name in sorted(os.listdir(ASSETS_DIR)):
+        path = os.path.join(ASSETS_DIR, name)
+        kind = detect_file_type(name)
+        # HTML is indexed raw, as the upload endpoint does
+        docs.append({"source": name, "type": kind, "pieces": iter_local_file_text(path, raw=kind == "html")})
+    start = time.perf_counter()
+    result = builder.build_from_stream(docs, SESSION, chunk_size=args.chunk_size, chunk_overlap=args.chunk_size // 5)
+    print(f"Indexed {len(docs)} files into {vdb.count()} chunks in {time.perf_counter() - start:.1f}s ({result['status']})")
+    return builder
+
+
+def run_mode(mode: str, builder: KnowledgeBaseBuilder, args, reranker=None, candidates: int = 0) -> dict:
+    # No LLM call is made: only retrieval (and reranking) is timed
+    rag = RAGService(
+        embedder=builder.embedder,
+        vector_db=builder.vdb,
+        llm=object(),
+        lexical_index=builder.lexical,
+        retrieval_mode=mode,
+        reranker=reranker,
+        rerank_candidates=candidates,
+    )
+    hits, latencies = 0, []
+    for query, expected in QUERIES:
+        results, _ = rag._select(query, SESSION, args.k)
+        hits += any(expected.lower() in (r["document"] or "").lower() for r in results)
+        for _ in range(args.repeat):
+            # Timed runs hit the score cache, so clear it to time the cross-encoder
+            if reranker is not None:
+                reranker._scores.clear()
+            start = time.perf_counter()
+            rag._select(query, SESSION, args.k)
+            latencies.append(time.perf_counter() - start)
+    latencies_ms = np.array(latencies) * 1000
+    return {
+        "mode": f"{mode}+rr{candidates}" if reranker is not None else mode,
+        "recall": hits / len(QUERIES),
+        "p50_ms": float(np.percentile(latencies_ms, 50)),
+        "p95_ms": float(np.percentile(latencies_ms, 95)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--repeat", type=int, default=10, help="timed runs per query")
+    parser.add_argument("--chunk-size", type=int, default=800)
+    parser.add_argument("--model", default="all-MiniLM-L6-v2")
+    parser.add_argument("--rerank", type=int, nargs="*", default=[], metavar="N", help="candidate counts to rerank")
+    parser.add_argument("--rerank-model", default="cross-encoder/ms-marco-MiniLM-L-6-v2")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench_hybrid_")
+    try:
+        # No embedding cache, so indexing time is real
+        builder = build_kb(workdir, EmbeddingService(model_name=args.model), args)
+        print(f"{len(QUERIES)} labeled queries, k={args.k}")
+        print(f"{'mode':<14} {'recall@k':>9} {'p50 ms':>8} {'p95 ms':>8}")
+        runs = [("dense", None, 0), ("hybrid", None, 0)]
+        if args.rerank:
+            reranker = Reranker(model_name=args.rerank_model)
+            runs += [(mode, reranker, n) for n in args.rerank for mode in ("dense", "hybrid")]
+        for mode, reranker, candidates in runs:
+            r = run_mode(mode, builder, args, reranker, candidates)
+            print(f"{r['mode']:<14} {r['recall']:>9.3f} {r['p50_ms']:>8.2f} {r['p95_ms']:>8.2f}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,245 @@
+"""
+Deterministic local stand-in for the LLM backends, so generation can be
+benchmarked without network, API keys or a GPU. It speaks both protocols the
+app uses:
+
+    POST /api/chat                    Ollama (JSON or NDJSON stream)
+    POST /openai/v1/chat/completions  Groq / OpenAI (JSON or SSE stream)
+
+The answer depends only on the prompt: a JSON array of test cases for the
+test-case prompt, a Selenium script for the script prompt. Latency is a fixed
+per-request delay plus a per-output-token delay.
+
+Point the app at it with:
+    OLLAMA_BASE_URL=http://127.0.0.1:<port>
+    GROQ_BASE_URL=http://127.0.0.1:<port> GROQ_API_KEY=stub
+
+Usage (from backend/):
+    python benchmarks/stub_llm_server.py --port 11434 --latency-ms 200 --token-ms 2
+"""
+import argparse
+import hashlib
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+
+
+def _prompt_parts(messages: List[Dict[str, str]]) -> Tuple[str, str]:
+    system = "\n".join(m.get("content", "") for m in messages if m.get("role") == "system")
+    user = "\n".join(m.get("content", "") for m in messages if m.get("role") == "user")
+    return system, user
+
+
+def stub_answer(system_prompt: str, user_prompt: str) -> str:
+    """
+    Deterministic answer shaped like what the real model returns for each prompt.
+    """
+    digest = hashlib.sha256((system_prompt + "\x00" + user_prompt).encode("utf-8")).hexdigest()
+    if "Selenium" in system_prompt:
+        ids = re.findall(r'id="([^"]+)"', user_prompt)[:3] or ["submit"]
+        lines = [
+            "from selenium import webdriver",
+            "from selenium.webdriver.common.by import By",
+            "from selenium.webdriver.support.ui import WebDriverWait",
+            "from selenium.webdriver.support import expected_conditions as EC",
+            "",
+            f"# stub {digest[:12]}",
+            "driver = webdriver.Chrome()",
+            "wait = WebDriverWait(driver, 10)",
+        ]
+        lines += [f'wait.until(EC.element_to_be_clickable((By.ID, "{element_id}"))).click()' for element_id in ids]
+        lines.append("driver.quit()")
+        return "\n".join(lines)
+
+    query = re.search(r'User Query: "(.*)"', user_prompt)
+    sources = re.findall(r"[\w\-]+\.(?:md|txt|json|html|pdf)", user_prompt) or ["project_specs.md"]
+    feature = (query.group(1) if query else "Checkout")[:60]
+    cases = [
+        {
+            "Test_ID": f"TC-{int(digest[i * 4:i * 4 + 4], 16) % 1000:03d}",
+            "Feature": feature,
+            "Test_Scenario": f"Scenario {i + 1} for {feature}",
+            "Expected_Result": f"Outcome {digest[i * 8:i * 8 + 8]}",
+            "Grounded_In": sources[i % len(sources)],
+        }
+        for i in range(3)
+    ]
+    return json.dumps(cases, indent=2)
+
+
+def _tokens(text: str) -> List[str]:
+    # Whitespace-preserving word pieces, so joined stream deltas equal the full answer
+    return re.findall(r"\S+\s*|\s+", text)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real backends
+    server: "StubLLMServer"
+
+    def log_message(self, *args):
+        pass
+
+    def _read_json(self) -> dict:
+        return json.loads(self.rfile.read(int(self.headers.get("content-length", 0))) or b"{}")
+
+    def _send(self, status: int, body: bytes, content_type: str = "application/json", headers: Optional[Dict[str, str]] = None):
+        self.send_response(status)
+        self.send_header("content-type", content_type)
+        self.send_header("content-length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _start_stream(self, content_type: str):
+        self.send_response(200)
+        self.send_header("content-type", content_type)
+        self.send_header("transfer-encoding", "chunked")
+        self.end_headers()
+
+    def _chunk(self, data: bytes):
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+    def _end_stream(self):
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+    def do_POST(self):
+        payload = self._read_json()
+        if self.path not in ("/api/chat", "/openai/v1/chat/completions"):
+            self._send(404, b'{"error": "not found"}')
+            return
+        throttled = self.server.admit()
+        if throttled:
+            self._send(429, b'{"error": {"message": "rate limited (stub)"}}', headers={"retry-after": str(throttled)})
+            return
+
+        system, user = _prompt_parts(payload.get("messages", []))
+        answer = stub_answer(system, user)
+        pieces = _tokens(answer)
+        prompt_tokens = len(_tokens(system + user))
+        time.sleep(self.server.latency_s)
+        if self.path == "/api/chat":
+            self._ollama(payload, answer, pieces, prompt_tokens)
+        else:
+            self._openai(payload, answer, pieces, prompt_tokens)
+
+    def _ollama(self, payload: dict, answer: str, pieces: List[str], prompt_tokens: int):
+        model = payload.get("model", "stub")
+        if not payload.get("stream"):
+            time.sleep(self.server.token_s * len(pieces))
+            body = {"model": model, "message": {"role": "assistant", "content": answer}, "done": True,
+                    "prompt_eval_count": prompt_tokens, "eval_count": len(pieces)}
+            self._send(200, json.dumps(body).encode())
+            return
+        self._start_stream("application/x-ndjson")
+        for piece in pieces:
+            time.sleep(self.server.token_s)
+            self._chunk(json.dumps({"model": model, "message": {"role": "assistant", "content": piece}, "done": False}).encode() + b"\n")
+        final = {"model": model, "message": {"role": "assistant", "content": ""}, "done": True,
+                 "prompt_eval_count": prompt_tokens, "eval_count": len(pieces)}
+        self._chunk(json.dumps(final).encode() + b"\n")
+        self._end_stream()
+
+    def _openai(self, payload: dict, answer: str, pieces: List[str], prompt_tokens: int):
+        model = payload.get("model", "stub")
+        base = {"id": "chatcmpl-stub", "created": int(time.time()), "model": model}
+        if not payload.get("stream"):
+            time.sleep(self.server.token_s * len(pieces))
+            body = dict(
+                base,
+                object="chat.completion",
+                choices=[{"index": 0, "message": {"role": "assistant", "content": answer}, "finish_reason": "stop"}],
+                usage={"prompt_tokens": prompt_tokens, "completion_tokens": len(pieces), "total_tokens": prompt_tokens + len(pieces)},
+            )
+            self._send(200, json.dumps(body).encode())
+            return
+        self._start_stream("text/event-stream")
+        for piece in pieces:
+            time.sleep(self.server.token_s)
+            chunk = dict(base, object="chat.completion.chunk",
+                         choices=[{"index": 0, "delta": {"content": piece}, "finish_reason": None}])
+            self._chunk(f"data: {json.dumps(chunk)}\n\n".encode())
+        done = dict(base, object="chat.completion.chunk", choices=[{"index": 0, "delta": {}, "finish_reason": "stop"}])
+        self._chunk(f"data: {json.dumps(done)}\n\n".encode())
+        self._chunk(b"data: [DONE]\n\n")
+        self._end_stream()
+
+
+class StubLLMServer(ThreadingHTTPServer):
+    """
+    The stand-in server, run on a background thread. rate_limit_every=N answers
+    every Nth request with a 429 (Retry-After: retry_after seconds).
+    """
+
+    daemon_threads = True
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency_ms: float = 0, token_ms: float = 0,
+                 rate_limit_every: int = 0, retry_after: int = 1):
+        super().__init__((host, port), _Handler)
+        self.latency_s = latency_ms / 1000
+        self.token_s = token_ms / 1000
+        self.rate_limit_every = rate_limit_every
+        self.retry_after = retry_after
+        self.requests = 0
+        self.rate_limited = 0
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def admit(self) -> int:
+        """
+        Counts a request; returns the Retry-After to send if it should be throttled, else 0.
+        """
+        with self._lock:
+            self.requests += 1
+            if self.rate_limit_every and self.requests % self.rate_limit_every == 0:
+                self.rate_limited += 1
+                return self.retry_after
+            return 0
+
+    def start(self) -> "StubLLMServer":
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11434)
+    parser.add_argument("--latency-ms", type=float, default=0, help="fixed delay per request")
+    parser.add_argument("--token-ms", type=float, default=0, help="delay per output token")
+    parser.add_argument("--rate-limit-every", type=int, default=0, help="answer every Nth request with a 429")
+    args = parser.parse_args()
+
+    server = StubLLMServer(args.host, args.port, args.latency_ms, args.token_ms, args.rate_limit_every)
+    print(f"Stub LLM listening on {server.url} (Ollama /api/chat, Groq /openai/v1/chat/completions)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
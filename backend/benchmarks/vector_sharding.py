@@ -0,0 +1,104 @@
+"""
+Query latency and recall for the VectorDB shard modes:
+one filtered collection ("single") versus a collection per session ("session")
+versus sessions hashed into buckets ("bucket").
+
+Vectors are random unit float32 rows; recall@k is measured against an exact
+brute-force search over the querying session's own vectors.
+
+Usage (from backend/):
+    python benchmarks/vector_sharding.py --sessions 1000 --chunks 20
+    python benchmarks/vector_sharding.py --sessions 10000 --chunks 10 --modes single bucket session
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import chromadb
+import numpy as np
+
+from app.services.vector_db import VectorDB
+
+
+def unit_rows(rng, n: int, dim: int) -> np.ndarray:
+    rows = rng.standard_normal((n, dim)).astype(np.float32)
+    rows /= np.linalg.norm(rows, axis=1, keepdims=True)
+    return rows
+
+
+def run_mode(mode: str, vectors: np.ndarray, args) -> dict:
+    workdir = tempfile.mkdtemp(prefix=f"bench_shard_{mode}_")
+    try:
+        vdb = VectorDB(
+            persist_dir=workdir,
+            client=chromadb.PersistentClient(path=workdir),
+            shard_mode=mode,
+            shard_buckets=args.buckets,
+        )
+
+        start = time.perf_counter()
+        for s in range(args.sessions):
+            sid = f"session-{s}"
+            rows = vectors[s * args.chunks:(s + 1) * args.chunks]
+            vdb.upsert_documents(
+                ids=[f"{sid}-{i}" for i in range(args.chunks)],
+                texts=[f"chunk {i} of {sid}" for i in range(args.chunks)],
+                embeddings=rows,
+                metadatas=[{"session_id": sid, "chunk_index": i} for i in range(args.chunks)],
+            )
+        ingest = time.perf_counter() - start
+
+        rng = np.random.default_rng(1)
+        queries = unit_rows(rng, args.queries, vectors.shape[1])
+        sessions = rng.integers(0, args.sessions, size=args.queries)
+        result = {"mode": mode, "ingest_s": ingest}
+        # First pass touches each queried shard cold; the second measures steady state
+        for phase in ("cold", "warm"):
+            latencies, recalls = [], []
+            for q, s in zip(queries, sessions):
+                start = time.perf_counter()
+                hits = vdb.query(q, n_results=args.k, session_id=f"session-{s}")
+                latencies.append(time.perf_counter() - start)
+
+                own = vectors[s * args.chunks:(s + 1) * args.chunks]
+                exact = {f"session-{s}-{i}" for i in np.argsort(-(own @ q))[:args.k]}
+                recalls.append(len(exact & {h["id"] for h in hits}) / len(exact))
+
+            latencies_ms = np.array(latencies) * 1000
+            result[f"{phase}_p50_ms"] = float(np.percentile(latencies_ms, 50))
+            result[f"{phase}_p95_ms"] = float(np.percentile(latencies_ms, 95))
+            result["recall"] = float(np.mean(recalls))
+        return result
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=1000)
+    parser.add_argument("--chunks", type=int, default=20, help="chunks per session")
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--buckets", type=int, default=64)
+    parser.add_argument("--modes", nargs="+", default=["single", "bucket", "session"])
+    args = parser.parse_args()
+
+    vectors = unit_rows(np.random.default_rng(0), args.sessions * args.chunks, args.dim)
+    print(f"{args.sessions} sessions x {args.chunks} chunks ({len(vectors)} vectors, dim {args.dim}), k={args.k}")
+    print(f"{'mode':<8} {'ingest s':>9} {'cold p50':>9} {'cold p95':>9} {'warm p50':>9} {'warm p95':>9} {'recall@k':>9}")
+    for mode in args.modes:
+        r = run_mode(mode, vectors, args)
+        print(
+            f"{r['mode']:<8} {r['ingest_s']:>9.1f} {r['cold_p50_ms']:>9.2f} {r['cold_p95_ms']:>9.2f} "
+            f"{r['warm_p50_ms']:>9.2f} {r['warm_p95_ms']:>9.2f} {r['recall']:>9.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
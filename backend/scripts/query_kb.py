@@ -2,14 +2,13 @@
 import sys, os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from app.services.embeddings import EmbeddingService
-from app.services.vector_db import VectorDB
+from app.services.registry import get_embedder, get_vector_db
 
-embed = EmbeddingService()
-vdb = VectorDB(persist_dir="./chroma_db")
+embed = get_embedder()
+vdb = get_vector_db(persist_dir="./chroma_db")
 
 query = "discount code SAVE15 applies 15% discount"
-q_emb = embed.embed_texts([query])[0].tolist()
+q_emb = embed.embed_texts([query])[0]
 results = vdb.query(q_emb, n_results=5)
 for r in results:
     print("----")
@@ -0,0 +1,40 @@
+import asyncio
+import json
+import time
+import numpy as np
+from app.services.rag_service import RAGService
+
+
+class FakeEmbedder:
+    def embed_texts(self, texts):
+        return np.ones((len(texts), 4), dtype="float32")
+
+
+class FakeVectorDB:
+    def query(self, query_embedding, n_results=5, session_id=None):
+        return [{"id": "1", "document": "Code SAVE15 gives 15% off.", "metadata": {"source": "specs.md"}, "distance": 0.1}]
+
+
+class SlowLLM:
+    def __init__(self, delay):
+        self.delay = delay
+
+    async def agenerate_response(self, system_prompt, user_content, use_cache=True):
+        await asyncio.sleep(self.delay)
+        return json.dumps([{"Test_ID": "TC-001", "Grounded_In": "checkout__0f8fad5b-d9cb-469f-a165-70867728950e.html"}])
+
+
+def test_agenerate_test_cases_runs_concurrently():
+    rag = RAGService(embedder=FakeEmbedder(), vector_db=FakeVectorDB(), llm=SlowLLM(0.3))
+
+    async def run_many():
+        return await asyncio.gather(*[rag.agenerate_test_cases("discount", session_id="s1") for _ in range(8)])
+
+    start = time.perf_counter()
+    results = asyncio.run(run_many())
+    elapsed = time.perf_counter() - start
+
+    assert all(r[0]["Test_ID"] == "TC-001" for r in results)
+    assert results[0][0]["Grounded_In"] == "checkout.html"
+    # Eight 0.3s LLM calls must overlap instead of serializing (~2.4s)
+    assert elapsed < 1.5
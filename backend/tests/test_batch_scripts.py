@@ -0,0 +1,71 @@
+import asyncio
+import threading
+import time
+from app.services import page_index
+from app.services.llm_provider import LLMProvider, LLMRateLimited
+from app.services.script_generator import ScriptGeneratorService
+from app.utils.parser_utils import build_selector_index
+
+SESSION = "0f8fad5b-d9cb-469f-a165-70867728950e"
+
+
+class SlowLLM:
+    def __init__(self, delay):
+        self.delay = delay
+
+    async def agenerate_response(self, system_prompt, user_content, use_cache=True):
+        await asyncio.sleep(self.delay)
+        return "```python\nprint('ok')\n```"
+
+
+class FlakyProvider(LLMProvider):
+    def __init__(self, failures):
+        super().__init__(provider="ollama")
+        self.failures = failures
+        self.calls = 0
+
+    async def _acomplete(self, system_prompt, user_content):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise LLMRateLimited("429 Too Many Requests", retry_after=0)
+        return "print('ok')"
+
+
+def test_batch_parses_html_once_and_fans_out(tmp_path, monkeypatch):
+    (tmp_path/f"checkout__{SESSION}.html").write_text("<input id='code'><button id='apply'>Apply</button>")
+    service = ScriptGeneratorService(upload_dir=str(tmp_path), vector_db=object(), llm=SlowLLM(0.3))
+    parses = []
+    monkeypatch.setattr(page_index, "build_selector_index", lambda html: parses.append(html) or build_selector_index(html))
+
+    async def run():
+        return [item async for item in service.agenerate_scripts([{"Test_ID": f"TC-{i}"} for i in range(6)], SESSION)]
+
+    start = time.perf_counter()
+    results = asyncio.run(run())
+    elapsed = time.perf_counter() - start
+
+    assert sorted(i for i, _, _ in results) == list(range(6))
+    assert all(script == "print('ok')" for _, script, _ in results)
+    assert len(parses) == 1
+    # Six 0.3s calls overlap: ~max(call), not ~sum(call)
+    assert elapsed < 1.2
+
+
+def test_batch_builds_prompts_off_the_event_loop(tmp_path):
+    (tmp_path/f"checkout__{SESSION}.html").write_text("<input id='code'>")
+    service = ScriptGeneratorService(upload_dir=str(tmp_path), vector_db=object(), llm=SlowLLM(0))
+    build_prompt = service._build_prompt
+    threads = []
+    service._build_prompt = lambda *args: threads.append(threading.current_thread()) or build_prompt(*args)
+
+    async def run():
+        return [item async for item in service.agenerate_scripts([{"Test_ID": f"TC-{i}"} for i in range(3)], SESSION)]
+
+    assert len(asyncio.run(run())) == 3
+    assert len(threads) == 3 and threading.main_thread() not in threads
+
+
+def test_rate_limited_calls_are_retried():
+    llm = FlakyProvider(failures=2)
+    assert asyncio.run(llm.agenerate_response("sys", "q")) == "print('ok')"
+    assert llm.calls == 3
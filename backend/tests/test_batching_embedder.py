@@ -0,0 +1,78 @@
+import asyncio
+import threading
+import time
+import numpy as np
+import pytest
+from app.services.batching_embedder import BatchingEmbedder
+from app.utils.metrics import METRICS, Histogram
+
+
+class RecordingEmbedder:
+    """Encodes each text as [len(text)] and sleeps like a model call."""
+
+    def __init__(self, delay=0.05, fail=False):
+        self.delay = delay
+        self.fail = fail
+        self.batches = []
+        self._lock = threading.Lock()
+
+    def embed_texts(self, texts):
+        with self._lock:
+            self.batches.append(list(texts))
+        time.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError("model failed")
+        return np.array([[len(t)] for t in texts], dtype="float32")
+
+
+def test_concurrent_requests_share_batches():
+    embedder = RecordingEmbedder()
+    batcher = BatchingEmbedder(embedder, max_batch_size=16, max_wait_ms=20, max_in_flight=1)
+
+    async def run():
+        return await asyncio.gather(*[batcher.aembed(["x" * i]) for i in range(1, 33)])
+
+    start = time.perf_counter()
+    results = asyncio.run(run())
+    elapsed = time.perf_counter() - start
+
+    # Every caller gets its own row back
+    assert [float(r[0][0]) for r in results] == [float(i) for i in range(1, 33)]
+    assert len(embedder.batches) <= 3 and max(len(b) for b in embedder.batches) == 16
+    # 32 single-text calls would take ~1.6s one after another
+    assert elapsed < 0.6
+    assert batcher.stats()["batch_size"]["count"] == len(embedder.batches)
+    assert batcher.stats()["queue_wait_ms"]["count"] == 32
+    scrape = METRICS.render()
+    assert "qa_embed_batch_size_count" in scrape and "qa_embed_batch_queue_wait_seconds_count" in scrape
+
+
+def test_lone_request_flushes_after_max_wait():
+    embedder = RecordingEmbedder(delay=0)
+    batcher = BatchingEmbedder(embedder, max_batch_size=64, max_wait_ms=5)
+
+    async def run():
+        return await asyncio.wait_for(batcher.aembed(["a", "bb"]), 1)
+
+    assert asyncio.run(run()).tolist() == [[1.0], [2.0]]
+    assert embedder.batches == [["a", "bb"]]
+
+
+def test_errors_reach_every_caller_in_the_batch():
+    batcher = BatchingEmbedder(RecordingEmbedder(fail=True), max_batch_size=4, max_wait_ms=10)
+
+    async def run():
+        return await asyncio.gather(*[batcher.aembed(["q"]) for _ in range(3)], return_exceptions=True)
+
+    results = asyncio.run(run())
+    assert all(isinstance(r, RuntimeError) for r in results)
+    # A new event loop gets a fresh worker
+    batcher.embedder.fail = False
+    assert asyncio.run(batcher.aembed(["ok"])).tolist() == [[2.0]]
+
+
+@pytest.mark.parametrize("value,expected", [(0.3, 0.5), (7, 10)])
+def test_histogram_quantile_is_bucket_bound(value, expected):
+    h = Histogram((0.5, 1, 10))
+    h.observe(value)
+    assert h.quantile(0.5) == expected and h.snapshot()["buckets"]["+Inf"] == 1
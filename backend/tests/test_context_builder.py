@@ -0,0 +1,37 @@
+from app.utils.context_builder import assemble_context
+from app.utils.tokens import count_tokens
+
+OVERLAP = "Discount codes are validated on apply and shown in the summary."
+FIRST = "Code SAVE15 gives 15% off orders above $50. " + OVERLAP
+SECOND = OVERLAP + " Expired codes show the message 'Code expired'."
+
+
+def _hit(text, source, chunk_index):
+    return {"document": text, "metadata": {"source": source, "chunk_index": chunk_index}}
+
+
+def test_duplicates_dropped_and_adjacent_chunks_merged():
+    results = [
+        _hit(SECOND, "specs.md", 4),
+        _hit(FIRST, "specs.md", 3),
+        _hit(FIRST, "specs.md", 3),
+        _hit("Shipping is free over $100.", "shipping.md", 0),
+    ]
+    context, stats = assemble_context(results, token_budget=1000)
+
+    assert context.count(OVERLAP) == 1
+    assert context.startswith("--- SOURCE 1: specs.md ---\n" + FIRST + SECOND[len(OVERLAP):])
+    assert "--- SOURCE 2: shipping.md ---" in context
+    assert stats["duplicates_removed"] == 1 and stats["merged"] == 1 and stats["chunks_used"] == 3
+    assert stats["context_tokens"] == count_tokens(context)
+
+
+def test_budget_is_respected():
+    results = [_hit(f"Rule {i}: " + "word " * 100, "rules.md", i * 2) for i in range(5)]
+    context, stats = assemble_context(results, token_budget=300)
+
+    assert stats["context_tokens"] <= 300 and 0 < stats["chunks_used"] < 5
+    assert "Rule 0:" in context
+
+    context, stats = assemble_context(results[:1], token_budget=20)
+    assert stats["truncated"] == 1 and stats["context_tokens"] <= 20
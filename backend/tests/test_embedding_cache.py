@@ -0,0 +1,52 @@
+import numpy as np
+from app.services.embedding_cache import EmbeddingCache
+from app.services.embeddings import EmbeddingService
+
+
+class FakeModelEmbeddingService(EmbeddingService):
+    """EmbeddingService with the SentenceTransformer replaced by a counter."""
+
+    def __init__(self, cache):
+        super().__init__(cache=cache)
+        self.encoded = []
+
+    def _encode(self, texts):
+        self.encoded.extend(texts)
+        return np.array([[len(t), 1.0, 2.0] for t in texts], dtype="float32")
+
+
+def test_cache_serves_repeats_without_model(tmp_path):
+    cache = EmbeddingCache(str(tmp_path/"cache.db"))
+    svc = FakeModelEmbeddingService(cache)
+
+    first = svc.embed_texts(["a", "bb", "a"])
+    second = svc.embed_texts(["bb", "a"])
+
+    assert svc.encoded == ["a", "bb"]
+    assert np.array_equal(first[1], second[0])
+    assert second.dtype == np.float32
+    assert cache.stats()["hits"] == 2
+
+    # Cached rows can be written straight into a caller-provided buffer
+    buf = np.zeros((4, 3), dtype="float32")
+    svc.embed_texts(["a", "bb"], out=buf[1:3])
+    assert np.array_equal(buf[1:3], first[:2]) and not buf[0].any()
+
+    # The cache is persistent across processes
+    reopened = FakeModelEmbeddingService(EmbeddingCache(str(tmp_path/"cache.db")))
+    reopened.embed_texts(["a"])
+    assert reopened.encoded == []
+
+
+def test_cache_evicts_least_recently_used(tmp_path):
+    vec_bytes = 3 * 4
+    cache = EmbeddingCache(str(tmp_path/"cache.db"), max_bytes=int(vec_bytes * 3.5))
+    keys = [f"k{i}" for i in range(3)]
+    cache.put_many(keys, np.ones((3, 3), dtype="float32"))
+    cache.get_many(["k0"])  # k0 becomes most recently used
+    cache.put_many(["k3"], np.ones((1, 3), dtype="float32"))
+
+    remaining = cache.get_many(keys + ["k3"])
+    assert "k0" in remaining and "k3" in remaining
+    assert len(remaining) == 3
+    assert cache.stats()["evictions"] == 1
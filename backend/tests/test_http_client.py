@@ -0,0 +1,61 @@
+import asyncio
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import httpx
+import pytest
+from app.utils.http_client import connection_stats, make_async_client, make_client
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("content-length", 0)))
+        if self.path == "/slow":
+            time.sleep(0.5)
+        body = b'{"message": {"content": "ok"}}'
+        self.send_response(200)
+        self.send_header("content-type", "application/json")
+        self.send_header("content-length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def base_url():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+def test_sync_client_reuses_one_connection(base_url):
+    with make_client("test-sync", base_url, read_timeout=5) as client:
+        for _ in range(5):
+            assert client.post("/api/chat", json={}).json()["message"]["content"] == "ok"
+    stats = connection_stats("test-sync").stats()
+    assert stats["requests"] == 5 and stats["new_connections"] == 1 and stats["reuse_rate"] == 0.8
+
+
+def test_async_client_pools_connections(base_url):
+    async def run():
+        async with make_async_client("test-async", base_url, read_timeout=5) as client:
+            for _ in range(3):
+                await asyncio.gather(*[client.post("/api/chat", json={}) for _ in range(4)])
+
+    asyncio.run(run())
+    stats = connection_stats("test-async").stats()
+    # Later rounds reuse the first round's keep-alive connections
+    assert stats["requests"] == 12 and stats["new_connections"] <= 4
+
+
+def test_read_timeout(base_url):
+    with make_client("test-timeout", base_url, read_timeout=0.1) as client:
+        with pytest.raises(httpx.ReadTimeout):
+            client.post("/slow", json={})
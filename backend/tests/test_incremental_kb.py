@@ -0,0 +1,44 @@
+import numpy as np
+from app.services.kb_builder import KnowledgeBaseBuilder
+from app.services.vector_db import VectorDB
+
+
+class CountingEmbedder:
+    dimension = 8
+
+    def __init__(self):
+        self.embedded = 0
+
+    def embed_texts(self, texts, out=None):
+        self.embedded += len(texts)
+        out[...] = np.random.rand(len(texts), self.dimension)
+        return out
+
+
+def _paragraphs(n, tag):
+    return "\n\n".join(f"Rule {i} ({tag}): " + "discount code SAVE15 applies. " * 20 for i in range(n))
+
+
+def test_reupload_is_incremental(tmp_path):
+    embedder = CountingEmbedder()
+    vdb = VectorDB(persist_dir=str(tmp_path/"chroma_db"))
+    kb = KnowledgeBaseBuilder(embedder=embedder, vector_db=vdb)
+    doc = {"source": "specs.md", "text": _paragraphs(6, "v1"), "type": "text"}
+
+    first = kb.build_from_texts([doc], session_id="s1", chunk_size=120, chunk_overlap=0)
+    count_after_first = vdb.collection.count()
+    assert first["added"] == embedder.embedded > 0
+
+    # Identical re-upload: no embedding, no duplicates
+    second = kb.build_from_texts([doc], session_id="s1", chunk_size=120, chunk_overlap=0)
+    assert second["added"] == 0
+    assert second["skipped_documents"] == ["specs.md"]
+    assert embedder.embedded == first["added"]
+    assert vdb.collection.count() == count_after_first
+
+    # Edited document: only changed chunks are embedded, stale ones removed
+    edited = dict(doc, text=_paragraphs(5, "v1") + "\n\nA brand new shipping rule.")
+    third = kb.build_from_texts([edited], session_id="s1", chunk_size=120, chunk_overlap=0)
+    assert 0 < third["added"] < first["added"]
+    assert third["deleted"] > 0
+    assert vdb.collection.count() == third["total_chunks"]
@@ -0,0 +1,125 @@
+import asyncio
+import threading
+import time
+from app.services.job_queue import JobStore, JobWorker, KBJobRunner, PENDING, RUNNING, COMPLETED
+
+
+class FakeKBBuilder:
+    def build_from_stream(self, docs, session_id, progress_callback=None):
+        added, errors = 0, []
+        for doc in docs:
+            try:
+                "".join(doc["pieces"])
+                added += 1
+            except Exception as e:
+                errors.append({"file": doc["source"], "error": str(e)})
+        if progress_callback:
+            progress_callback(added, added)
+        return {"status": "ok", "added": added, "errors": errors}
+
+
+def test_jobs_survive_restart(tmp_path):
+    db_path = str(tmp_path/"jobs.db")
+    store = JobStore(db_path, lease_seconds=0.05)
+    job_id = store.create_job("s1", [{"path": "a.txt", "source": "a.txt", "size": 10}])
+    assert store.claim_next()["job_id"] == job_id
+    assert store.get(job_id)["status"] == RUNNING
+
+    # A fresh store on the same file sees the interrupted job and, once its
+    # lease has run out, re-queues it
+    restarted = JobStore(db_path)
+    assert restarted.requeue_interrupted() == 0
+    time.sleep(0.1)
+    assert restarted.requeue_interrupted() == 1
+    assert restarted.get(job_id)["status"] == PENDING
+    assert restarted.get(job_id)["progress"]["bytes_total"] == 10
+
+
+def test_live_lease_is_not_requeued(tmp_path):
+    db_path = str(tmp_path/"jobs.db")
+    worker = JobStore(db_path, lease_seconds=0.2)
+    job_id = worker.create_job("s1", [])
+    worker.claim_next()
+    sibling = JobStore(db_path)
+    for _ in range(3):
+        time.sleep(0.1)
+        assert worker.renew_lease(job_id)
+        assert sibling.requeue_interrupted() == 0
+    assert not sibling.renew_lease(job_id)
+
+
+def test_each_job_is_claimed_once_across_stores(tmp_path):
+    db_path = str(tmp_path/"jobs.db")
+    stores = [JobStore(db_path) for _ in range(4)]
+    job_ids = {stores[0].create_job("s1", []) for _ in range(40)}
+    claimed = []
+
+    def drain(store):
+        while (job := store.claim_next()) is not None:
+            claimed.append(job["job_id"])
+
+    threads = [threading.Thread(target=drain, args=(store,)) for store in stores]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert sorted(claimed) == sorted(job_ids)
+
+
+def test_runner_reports_progress_and_file_errors(tmp_path):
+    store = JobStore(str(tmp_path/"jobs.db"))
+    doc = tmp_path/"specs.md"
+    doc.write_text("Discount code SAVE15 gives 15% off.")
+    files = [
+        {"path": str(doc), "source": "specs.md", "size": doc.stat().st_size},
+        {"path": str(tmp_path/"missing.txt"), "source": "missing.txt", "size": 5},
+    ]
+    job_id = store.create_job("s1", files)
+    runner = KBJobRunner(store, FakeKBBuilder())
+
+    result = runner.run(store.claim_next())
+    store.finish(job_id, result)
+
+    job = store.get(job_id)
+    assert job["status"] == COMPLETED
+    assert job["result"]["processed_files"] == ["specs.md"]
+    assert job["result"]["file_errors"][0]["file"] == "missing.txt"
+    assert job["progress"]["files_processed"] == 2
+    assert job["progress"]["bytes_processed"] == job["progress"]["bytes_total"]
+    assert job["progress"]["chunks_embedded"] == 1
+
+
+class ThreadRecordingStore(JobStore):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.threads = []
+
+    def claim_next(self):
+        self.threads.append(threading.current_thread())
+        return super().claim_next()
+
+    def renew_lease(self, job_id):
+        self.threads.append(threading.current_thread())
+        return super().renew_lease(job_id)
+
+
+class SlowRunner:
+    def run(self, job):
+        time.sleep(0.2)
+        return {"processed_files": [], "file_errors": [], "kb_build_result": None}
+
+
+def test_worker_keeps_store_writes_off_the_event_loop(tmp_path):
+    store = ThreadRecordingStore(str(tmp_path/"jobs.db"), lease_seconds=0.15)
+    job_id = store.create_job("s1", [])
+    worker = JobWorker(store, SlowRunner(), str(tmp_path/"staging"), concurrency=1)
+
+    async def run():
+        worker.start()
+        while store.get(job_id)["status"] != COMPLETED:
+            await asyncio.sleep(0.02)
+        await worker.stop()
+
+    asyncio.run(run())
+    # Claims and at least one heartbeat happened, none on the loop thread
+    assert len(store.threads) >= 2 and threading.main_thread() not in store.threads
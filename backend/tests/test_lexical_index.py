@@ -0,0 +1,85 @@
+import asyncio
+import numpy as np
+from app.services.lexical_index import LexicalIndex, reciprocal_rank_fusion, tokenize
+from app.services.rag_service import RAGService
+
+SESSION = "s1"
+CHUNKS = {
+    "c1": "Code SAVE15 gives 15% off the subtotal.",
+    "c2": "POST /apply_coupon accepts a discount_code field.",
+    "c3": "Express shipping costs $10 and takes 1-2 days.",
+    "c4": "Standard shipping is free and takes 5-7 days.",
+}
+
+
+def _index(tmp_path):
+    index = LexicalIndex(str(tmp_path/"lexical"))
+    index.add_chunks(SESSION, list(CHUNKS), list(CHUNKS.values()))
+    index.add_chunks("other", ["x1"], ["SAVE15 in another session"])
+    assert index.compile(SESSION) == 4
+    return index
+
+
+def test_tokenize_keeps_identifiers_and_parts():
+    tokens = tokenize("Use discount_code on /apply_coupon")
+    assert "discount_code" in tokens and "discount" in tokens and "apply_coupon" in tokens and "coupon" in tokens
+
+
+def test_bm25_finds_exact_terms_within_session(tmp_path):
+    index = _index(tmp_path)
+    assert index.search(SESSION, "what does save15 do")[0][0] == "c1"
+    assert index.search(SESSION, "discount_code")[0][0] == "c2"
+    assert [c for c, _ in index.search(SESSION, "express shipping", n=2)] == ["c3", "c4"]
+    assert index.search(SESSION, "paypal") == []
+    # "other" was never compiled
+    assert index.search("other", "save15") == []
+
+
+def test_delete_and_recompile(tmp_path):
+    index = _index(tmp_path)
+    index.delete_chunks(SESSION, ["c1"])
+    index.compile(SESSION)
+    assert index.search(SESSION, "save15") == []
+    index.delete_session(SESSION)
+    assert not index.has_index(SESSION) and index.search(SESSION, "shipping") == []
+
+
+def test_rrf_prefers_ids_ranked_well_by_both():
+    assert reciprocal_rank_fusion([["a", "b", "c"], ["b", "d", "a"]]) == ["b", "a", "d", "c"]
+
+
+class FakeEmbedder:
+    def embed_texts(self, texts):
+        return np.ones((len(texts), 4), dtype="float32")
+
+
+class FakeVectorDB:
+    """Dense search that ranks the shipping chunks first and never finds SAVE15."""
+
+    def query(self, query_embedding, n_results=5, session_id=None):
+        return [{"id": c, "document": CHUNKS[c], "metadata": {}, "distance": 0.1} for c in ("c3", "c4", "c2")][:n_results]
+
+    def get_by_ids(self, ids, session_id=None):
+        return [{"id": c, "document": CHUNKS[c], "metadata": {}, "distance": None} for c in ids]
+
+    def get_session_chunks(self, session_id):
+        return (list(CHUNKS), list(CHUNKS.values())) if session_id == SESSION else ([], [])
+
+
+def test_hybrid_retrieval_fuses_lexical_only_hits(tmp_path):
+    rag = RAGService(embedder=FakeEmbedder(), vector_db=FakeVectorDB(), llm=object(), lexical_index=_index(tmp_path))
+    results = asyncio.run(rag._aretrieve("What does SAVE15 do?", SESSION, k=2))
+    assert "c1" in [r["id"] for r in results] and len(results) == 2
+    assert [r["id"] for r in rag._retrieve("What does SAVE15 do?", SESSION, k=2)] == [r["id"] for r in results]
+
+    dense = RAGService(embedder=FakeEmbedder(), vector_db=FakeVectorDB(), llm=object(), retrieval_mode="dense")
+    assert [r["id"] for r in asyncio.run(dense._aretrieve("What does SAVE15 do?", SESSION, k=2))] == ["c3", "c4"]
+
+
+def test_session_without_index_is_backfilled_on_first_query(tmp_path):
+    # A session indexed before BM25 existed: chunks are only in the vector DB
+    index = LexicalIndex(str(tmp_path/"lexical"))
+    rag = RAGService(embedder=FakeEmbedder(), vector_db=FakeVectorDB(), llm=object(), lexical_index=index)
+    assert "c1" in [r["id"] for r in rag._retrieve("What does SAVE15 do?", SESSION, k=2)]
+    assert index.has_index(SESSION)
+    assert not index.ensure_index("empty", lambda: ([], []))
@@ -0,0 +1,58 @@
+import asyncio
+from app.services.llm_cache import LLMResponseCache
+from app.services.llm_provider import LLMProvider
+
+
+class CountingProvider(LLMProvider):
+    def __init__(self, cache, reply="[]"):
+        super().__init__(provider="ollama", cache=cache)
+        self.reply = reply
+        self.calls = 0
+
+    async def _agenerate(self, system_prompt, user_content):
+        self.calls += 1
+        return self.reply
+
+
+def test_repeats_are_served_from_cache_and_bypass_refreshes():
+    llm = CountingProvider(LLMResponseCache(ttl_seconds=3600, max_entries=10))
+
+    async def run():
+        first = await llm.agenerate_response("sys", "discount code")
+        again = await llm.agenerate_response("sys", "discount code")
+        llm.reply = "[{}]"
+        forced = await llm.agenerate_response("sys", "discount code", use_cache=False)
+        after = await llm.agenerate_response("sys", "discount code")
+        return first, again, forced, after
+
+    assert asyncio.run(run()) == ("[]", "[]", "[{}]", "[{}]")
+    assert llm.calls == 2
+    assert llm.cache.stats()["hits"] == 2
+
+
+def test_errors_are_not_cached():
+    llm = CountingProvider(LLMResponseCache(), reply="Error from Ollama: busy")
+    asyncio.run(llm.agenerate_response("sys", "q"))
+    asyncio.run(llm.agenerate_response("sys", "q"))
+    assert llm.calls == 2
+
+
+def test_ttl_size_eviction_and_disk_tier(tmp_path):
+    db_path = str(tmp_path/"llm_cache.db")
+    cache = LLMResponseCache(ttl_seconds=3600, max_entries=2, db_path=db_path)
+    keys = [LLMResponseCache.make_key("groq", "m", 0.1, "sys", f"q{i}") for i in range(3)]
+    for i, key in enumerate(keys):
+        cache.put(key, f"r{i}")
+
+    # Oldest entry evicted from both tiers once over max_entries
+    assert cache.get(keys[0]) is None
+    # A new process (fresh memory tier) still finds the survivors on disk
+    reopened = LLMResponseCache(ttl_seconds=3600, max_entries=2, db_path=db_path)
+    assert reopened.get(keys[2]) == "r2"
+
+    expired = LLMResponseCache(ttl_seconds=1, max_entries=2, db_path=db_path)
+    with expired._connect() as conn:
+        conn.execute("UPDATE responses SET created_at = created_at - 10")
+    assert expired.get(keys[1]) is None
+
+    assert keys[0] != LLMResponseCache.make_key("groq", "m", 0.7, "sys", "q0")
@@ -0,0 +1,139 @@
+import asyncio
+import time
+import pytest
+from app.services import llm_router
+from app.services.llm_provider import LLMProvider, LLMRateLimited
+from app.services.llm_router import Backend, LLMRouter, TokenBucket, parse_backends
+
+
+class FakeProvider(LLMProvider):
+    """Answers after `delay` seconds, or fails the way a real backend would."""
+
+    def __init__(self, name, delay=0.0, fail=None, retry_after=None):
+        super().__init__(provider="ollama", ollama_model=name)
+        self.delay = delay
+        self.fail = fail
+        self.retry_after = retry_after
+        self.calls = 0
+
+    async def _acomplete(self, system_prompt, user_content):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if self.fail == "429":
+            raise LLMRateLimited("429 Too Many Requests", self.retry_after)
+        if self.fail == "error":
+            return "Error from Ollama: model not found"
+        return f"{self.ollama_model}: {user_content}"
+
+    async def _astream(self, system_prompt, user_content):
+        self.calls += 1
+        if self.fail == "429":
+            raise LLMRateLimited("429 Too Many Requests", self.retry_after)
+        if self.fail:
+            raise RuntimeError("connection refused")
+        for word in ("hello", " ", "world"):
+            yield word
+
+
+def router(*providers, **kwargs):
+    return LLMRouter([Backend(p) for p in providers], **kwargs)
+
+
+def test_fails_over_on_error_and_rate_limit():
+    broken, limited, ok = FakeProvider("a", fail="error"), FakeProvider("b", fail="429", retry_after=60), FakeProvider("c")
+    r = router(broken, limited, ok)
+    assert asyncio.run(r.agenerate_response("sys", "q")) == "c: q"
+    stats = r.stats()["backends"]
+    assert stats["ollama:a"]["failures"] == 1 and stats["ollama:b"]["rate_limited"] == 1
+    # The 429'd backend is skipped until its Retry-After has passed
+    asyncio.run(r.agenerate_response("sys", "q2"))
+    assert limited.calls == 1 and ok.calls == 2
+
+
+def test_all_backends_failing_returns_error_string():
+    r = router(FakeProvider("a", fail="error"), FakeProvider("b", fail="error"))
+    response = asyncio.run(r.agenerate_response("sys", "q"))
+    assert response.startswith("Error interacting with LLM") and "ollama:a" in response and "ollama:b" in response
+
+
+def test_unhealthy_backend_is_tried_last(monkeypatch):
+    flaky, ok = FakeProvider("a", fail="error"), FakeProvider("b")
+    r = router(flaky, ok)
+    for i in range(5):
+        asyncio.run(r.agenerate_response("sys", f"q{i}"))
+    assert r.backends[0].unhealthy
+    assert [b.name for b in r._ordered()] == ["ollama:b", "ollama:a"]
+    # Once it has been quiet for the cooldown it is preferred again
+    monkeypatch.setattr(llm_router, "LLM_UNHEALTHY_COOLDOWN_SECONDS", 0)
+    assert [b.name for b in r._ordered()] == ["ollama:a", "ollama:b"]
+
+
+def test_hedge_starts_second_backend_after_p95(monkeypatch):
+    monkeypatch.setattr(llm_router, "LLM_HEDGE_MIN_SAMPLES", 3)
+    slow, fast = FakeProvider("slow", delay=1.0), FakeProvider("fast", delay=0.01)
+    r = router(slow, fast, hedge=True)
+    r.backends[0].latencies.extend([0.05] * 3)
+
+    start = time.perf_counter()
+    response = asyncio.run(r.agenerate_response("sys", "q"))
+    assert response == "fast: q" and time.perf_counter() - start < 0.5
+    assert r.backends[1].hedged == 1
+
+
+def test_stream_fails_over_before_first_token():
+    r = router(FakeProvider("a", fail="error"), FakeProvider("b"))
+
+    async def collect():
+        return [delta async for delta in r.astream_response("sys", "q")]
+
+    assert "".join(asyncio.run(collect())) == "hello world"
+
+
+def test_rate_limited_primary_waits_instead_of_failing_with_secondary_down():
+    primary, unreachable = Backend(FakeProvider("a")), Backend(FakeProvider("b", fail="error"))
+    primary.bucket = TokenBucket(rate=50, capacity=3)
+    r = LLMRouter([primary, unreachable])
+
+    async def burst():
+        return await asyncio.gather(*[r.agenerate_response("sys", f"q{i}") for i in range(10)])
+
+    assert asyncio.run(burst()) == [f"a: q{i}" for i in range(10)]
+
+
+def test_waits_out_retry_after_when_every_backend_is_rate_limited():
+    limited = FakeProvider("a", fail="429", retry_after=0.05)
+    r = router(limited)
+
+    async def recover():
+        task = asyncio.ensure_future(r.agenerate_response("sys", "q"))
+        await asyncio.sleep(0.02)
+        limited.fail = None
+        return await task
+
+    assert asyncio.run(recover()) == "a: q"
+    assert limited.calls == 2
+
+
+def test_stream_fails_over_on_rate_limit():
+    limited, ok = FakeProvider("a", fail="429", retry_after=60), FakeProvider("b")
+    r = router(limited, ok)
+
+    async def collect():
+        return [delta async for delta in r.astream_response("sys", "q")]
+
+    assert "".join(asyncio.run(collect())) == "hello world"
+    assert r.stats()["backends"]["ollama:a"]["rate_limited"] == 1
+
+
+def test_token_bucket_limits_rate():
+    bucket = TokenBucket(rate=10, capacity=2)
+    assert bucket.try_acquire() and bucket.try_acquire()
+    assert not bucket.try_acquire()
+    assert 0 < bucket.wait_time() <= 0.1
+
+
+def test_parse_backends():
+    assert parse_backends("groq:llama-3.1-8b-instant@30, ollama:llama3") == [
+        {"provider": "groq", "model": "llama-3.1-8b-instant", "rpm": 30.0},
+        {"provider": "ollama", "model": "llama3", "rpm": 0},
+    ]
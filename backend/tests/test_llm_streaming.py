@@ -0,0 +1,61 @@
+import asyncio
+import json
+import numpy as np
+from app.services.llm_cache import LLMResponseCache
+from app.services.llm_provider import LLMProvider
+from app.services.rag_service import RAGService
+
+
+class ChunkedProvider(LLMProvider):
+    def __init__(self, chunks, fail_after=None, cache=None):
+        super().__init__(provider="ollama", cache=cache)
+        self.chunks = chunks
+        self.fail_after = fail_after
+        self.calls = 0
+
+    async def _astream(self, system_prompt, user_content):
+        self.calls += 1
+        for i, chunk in enumerate(self.chunks):
+            if i == self.fail_after:
+                raise ConnectionError("stream dropped")
+            yield chunk
+
+
+class FakeEmbedder:
+    def embed_texts(self, texts):
+        return np.ones((len(texts), 4), dtype="float32")
+
+
+class FakeVectorDB:
+    def query(self, query_embedding, n_results=5, session_id=None):
+        return [{"id": "1", "document": "Code SAVE15 gives 15% off.", "metadata": {"source": "specs.md"}, "distance": 0.1}]
+
+
+async def _collect(agen):
+    return [item async for item in agen]
+
+
+def test_stream_yields_tokens_then_parsed_results():
+    body = json.dumps([{"Test_ID": "TC-001", "Grounded_In": "checkout__0f8fad5b-d9cb-469f-a165-70867728950e.html"}])
+    llm = ChunkedProvider([body[:10], body[10:25], body[25:]])
+    rag = RAGService(embedder=FakeEmbedder(), vector_db=FakeVectorDB(), llm=llm)
+
+    events = asyncio.run(_collect(rag.astream_test_cases("discount", session_id="s1")))
+
+    assert [e["event"] for e in events] == ["token", "token", "token", "done"]
+    assert "".join(e["text"] for e in events[:-1]) == body
+    assert events[-1]["results"][0]["Grounded_In"] == "checkout.html"
+
+
+def test_completed_streams_are_cached_and_broken_ones_are_not():
+    llm = ChunkedProvider(["print(", "'ok')"], cache=LLMResponseCache())
+    assert asyncio.run(_collect(llm.astream_response("sys", "q"))) == ["print(", "'ok')"]
+    # Replayed from the cache as one chunk, no second completion
+    assert asyncio.run(_collect(llm.astream_response("sys", "q"))) == ["print('ok')"]
+    assert llm.calls == 1
+
+    broken = ChunkedProvider(["print(", "'ok')"], fail_after=1, cache=LLMResponseCache())
+    chunks = asyncio.run(_collect(broken.astream_response("sys", "q")))
+    assert chunks[0] == "print(" and chunks[-1].startswith("Error interacting with LLM")
+    asyncio.run(_collect(broken.astream_response("sys", "q")))
+    assert broken.calls == 2
@@ -0,0 +1,20 @@
+import asyncio
+import time
+from app.utils.loop_monitor import LoopLagMonitor
+
+
+def test_blocking_call_is_reported_as_stall():
+    monitor = LoopLagMonitor(name="test", interval_ms=10, warn_ms=100)
+
+    async def scenario():
+        monitor.start()
+        await asyncio.sleep(0.05)
+        time.sleep(0.2)  # blocks the loop, as a sync call inside an async handler would
+        await asyncio.sleep(0.05)
+        await monitor.stop()
+
+    asyncio.run(scenario())
+    stats = monitor.stats()
+    assert stats["stalls"] == 1
+    assert stats["max_ms"] >= 150
+    assert stats["samples"] >= 3
@@ -0,0 +1,77 @@
+import asyncio
+import pytest
+from app.services.llm_provider import LLMProvider
+from app.utils.concurrency import run_in_pool
+from app.utils.metrics import CACHE_LOOKUPS, LLM_TOKENS, MetricsRegistry, STAGE_ERRORS, STAGE_SECONDS, stage
+
+
+def test_render_prometheus_text_format():
+    registry = MetricsRegistry()
+    requests = registry.counter("demo_requests_total", "Requests.", ("route",))
+    latency = registry.histogram("demo_seconds", "Latency.", ("route",), buckets=(0.1, 1))
+    requests.inc(route='/a"b')
+    requests.inc(2, route="/c")
+    latency.observe(0.05, route="/c")
+    latency.observe(5, route="/c")
+
+    lines = registry.render().splitlines()
+    assert "# TYPE demo_requests_total counter" in lines
+    assert 'demo_requests_total{route="/a\\"b"} 1' in lines
+    assert 'demo_requests_total{route="/c"} 2' in lines
+    assert 'demo_seconds_bucket{route="/c",le="0.1"} 1' in lines
+    assert 'demo_seconds_bucket{route="/c",le="1"} 1' in lines
+    assert 'demo_seconds_bucket{route="/c",le="+Inf"} 2' in lines
+    assert 'demo_seconds_count{route="/c"} 2' in lines
+    # Registering the same name again returns the existing metric
+    assert registry.counter("demo_requests_total", "Requests.", ("route",)) is requests
+
+
+def test_stage_times_block_and_counts_errors():
+    before = STAGE_SECONDS.labels(stage="test.stage").count
+    with stage("test.stage"):
+        pass
+    with pytest.raises(ValueError):
+        with stage("test.stage"):
+            raise ValueError("boom")
+    assert STAGE_SECONDS.labels(stage="test.stage").count == before + 2
+    assert STAGE_ERRORS.value(stage="test.stage") == 1
+
+
+def test_stage_inside_pool_thread():
+    def work():
+        with stage("test.pool"):
+            return 42
+
+    assert asyncio.run(run_in_pool("parse", work)) == 42
+    assert STAGE_SECONDS.labels(stage="test.pool").count == 1
+
+
+class FakeCache:
+    def __init__(self):
+        self.data = {}
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def put(self, key, value):
+        self.data[key] = value
+
+
+class EchoProvider(LLMProvider):
+    async def _acomplete(self, system_prompt, user_content):
+        self._count_usage(system_prompt, user_content, "answer", prompt_tokens=7, completion_tokens=3)
+        return "answer"
+
+
+def test_llm_tokens_and_cache_lookups():
+    llm = EchoProvider(provider="ollama", ollama_model="echo-model", cache=FakeCache())
+    hits = CACHE_LOOKUPS.value(cache="llm", result="hit")
+    misses = CACHE_LOOKUPS.value(cache="llm", result="miss")
+
+    asyncio.run(llm.agenerate_response("sys", "q"))
+    asyncio.run(llm.agenerate_response("sys", "q"))
+
+    assert LLM_TOKENS.value(model="echo-model", direction="in") == 7
+    assert LLM_TOKENS.value(model="echo-model", direction="out") == 3
+    assert CACHE_LOOKUPS.value(cache="llm", result="miss") == misses + 1
+    assert CACHE_LOOKUPS.value(cache="llm", result="hit") == hits + 1
@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+from app.services.embeddings import EmbeddingService
+from app.services.onnx_embeddings import OnnxEmbeddingService
+
+pytest.importorskip("onnxruntime")
+
+TEXTS = [
+    "Apply discount code SAVE15 at checkout",
+    "Express shipping costs $10 and takes 1-2 business days.",
+    "Invalid Code",
+    "The email field must match ^\\S+@\\S+\\.\\S+$ and errors are shown inline in red (#FF0000). " * 20,
+    "",
+]
+
+
+def _require_model(load):
+    # Offline CI: the hub is unreachable and the model isn't cached (or torch is missing)
+    try:
+        return load()
+    except (OSError, ImportError) as e:
+        pytest.skip(f"embedding model not available locally: {e}")
+
+
+@pytest.fixture(scope="module")
+def torch_vectors():
+    return _require_model(lambda: EmbeddingService().embed_texts(TEXTS))
+
+
+def _cosines(a, b):
+    a = a / np.linalg.norm(a, axis=1, keepdims=True)
+    b = b / np.linalg.norm(b, axis=1, keepdims=True)
+    return (a * b).sum(axis=1)
+
+
+@pytest.mark.parametrize("quantize,min_cosine", [(False, 0.9999), (True, 0.97)])
+def test_onnx_matches_torch_model(torch_vectors, quantize, min_cosine):
+    onnx = OnnxEmbeddingService(quantize=quantize, intra_op_threads=2, batch_size=2)
+    vectors = _require_model(lambda: onnx.embed_texts(TEXTS))
+
+    assert vectors.shape == torch_vectors.shape and vectors.dtype == np.float32
+    assert onnx.dimension == torch_vectors.shape[1]
+    assert _cosines(vectors, torch_vectors).min() >= min_cosine
+    # Input order survives the length-sorted batching
+    assert np.allclose(onnx.embed_texts(TEXTS[:1])[0], vectors[0], atol=1e-5)
+
+
+def test_backends_use_separate_cache_namespaces():
+    assert OnnxEmbeddingService().cache_namespace != EmbeddingService().cache_namespace
+    assert OnnxEmbeddingService(quantize=True).cache_namespace != OnnxEmbeddingService().cache_namespace
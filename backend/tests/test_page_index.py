@@ -0,0 +1,60 @@
+import os
+from app.services.page_index import PageIndex
+from app.services.script_generator import ScriptGeneratorService
+
+SESSION = "0f8fad5b-d9cb-469f-a165-70867728950e"
+PAGE = """
+<form id="checkout" action="/pay" method="post">
+  <label for="code">Discount code</label><input id="code" name="discount">
+  <label>Email <input type="email" name="email"></label>
+  <div><button>Apply</button><button type="submit">Pay</button></div>
+</form>
+"""
+
+
+def test_selector_index_has_labels_forms_and_css_paths(tmp_path):
+    path = tmp_path/f"checkout__{SESSION}.html"
+    path.write_text(PAGE)
+    selectors = PageIndex(str(tmp_path/"page_index.db")).index_page(SESSION, str(path))
+
+    code, email = selectors["inputs"]
+    assert code["label"] == "Discount code" and code["css"] == "input#code"
+    assert email["label"] == "Email" and email["css"] == "form#checkout > label:nth-of-type(2) > input"
+    assert [b["css"] for b in selectors["buttons"]] == [
+        "form#checkout > div > button:nth-of-type(1)",
+        "form#checkout > div > button:nth-of-type(2)",
+    ]
+    assert selectors["forms"] == [{"id": "checkout", "action": "/pay", "method": "post", "css": "form#checkout"}]
+    assert selectors["ids"] == ["checkout", "code"] and selectors["names"] == ["discount", "email"]
+
+
+def test_lookup_skips_scan_and_reupload_invalidates(tmp_path):
+    path = tmp_path/f"checkout__{SESSION}.html"
+    path.write_text(PAGE)
+    service = ScriptGeneratorService(upload_dir=str(tmp_path), vector_db=object(), llm=object())
+    service.page_index.index_page(SESSION, str(path))
+    service._find_session_html = lambda session_id: (_ for _ in ()).throw(AssertionError("scanned upload dir"))
+
+    selectors = service._load_page(SESSION)
+    assert len(selectors["inputs"]) == 2
+
+    path.write_text("<input id='coupon'>")
+    service.page_index.index_page(SESSION, str(path))
+    # A second worker with a stale in-memory copy still sees the new page
+    other = PageIndex(service.page_index.db_path)
+    assert other.get(SESSION)["ids"] == ["coupon"]
+    assert service._load_page(SESSION)["ids"] == ["coupon"]
+
+
+def test_sessions_without_a_page_scan_upload_dir_once(tmp_path, monkeypatch):
+    (tmp_path/f"checkout__{SESSION}.html").write_text(PAGE)
+    service = ScriptGeneratorService(upload_dir=str(tmp_path), vector_db=object(), llm=object())
+    scans = []
+    listdir = os.listdir
+    monkeypatch.setattr(os, "listdir", lambda path: scans.append(path) or listdir(path))
+
+    assert service._load_page("no-such-session") is None
+    assert service._load_page("no-such-session") is None
+    # A page saved before the index existed is found from the same scan
+    assert service._load_page(SESSION)["ids"] == ["checkout", "code"]
+    assert len(scans) == 1
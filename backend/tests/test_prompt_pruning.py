@@ -0,0 +1,52 @@
+from app.services.script_generator import ScriptGeneratorService
+from app.utils.dom_pruner import select_elements
+from app.utils.metrics import PROMPT_TOKENS
+from app.utils.parser_utils import build_selector_index
+
+NAV = "".join(f'<a href="/category/{i}" style="color:red">Category {i}</a>' for i in range(200))
+PAGE = f"""
+<html><head><style>body {{ color: red }}</style><script>track()</script></head>
+<body>
+  <nav>{NAV}</nav>
+  <label for="discount-code">Discount code</label>
+  <input id="discount-code" name="discount" onclick="x()" style="width: 9em">
+  <button id="apply-discount">Apply</button>
+  <div id="discount-msg">Invalid code</div>
+  <svg><path d="M0 0"/></svg>
+</body></html>
+"""
+TEST_CASE = {
+    "Feature": "Discount code",
+    "Test_Scenario": "Apply discount code SAVE15",
+    "Expected_Result": "Total is reduced by 15%",
+}
+
+
+def test_pruned_dom_drops_styles_scripts_and_handlers():
+    lines = [el["line"] for el in build_selector_index(PAGE)["elements"]]
+    joined = "\n".join(lines)
+    assert "track()" not in joined and "color" not in joined and "onclick" not in joined and "<path" not in joined
+    assert '<input id="discount-code" name="discount">  <!-- label: Discount code | css: input#discount-code -->' in lines
+
+
+def test_relevant_elements_win_within_budget():
+    meta = build_selector_index(PAGE)
+    kept, used = select_elements(meta["elements"], " ".join(TEST_CASE.values()), token_budget=80)
+
+    assert used <= 80
+    kept_text = "\n".join(el["line"] for el in kept)
+    for element_id in ("discount-code", "apply-discount", "discount-msg"):
+        assert element_id in kept_text
+    assert len(kept) < len(meta["elements"])
+
+
+def test_prompt_reports_tokens_saved():
+    service = ScriptGeneratorService(vector_db=object(), llm=object(), page_index=object(), page_token_budget=300)
+    saved = PROMPT_TOKENS.labels(prompt="script", part="saved")
+    observed = saved.count
+    _, user_prompt, stats = service._build_prompt(TEST_CASE, build_selector_index(PAGE))
+
+    assert "Category 199" not in user_prompt and 'id="apply-discount"' in user_prompt
+    assert stats["page_tokens_sent"] <= 300
+    assert stats["tokens_saved"] > 0 and stats["elements_kept"] < stats["elements_total"]
+    assert saved.count == observed + 1 and saved.sum >= stats["tokens_saved"]
@@ -0,0 +1,25 @@
+from app.services.registry import ServiceRegistry
+from app.services.kb_builder import KnowledgeBaseBuilder
+from app.services.rag_service import RAGService
+from app.services.script_generator import ScriptGeneratorService
+
+def test_registry_shares_instances(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    reg = ServiceRegistry()
+    persist_dir = str(tmp_path/"chroma_db")
+    assert reg.get_embedder() is reg.get_embedder()
+    assert reg.get_vector_db(persist_dir) is reg.get_vector_db(persist_dir)
+    assert reg.get_vector_db(persist_dir).client is reg.get_vector_db(persist_dir, "other").client
+    # The model must not be loaded until something is encoded
+    assert reg.get_embedder()._model is None
+
+def test_services_use_injected_instances(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    reg = ServiceRegistry()
+    embedder = reg.get_embedder()
+    vdb = reg.get_vector_db(str(tmp_path/"chroma_db"))
+    kb = KnowledgeBaseBuilder(embedder=embedder, vector_db=vdb)
+    rag = RAGService(embedder=embedder, vector_db=vdb)
+    gen = ScriptGeneratorService(vector_db=vdb)
+    assert kb.embedder is rag.embedder
+    assert kb.vdb is rag.vector_db is gen.vector_db
@@ -0,0 +1,71 @@
+import asyncio
+import numpy as np
+from app.services.rag_service import RAGService
+from app.services.reranker import Reranker
+from app.utils.metrics import PROMPT_TOKENS
+
+DOCS = {f"c{i}": f"chunk {i}" + (" SAVE15 gives 15% off" if i == 7 else "") for i in range(10)}
+
+
+class KeywordReranker(Reranker):
+    """Scores by keyword overlap instead of loading a cross-encoder."""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.scored = []
+
+    def _predict(self, pairs):
+        self.scored.extend(pairs)
+        return [float(len(set(q.lower().split()) & set(d.lower().split()))) for q, d in pairs]
+
+
+class FakeEmbedder:
+    def embed_texts(self, texts):
+        return np.ones((len(texts), 4), dtype="float32")
+
+
+class FakeVectorDB:
+    def __init__(self):
+        self.requested = []
+
+    def query(self, query_embedding, n_results=5, session_id=None):
+        self.requested.append(n_results)
+        return [{"id": c, "document": d, "metadata": {}, "distance": 0.1} for c, d in DOCS.items()][:n_results]
+
+
+def _hits(n):
+    return [{"id": c, "document": d} for c, d in list(DOCS.items())[:n]]
+
+
+def test_rerank_keeps_best_k_and_caches_scores():
+    reranker = KeywordReranker()
+    results, stats = reranker.rerank("what does save15 give", _hits(10), k=2)
+    assert results[0]["id"] == "c7" and len(results) == 2
+    assert stats["rerank_candidates"] == 10 and stats["rerank_cache_hits"] == 0
+
+    _, stats = reranker.rerank("what does save15 give", _hits(10), k=2)
+    assert stats["rerank_cache_hits"] == 10 and len(reranker.scored) == 10
+    assert reranker.stats()["hits"] == 10
+
+
+def test_score_cache_is_bounded():
+    reranker = KeywordReranker(cache_entries=4)
+    reranker.rerank("q", _hits(10), k=1)
+    assert reranker.stats()["entries"] == 4
+
+
+def test_rag_over_fetches_candidates_for_reranking():
+    vdb = FakeVectorDB()
+    rag = RAGService(
+        embedder=FakeEmbedder(), vector_db=vdb, llm=object(), reranker=KeywordReranker(), rerank_candidates=8
+    )
+    results, stats = asyncio.run(rag._aselect("Does SAVE15 give 15% off?", "s1", k=3))
+    assert vdb.requested == [8]
+    assert results[0]["id"] == "c7" and len(results) == 3
+    assert stats["rerank_candidates"] == 8 and "retrieval_ms" in stats and "rerank_ms" in stats
+
+    context = PROMPT_TOKENS.labels(prompt="testcases", part="context")
+    observed = context.count
+    _, _, prompt_stats = rag._build_prompts("Does SAVE15 give 15% off?", results, stats)
+    assert prompt_stats["rerank_candidates"] == 8 and prompt_stats["chunks_retrieved"] == 3
+    assert context.count == observed + 1
@@ -0,0 +1,56 @@
+import numpy as np
+from app.services.kb_manifest import KBManifest
+from app.services.session_manager import SessionManager
+from app.services.vector_db import VectorDB
+
+
+def _seed(vdb, upload_dir, session_id):
+    vdb.upsert_documents(
+        ids=[f"{session_id}-{i}" for i in range(3)],
+        texts=["chunk"] * 3,
+        embeddings=np.random.rand(3, 4).astype("float32"),
+        metadatas=[{"session_id": session_id, "source": "specs.md"}] * 3,
+    )
+    (upload_dir/f"checkout__{session_id}.html").write_text("<html></html>")
+
+
+def test_ttl_eviction_removes_vectors_and_html(tmp_path):
+    upload_dir = tmp_path/"uploaded_docs"
+    upload_dir.mkdir()
+    vdb = VectorDB(persist_dir=str(tmp_path/"chroma_db"))
+    manager = SessionManager(
+        vdb, KBManifest(str(tmp_path/"manifest.db")), upload_dir=str(upload_dir),
+        db_path=str(tmp_path/"sessions.db"), ttl_seconds=3600,
+    )
+    for sid in ("old", "fresh"):
+        _seed(vdb, upload_dir, sid)
+        manager.touch(sid)
+    # Age the 'old' session past its TTL
+    with manager._connect() as conn:
+        conn.execute("UPDATE sessions SET last_access = last_access - 7200 WHERE session_id = 'old'")
+
+    evicted = manager.reap()
+
+    assert [e["session_id"] for e in evicted] == ["old"]
+    assert evicted[0]["chunks_deleted"] == 3
+    assert vdb.count_session("old") == 0 and vdb.count_session("fresh") == 3
+    assert not (upload_dir/"checkout__old.html").exists()
+    report = manager.storage_report()
+    assert [r["session_id"] for r in report] == ["fresh"]
+    assert report[0]["chunks"] == 3 and report[0]["html_bytes"] > 0
+
+
+def test_lru_cap_skips_busy_sessions(tmp_path):
+    vdb = VectorDB(persist_dir=str(tmp_path/"chroma_db"))
+    manager = SessionManager(
+        vdb, KBManifest(str(tmp_path/"manifest.db")), upload_dir=str(tmp_path),
+        db_path=str(tmp_path/"sessions.db"), ttl_seconds=0, max_sessions=1,
+        is_busy=lambda sid: sid == "a",
+    )
+    for i, sid in enumerate(("a", "b", "c")):
+        manager.touch(sid)
+        with manager._connect() as conn:
+            conn.execute("UPDATE sessions SET last_access = ? WHERE session_id = ?", (1000 + i, sid))
+
+    assert manager.candidates_for_eviction() == ["a", "b"]
+    assert [e["session_id"] for e in manager.reap()] == ["b"]
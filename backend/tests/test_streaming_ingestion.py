@@ -0,0 +1,72 @@
+import numpy as np
+from app.services.file_ingestion import iter_local_file_text, process_local_file
+from app.services.kb_builder import KnowledgeBaseBuilder
+from app.services.vector_db import VectorDB
+from app.utils import chunk_utils
+from app.utils.chunk_utils import iter_chunks
+
+
+class RecordingEmbedder:
+    dimension = 8
+
+    def __init__(self):
+        self.batch_sizes = []
+
+    def embed_texts(self, texts, out=None):
+        self.batch_sizes.append(len(texts))
+        out[...] = np.random.rand(len(texts), self.dimension)
+        return out
+
+
+def test_iter_chunks_keeps_every_word_across_piece_boundaries():
+    text = " ".join(f"w{i}" for i in range(5000))
+    pieces = [text[i:i + 37] for i in range(0, len(text), 37)]
+    chunks = list(iter_chunks(pieces, chunk_size=50, chunk_overlap=10))
+    assert set(" ".join(chunks).split()) == set(text.split())
+
+
+def test_iter_chunks_bounds_text_without_whitespace(monkeypatch):
+    # Minified JS/JSON: no separator to cut at, so the buffer must still be split per window
+    split_lengths = []
+    chunk_text = chunk_utils.chunk_text
+    monkeypatch.setattr(chunk_utils, "chunk_text", lambda text, **kw: split_lengths.append(len(text)) or chunk_text(text, **kw))
+    blob = "x" * 500_000
+    chunks = list(iter_chunks((blob[i:i + 64] for i in range(0, len(blob), 64)), chunk_size=50, chunk_overlap=10))
+    assert set("".join(chunks)) == {"x"}
+    assert len(split_lengths) > 10 and max(split_lengths) <= 50 * 16 * 8 + 64
+
+
+def test_build_from_stream_consumes_pages_lazily(tmp_path):
+    consumed = []
+
+    def pages():
+        for i in range(300):
+            consumed.append(i)
+            yield f"Page {i}. " + " ".join(f"term{i}_{j}" for j in range(60)) + "\n"
+
+    embedder = RecordingEmbedder()
+    vdb = VectorDB(persist_dir=str(tmp_path/"chroma_db"))
+    kb = KnowledgeBaseBuilder(embedder=embedder, vector_db=vdb, batch_size=16)
+    upserts_at = []
+    original_upsert = vdb.upsert_documents
+
+    def recording_upsert(**kwargs):
+        upserts_at.append(len(consumed))
+        original_upsert(**kwargs)
+
+    vdb.upsert_documents = recording_upsert
+    result = kb.build_from_stream([{"source": "big.pdf", "type": "pdf", "pieces": pages()}], session_id="s1", chunk_size=100, chunk_overlap=10)
+
+    assert result["status"] == "ok" and result["errors"] == []
+    assert max(embedder.batch_sizes) <= 16
+    # The first batch is stored long before the last page is read
+    assert upserts_at[0] < 300
+    assert vdb.collection.count() == result["total_chunks"]
+
+
+def test_local_file_text_streams_and_joins(tmp_path):
+    path = tmp_path/"notes.txt"
+    path.write_text("line\n" * 100000)
+    pieces = list(iter_local_file_text(str(path)))
+    assert len(pieces) > 1
+    assert process_local_file(str(path))["text"] == "".join(pieces)
@@ -0,0 +1,74 @@
+import numpy as np
+from app.services.kb_builder import KnowledgeBaseBuilder
+from app.services.kb_manifest import KBManifest
+from app.services.vector_db import VectorDB
+
+
+def _seed(vdb, session_id, n=3):
+    vdb.upsert_documents(
+        ids=[f"{session_id}-{i}" for i in range(n)],
+        texts=["chunk"] * n,
+        embeddings=np.random.rand(n, 4).astype("float32"),
+        metadatas=[{"session_id": session_id, "source": "specs.md"}] * n,
+    )
+
+
+def test_session_shards_isolate_and_drop(tmp_path):
+    vdb = VectorDB(persist_dir=str(tmp_path/"chroma_db"), shard_mode="session")
+    _seed(vdb, "a")
+    _seed(vdb, "b")
+
+    assert vdb.shard_name("a") != vdb.shard_name("b")
+    hits = vdb.query(np.random.rand(4).astype("float32"), n_results=10, session_id="a")
+    assert {h["metadata"]["session_id"] for h in hits} == {"a"} and len(hits) == 3
+    assert vdb.query(np.random.rand(4).astype("float32"), session_id="unknown") == []
+
+    assert vdb.delete_session("a") == 3
+    assert vdb.count_session("a") == 0 and vdb.count() == 3
+
+
+def test_bucket_shards_keep_session_filter(tmp_path):
+    vdb = VectorDB(persist_dir=str(tmp_path/"chroma_db"), shard_mode="bucket", shard_buckets=1)
+    _seed(vdb, "a")
+    _seed(vdb, "b", n=2)
+
+    assert vdb.shard_name("a") == vdb.shard_name("b")
+    hits = vdb.query(np.random.rand(4).astype("float32"), n_results=10, session_id="b")
+    assert len(hits) == 2 and {h["metadata"]["session_id"] for h in hits} == {"b"}
+    assert vdb.delete_session("b") == 2 and vdb.count() == 3
+
+
+def test_stale_handle_after_another_worker_drops_session(tmp_path):
+    persist_dir = str(tmp_path/"chroma_db")
+    worker = VectorDB(persist_dir=persist_dir, shard_mode="session")
+    _seed(worker, "a")
+    assert worker.count_session("a") == 3
+    other = VectorDB(persist_dir=persist_dir, client=worker.client, shard_mode="session")
+    assert other.delete_session("a") == 3
+
+    # The first worker's cached handle points at the dropped collection
+    assert worker.query(np.random.rand(4).astype("float32"), session_id="a") == []
+    _seed(worker, "a", n=2)
+    assert worker.count_session("a") == 2
+
+
+class FakeEmbedder:
+    dimension = 4
+
+    def embed_texts(self, texts, out=None):
+        out[...] = np.random.rand(len(texts), self.dimension)
+        return out
+
+
+def test_changing_shard_mode_reindexes_unchanged_upload(tmp_path):
+    persist_dir = str(tmp_path/"chroma_db")
+    manifest = KBManifest(str(tmp_path/"manifest.db"))
+    doc = {"source": "specs.md", "text": "Discount code SAVE15 gives 15% off the order total.", "type": "text"}
+
+    single = VectorDB(persist_dir=persist_dir)
+    KnowledgeBaseBuilder(embedder=FakeEmbedder(), vector_db=single, manifest=manifest).build_from_texts([doc], "s1")
+    sharded = VectorDB(persist_dir=persist_dir, client=single.client, shard_mode="session")
+    result = KnowledgeBaseBuilder(embedder=FakeEmbedder(), vector_db=sharded, manifest=manifest).build_from_texts([doc], "s1")
+
+    assert result["added"] == 1 and result["skipped_documents"] == []
+    assert sharded.count_session("s1") == 1
@@ -3,7 +3,10 @@ import streamlit as st
 import requests
 import pandas as pd
 import json
+import time
 import uuid
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 # ====================================================
 # SESSION INITIALIZATION
@@ -28,6 +31,80 @@ if st.query_params:
 
 API_URL = os.getenv("API_URL", st.secrets.get("API_URL", "http://localhost:8000"))
 
+# (connect, read) timeouts in seconds. Read is the max silence between bytes, so
+# streams only time out if the backend stops sending tokens.
+CONNECT_TIMEOUT = 5
+TIMEOUTS = {
+    "upload": (CONNECT_TIMEOUT, 120),
+    "poll": (CONNECT_TIMEOUT, 10),
+    "stream": (CONNECT_TIMEOUT, 120),
+    "batch": (CONNECT_TIMEOUT, 600),
+}
+# Give up waiting on a KB build after this many seconds (the job keeps running server-side)
+KB_BUILD_TIMEOUT = float(os.getenv("KB_BUILD_TIMEOUT", "1800"))
+# Operator telemetry (connection reuse) in a footer expander; off for end users
+SHOW_DEBUG_STATS = os.getenv("SHOW_DEBUG_STATS", "0") == "1"
+
+
+@st.cache_resource
+def http_session():
+    """
+    One pooled keep-alive session per Streamlit server process, shared by every user.
+    Connection failures are retried for any method (nothing was sent yet); read errors
+    and 502/503/504 only for idempotent GETs. Backoff has jitter so reruns don't sync up.
+    """
+    retry = Retry(
+        total=3,
+        connect=3,
+        read=2,
+        status=2,
+        backoff_factor=0.3,
+        backoff_jitter=0.3,
+        status_forcelist=(502, 503, 504),
+        allowed_methods=frozenset({"GET", "HEAD"}),
+        raise_on_status=False,
+    )
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=32, max_retries=retry)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def connection_stats():
+    """
+    Requests sent vs. TCP connections opened by the shared session's pools.
+    """
+    manager = http_session().get_adapter(API_URL).poolmanager
+    requests_sent = connections = 0
+    for key in list(manager.pools.keys()):
+        pool = manager.pools.get(key)
+        if pool is not None:
+            requests_sent += pool.num_requests
+            connections += pool.num_connections
+    return requests_sent, connections
+
+
+def stream_sse(path, data, headers):
+    """
+    POSTs to a streaming endpoint and yields (event, payload) pairs from its Server-Sent Events.
+    A plain JSON reply (e.g. a request validation error) is yielded as a single "done" event.
+    """
+    with http_session().post(f"{API_URL}{path}", data=data, headers=headers, stream=True, timeout=TIMEOUTS["stream"]) as response:
+        response.raise_for_status()
+        if not response.headers.get("content-type", "").startswith("text/event-stream"):
+            yield "done", response.json()
+            return
+        event = "message"
+        for line in response.iter_lines(decode_unicode=True):
+            if not line:
+                continue
+            if line.startswith("event:"):
+                event = line[len("event:"):].strip()
+            elif line.startswith("data:"):
+                yield event, json.loads(line[len("data:"):].strip())
+                event = "message"
+
 # ====================================================
 # PAGE CONFIGURATION
 # ====================================================
@@ -290,15 +367,64 @@ with tab1:
             try:
                 st.write("🔗 Connecting to backend...")
                 headers = {"X-Session-ID": st.session_state['session_id']}
-                response = requests.post(f"{API_URL}/upload-documents", files=files_payload, headers=headers)
+                response = http_session().post(
+                    f"{API_URL}/upload-documents", files=files_payload, headers=headers, timeout=TIMEOUTS["upload"]
+                )
                 
-                if response.status_code == 200:
-                    st.write("✅ Processing complete!")
-                    st.session_state['kb_built'] = True
-                    status.update(label="✅ Knowledge Base Built Successfully!", state="complete", expanded=False)
-                    st.balloons()
-                    st.toast("✅ Knowledge Base is ready!", icon="✅")
-                    st.rerun()
+                if response.status_code in (200, 202):
+                    job_id = response.json()["job_id"]
+                    st.write("⚙️ Extracting, chunking and embedding in the background...")
+                    progress_bar = st.progress(0.0)
+                    progress_text = st.empty()
+
+                    # Poll the background KB build job until it finishes
+                    job = {}
+                    deadline = time.monotonic() + KB_BUILD_TIMEOUT
+                    while True:
+                        poll = http_session().get(f"{API_URL}/jobs/{job_id}", headers=headers, timeout=TIMEOUTS["poll"])
+                        if 400 <= poll.status_code < 500:
+                            # Job unknown (backend restarted, session reaped): polling won't fix it
+                            job = {"status": "failed", "error": f"job {job_id} unavailable ({poll.status_code}): {poll.text}"}
+                            break
+                        if poll.status_code != 200:
+                            # 5xx left after the session's retries: try again until the deadline
+                            job = dict(job, error=f"backend returned {poll.status_code} while polling job {job_id}")
+                            if time.monotonic() > deadline:
+                                break
+                            time.sleep(1)
+                            continue
+                        job = poll.json()
+                        progress = job.get("progress", {})
+                        files_total = max(progress.get("files_total", 0), 1)
+                        chunks_total = progress.get("chunks_total", 0)
+                        # First half of the bar tracks extraction, second half embedding
+                        fraction = 0.5 * progress.get("files_processed", 0) / files_total
+                        if chunks_total:
+                            fraction += 0.5 * progress.get("chunks_embedded", 0) / chunks_total
+                        progress_bar.progress(min(fraction, 1.0))
+                        progress_text.caption(
+                            f"{progress.get('bytes_processed', 0) / 1024:.1f} / {progress.get('bytes_total', 0) / 1024:.1f} KB processed • "
+                            f"{progress.get('chunks_embedded', 0)} / {chunks_total} chunks embedded"
+                        )
+                        if job.get("status") in ("completed", "failed"):
+                            break
+                        if time.monotonic() > deadline:
+                            job = dict(job, error=f"still {job.get('status')} after {KB_BUILD_TIMEOUT:.0f}s (job {job_id})")
+                            break
+                        time.sleep(1)
+
+                    if job.get("status") == "completed":
+                        for err in (job.get("result") or {}).get("file_errors", []):
+                            st.warning(f"⚠️ Skipped `{err['file']}`: {err['error']}")
+                        st.write("✅ Processing complete!")
+                        st.session_state['kb_built'] = True
+                        status.update(label="✅ Knowledge Base Built Successfully!", state="complete", expanded=False)
+                        st.balloons()
+                        st.toast("✅ Knowledge Base is ready!", icon="✅")
+                        st.rerun()
+                    else:
+                        st.error(f"❌ Build failed: {job.get('error')}")
+                        status.update(label="❌ Build Failed", state="error")
                 else:
                     st.error(f"❌ Build failed: {response.text}")
                     status.update(label="❌ Build Failed", state="error")
@@ -334,6 +460,11 @@ with tab2:
                     type="primary",
                     use_container_width=True
                 )
+                force_regenerate = st.checkbox(
+                    "🔄 Force regenerate",
+                    key="force_regenerate_tc",
+                    help="Skip the cached answer for an identical request and ask the LLM again"
+                )
         
         if generate_button and user_query.strip():
             with st.status("🤖 Consulting Knowledge Base...", expanded=True) as status:
@@ -342,40 +473,52 @@ with tab2:
                 
                 try:
                     headers = {"X-Session-ID": st.session_state['session_id']}
+                    if force_regenerate:
+                        headers["X-Cache-Bypass"] = "1"
                     payload = {"query": user_query}
-                    response = requests.post(f"{API_URL}/generate-testcases", data=payload, headers=headers)
-                    
-                    if response.status_code == 200:
-                        st.write("✅ Processing response...")
-                        data = response.json().get("results", [])
-                        
-                        # --- FIX: Ensure data is always a list ---
-                        if isinstance(data, dict):
-                            data = [data]
-                        # -----------------------------------------
-
-                        if isinstance(data, list) and len(data) > 0:
-                            st.session_state['test_cases'] = data
-                            status.update(label=f"✅ Generated {len(data)} Test Cases!", state="complete", expanded=False)
-                            st.toast(f"✅ {len(data)} test cases generated successfully!", icon="✨")
-                            st.rerun()
-                        else:
-                            st.warning(
-                                "⚠️ **No test cases were generated.**\n\n"
-                                "**Possible reasons:**\n"
-                                "- The system could not find relevant information in the knowledge base.\n"
-                                "- Your query may be too short or unclear.\n"
-                                "- The agent could not extract structured test cases from the response.\n\n"
-                                "💡 **Try:**\n"
-                                "- Rephrasing your request with more details\n"
-                                "- Uploading more detailed documents\n"
-                                "- Being more specific about the feature to test"
-                            )
-                            st.session_state['test_cases'] = []
-                            status.update(label="⚠️ No test cases generated", state="error")
+
+                    # Render the LLM output as it streams in, then swap it for the parsed table
+                    live_output = st.empty()
+                    streamed = ""
+                    data = []
+                    for event, event_data in stream_sse("/generate-testcases/stream", payload, headers):
+                        if event == "token":
+                            streamed += event_data["text"]
+                            live_output.code(streamed, language="json")
+                        elif event == "done":
+                            data = event_data.get("results", [])
+                            st.session_state['tc_prompt_stats'] = event_data.get("prompt_stats")
+                    live_output.empty()
+
+                    st.write("✅ Processing response...")
+
+                    # --- FIX: Ensure data is always a list ---
+                    if isinstance(data, dict):
+                        data = [data]
+                    # -----------------------------------------
+
+                    if isinstance(data, list) and len(data) > 0:
+                        st.session_state['test_cases'] = data
+                        status.update(label=f"✅ Generated {len(data)} Test Cases!", state="complete", expanded=False)
+                        st.toast(f"✅ {len(data)} test cases generated successfully!", icon="✨")
+                        st.rerun()
                     else:
-                        st.error(f"❌ Error: {response.status_code}")
-                        status.update(label="❌ Generation Failed", state="error")
+                        st.warning(
+                            "⚠️ **No test cases were generated.**\n\n"
+                            "**Possible reasons:**\n"
+                            "- The system could not find relevant information in the knowledge base.\n"
+                            "- Your query may be too short or unclear.\n"
+                            "- The agent could not extract structured test cases from the response.\n\n"
+                            "💡 **Try:**\n"
+                            "- Rephrasing your request with more details\n"
+                            "- Uploading more detailed documents\n"
+                            "- Being more specific about the feature to test"
+                        )
+                        st.session_state['test_cases'] = []
+                        status.update(label="⚠️ No test cases generated", state="error")
+                except requests.HTTPError as e:
+                    st.error(f"❌ Error: {e.response.status_code}")
+                    status.update(label="❌ Generation Failed", state="error")
                 except Exception as e:
                     st.error(f"❌ Connection Error: {e}")
                     status.update(label="❌ Connection Error", state="error")
@@ -390,6 +533,13 @@ with tab2:
                 
                 with st.container():
                     st.markdown(f"**Total Test Cases:** `{len(df)}`")
+                    prompt_stats = st.session_state.get('tc_prompt_stats')
+                    if prompt_stats:
+                        st.caption(
+                            f"🧮 Prompt: {prompt_stats['prompt_tokens']} tokens • context "
+                            f"{prompt_stats['context_tokens']}/{prompt_stats['budget']} tokens from "
+                            f"{prompt_stats['chunks_used']}/{prompt_stats['chunks_retrieved']} chunks"
+                        )
                     st.dataframe(
                         df,
                         use_container_width=True,
@@ -462,6 +612,11 @@ with tab3:
                 type="primary",
                 use_container_width=True
             )
+            force_regenerate_script = st.checkbox(
+                "🔄 Force regenerate",
+                key="force_regenerate_script",
+                help="Skip the cached script for this test case and ask the LLM again"
+            )
         
         if generate_script_button:
             selected_index = tc_options.index(selected_option)
@@ -475,10 +630,23 @@ with tab3:
                 try:
                     payload = {"testcase_json": json.dumps(selected_test_case)}
                     headers = {"X-Session-ID": st.session_state['session_id']}
-                    response = requests.post(f"{API_URL}/generate-selenium-script", data=payload, headers=headers)
-                    
-                    if response.status_code == 200:
-                        script_content = response.json().get("script", "")
+                    if force_regenerate_script:
+                        headers["X-Cache-Bypass"] = "1"
+
+                    # Show the script as it is written; the final event carries the cleaned version
+                    live_script = st.empty()
+                    streamed = ""
+                    done = {}
+                    for event, event_data in stream_sse("/generate-selenium-script/stream", payload, headers):
+                        if event == "token":
+                            streamed += event_data["text"]
+                            live_script.code(streamed, language='python')
+                        elif event == "done":
+                            done = event_data
+                    live_script.empty()
+
+                    if "error" not in done:
+                        script_content = done.get("script", "")
                         st.write("✅ Script generated successfully!")
                         status.update(label="✅ Script Generated!", state="complete", expanded=True)
                         
@@ -498,11 +666,59 @@ with tab3:
                                     use_container_width=True
                                 )
                         
+                        prompt_stats = done.get("prompt_stats")
+                        if prompt_stats:
+                            st.caption(
+                                f"🧮 Prompt: {prompt_stats['prompt_tokens']} tokens • page sent as "
+                                f"{prompt_stats['elements_kept']}/{prompt_stats['elements_total']} elements, "
+                                f"{prompt_stats['tokens_saved']} tokens saved vs raw HTML"
+                            )
+
                         st.toast("✅ Selenium script generated successfully!", icon="🎉")
                         st.success("✨ **Script ready!** You can copy or download the code above.")
                         
                     else:
-                        st.error(f"❌ Failed to generate script: {response.status_code}")
+                        st.error(f"❌ Failed to generate script: {done['error']}")
+                        status.update(label="❌ Generation Failed", state="error")
+                except requests.HTTPError as e:
+                    st.error(f"❌ Failed to generate script: {e.response.status_code}")
+                    status.update(label="❌ Generation Failed", state="error")
+                except Exception as e:
+                    st.error(f"❌ Error: {e}")
+                    status.update(label="❌ Error Occurred", state="error")
+
+        st.markdown("---")
+
+        # Batch: one request for the whole suite, scripts generated concurrently server-side
+        col_batch1, col_batch2, col_batch3 = st.columns([1, 2, 1])
+        with col_batch2:
+            generate_all_button = st.button(
+                f"📦 Generate Scripts for All {len(st.session_state['test_cases'])} Test Cases",
+                use_container_width=True
+            )
+
+        if generate_all_button:
+            with st.status("🔄 Generating Selenium Scripts for the suite...", expanded=True) as status:
+                try:
+                    payload = {"testcases_json": json.dumps(st.session_state['test_cases'])}
+                    headers = {"X-Session-ID": st.session_state['session_id']}
+                    if force_regenerate_script:
+                        headers["X-Cache-Bypass"] = "1"
+                    response = http_session().post(
+                        f"{API_URL}/generate-selenium-scripts", data=payload, headers=headers, timeout=TIMEOUTS["batch"]
+                    )
+
+                    if response.status_code == 200:
+                        status.update(label="✅ Scripts Generated!", state="complete", expanded=True)
+                        st.download_button(
+                            "📥 Download All Scripts (.zip)",
+                            response.content,
+                            "selenium_scripts.zip",
+                            "application/zip",
+                            use_container_width=True
+                        )
+                    else:
+                        st.error(f"❌ Failed to generate scripts: {response.status_code} {response.text}")
                         status.update(label="❌ Generation Failed", state="error")
                 except Exception as e:
                     st.error(f"❌ Error: {e}")
@@ -518,4 +734,14 @@ st.markdown(
     "Built with Streamlit • FastAPI • LLMs • RAG"
     "</div>",
     unsafe_allow_html=True
-)
\ No newline at end of file
+)
+if SHOW_DEBUG_STATS:
+    with st.expander("🛠️ Debug: backend connections"):
+        requests_sent, connections_opened = connection_stats()
+        if requests_sent:
+            st.caption(
+                f"🔌 {requests_sent} requests over {connections_opened} connections "
+                f"({1 - connections_opened / requests_sent:.0%} reused)"
+            )
+        else:
+            st.caption("🔌 No backend requests yet")
\ No newline at end of file